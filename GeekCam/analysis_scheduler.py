@@ -0,0 +1,214 @@
+"""
+分析スケジューラ - 呼び鈴押下の合流・上限付き待ち行列・置き換え・実行中分析のキャンセル
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AnalysisCancelled(Exception):
+    """新しい押下に置き換えられて分析が中止された"""
+    pass
+
+class CancelToken:
+    """実行中の分析へ中止を伝える（LLM応答の close などをコールバックで登録）"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def add_callback(self, callback: Callable[[], None]):
+        """中止時に呼ぶ処理を登録（中止済みなら即座に呼ぶ）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        self._invoke(callback)
+
+    def cancel(self):
+        """中止を通知し、登録済みの処理を呼ぶ"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._invoke(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise AnalysisCancelled("分析は新しい呼び鈴押下に置き換えられました")
+
+    def _invoke(self, callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"キャンセル処理エラー: {e}")
+
+class AnalysisJob:
+    """1回分の分析（合流した押下はすべて同じ future で結果を受け取る）"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, args: tuple):
+        self.job_id = next(self._ids)
+        self.args = args
+        self.future = Future()
+        self.token = CancelToken()
+        self.presses = 1
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+
+    def forward_to(self, other: "AnalysisJob"):
+        """置き換えられた分析の呼び出し元に、置き換え先の結果を渡す"""
+        other.presses += self.presses
+
+        def relay(source: Future):
+            if self.future.done():
+                return
+            if source.cancelled():
+                self.future.cancel()
+            elif source.exception() is not None:
+                self.future.set_exception(source.exception())
+            else:
+                self.future.set_result(source.result())
+
+        other.future.add_done_callback(relay)
+
+class AnalysisScheduler:
+    """
+    分析を1本のワーカースレッドで順に実行する
+    - 実行中の分析に coalesce_window 秒以内の押下は合流（同じ結果を返す）
+    - それ以降の押下は待ち行列へ。上限を超えたら古い待ち分析を新しい押下で置き換える
+    - cancel_stale または supersede 指定時は、実行中の分析をキャンセルして置き換える
+    """
+
+    def __init__(self, run: Callable, max_pending: int = 1, coalesce_window: float = 10.0,
+                 cancel_stale: bool = False, name: str = "analysis-scheduler"):
+        self.run = run
+        self.max_pending = max(1, max_pending)
+        self.coalesce_window = coalesce_window
+        self.cancel_stale = cancel_stale
+
+        self.pending = deque()
+        self.running: Optional[AnalysisJob] = None
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.stats = {"submitted": 0, "started": 0, "coalesced": 0, "superseded": 0,
+                      "cancelled": 0, "completed": 0, "failed": 0}
+
+        self.worker = threading.Thread(target=self._worker_loop, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, *args, supersede: bool = False) -> Tuple[Future, str]:
+        """
+        押下を登録
+        Returns: (結果の Future, 処理内容 "coalesced" / "queued" / "superseded")
+        """
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError("分析スケジューラは停止しています")
+            self.stats["submitted"] += 1
+            running = self.running
+
+            # 実行中の分析に合流
+            if running and not running.token.cancelled and not supersede:
+                if time.monotonic() - running.started_at <= self.coalesce_window:
+                    running.presses += 1
+                    self.stats["coalesced"] += 1
+                    logger.info(f"呼び鈴押下を実行中の分析 #{running.job_id} に合流")
+                    return running.future, "coalesced"
+
+            job = AnalysisJob(args)
+            disposition = "queued"
+
+            # 新しい押下で古い待ち分析を置き換え
+            while len(self.pending) >= self.max_pending:
+                replaced = self.pending.popleft()
+                replaced.forward_to(job)
+                self.stats["superseded"] += 1
+                disposition = "superseded"
+                logger.info(f"待機中の分析 #{replaced.job_id} を #{job.job_id} に置き換え")
+
+            # 古くなった実行中の分析を中止（LLM要求もキャンセル）
+            if running and not running.token.cancelled and (supersede or self.cancel_stale):
+                running.forward_to(job)
+                running.token.cancel()
+                self.stats["cancelled"] += 1
+                disposition = "superseded"
+                logger.info(f"実行中の分析 #{running.job_id} をキャンセルし #{job.job_id} に置き換え")
+
+            self.pending.append(job)
+            self.condition.notify()
+            return job.future, disposition
+
+    def _worker_loop(self):
+        """待ち行列から分析を取り出して実行"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                job = self.pending.popleft()
+                job.started_at = time.monotonic()
+                self.running = job
+                self.stats["started"] += 1
+
+            try:
+                result = self.run(*job.args, cancel_token=job.token)
+                if not job.future.done() and not job.token.cancelled:
+                    job.future.set_result(result)
+                with self.condition:
+                    self.stats["completed"] += 1
+            except AnalysisCancelled:
+                logger.info(f"分析 #{job.job_id} はキャンセルされました")
+            except Exception as e:
+                if job.token.cancelled:
+                    # 中止に伴う通信エラーなど。結果は置き換え先から届く
+                    logger.info(f"分析 #{job.job_id} はキャンセルされました: {e}")
+                    continue
+                logger.error(f"分析実行エラー: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+                with self.condition:
+                    self.stats["failed"] += 1
+            finally:
+                with self.condition:
+                    self.running = None
+
+    def is_busy(self) -> bool:
+        """分析を実行中または待機中か"""
+        with self.condition:
+            return self.running is not None or bool(self.pending)
+
+    def stop(self):
+        """待機中の分析を取り消し、実行中の分析をキャンセルして停止"""
+        with self.condition:
+            self.stopped = True
+            while self.pending:
+                self.pending.popleft().future.cancel()
+            if self.running:
+                self.running.token.cancel()
+                self.running.future.cancel()
+            self.condition.notify_all()
+        self.worker.join(timeout=2)
+
+    def get_stats(self) -> Dict:
+        """押下の合流・置き換え・キャンセル統計"""
+        with self.condition:
+            stats = dict(self.stats)
+            stats["pending"] = len(self.pending)
+            stats["running"] = self.running.job_id if self.running else None
+            stats["running_presses"] = self.running.presses if self.running else 0
+        return stats
@@ -1,19 +1,17 @@
 """
 API通信モジュール: LMStudio APIとの通信を管理
 """
-import requests
 import json
 import base64
 import config
-from openai import OpenAI
+from llm_http import get_llm_session
 
 class ApiClient:
     def __init__(self):
         """APIクライアントの初期化"""
-        self.client = OpenAI(
-            api_key=config.API_KEY,
-            base_url=config.API_BASE_URL
-        )
+        # OpenAI互換エンドポイントを、他の分析経路と共有する接続プール経由で呼び出す
+        self.session = get_llm_session()
+        self.session.headers.update({"Authorization": f"Bearer {config.API_KEY}"})
         print(f"APIクライアントを初期化しました: {config.API_BASE_URL}")
 
     def analyze_image(self, base64_image):
@@ -23,9 +21,9 @@ class ApiClient:
             return "画像の取得に失敗しました。"
 
         try:
-            response = self.client.chat.completions.create(
-                model="gemma-3-vision",  # LMStudioでのモデル名
-                messages=[
+            payload = {
+                "model": "gemma-3-vision",  # LMStudioでのモデル名
+                "messages": [
                     {"role": "system", "content": config.SYSTEM_PROMPT},
                     {
                         "role": "user", 
@@ -40,10 +38,14 @@ class ApiClient:
                         ]
                     }
                 ],
-                max_tokens=100
-            )
+                "max_tokens": 100
+            }
+            response = self.session.post(f"{config.API_BASE_URL}/chat/completions", json=payload, timeout=30)
+            if response.status_code != 200:
+                print(f"API通信エラー: ステータスコード {response.status_code}")
+                return "画像の分析中にエラーが発生しました。"
             
-            result = response.choices[0].message.content
+            result = response.json()["choices"][0]["message"]["content"]
             if config.DEBUG_MODE:
                 print(f"API応答: {result}")
             return result
@@ -55,7 +57,7 @@ class ApiClient:
         """API接続テスト"""
         try:
             # モデル一覧を取得して接続テスト
-            response = requests.get(f"{config.API_BASE_URL}/models")
+            response = self.session.get(f"{config.API_BASE_URL}/models", timeout=5)
             if response.status_code == 200:
                 print("API接続テスト成功")
                 return True
@@ -6,23 +6,31 @@ import sys
 import time
 import cv2
 import numpy as np
-import base64
 import json
 import logging
 import threading
-import requests
 import collections
 from datetime import datetime, timedelta
 from flask import Flask, render_template, request, jsonify, Response
+from overlay import FrameOverlay
+from ollama_stream import OllamaStreamError, SentenceSpeaker, split_sentences
+from image_prep import ImagePreparer
+from description_cache import DescriptionCache
+from model_residency import ModelResidencyManager
+from llm_http import get_llm_session
+from llm_router import LLMBackend, LLMRouter, LLMRouterError
+from analysis_scheduler import AnalysisCancelled, AnalysisScheduler
+from speculative_llm import SpeculationController
 
 # 自作モジュールのインポート
+import config
 try:
-    from face_detector import FaceDetector
-    import config
+    from face_detect import FaceDetector, RemoteFaceDetector
 except ImportError as e:
     print(f"モジュールのインポートエラー: {e}")
     # デフォルト設定でフォールバック
     FaceDetector = None
+    RemoteFaceDetector = None
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,7 +42,6 @@ app = Flask(__name__)
 # グローバル変数
 camera = None
 face_detector = None
-is_processing = False
 last_result = None
 frame_buffer = collections.deque(maxlen=30)  # 最大30フレーム（約10秒間）のバッファ
 current_frame = None
@@ -52,9 +59,59 @@ CONFIG = {
     "time_offset": 0,
     "stream_quality": 75,
     "use_face_detection": getattr(config, 'USE_FACE_DETECTION', True),
+    "use_inference_worker": getattr(config, 'USE_INFERENCE_WORKER', True),
     "system_prompt": getattr(config, 'SYSTEM_PROMPT', ""),
+    "overlay_detection_ttl": getattr(config, 'OVERLAY_DETECTION_TTL', 5.0),
+    "ollama_streaming": getattr(config, 'OLLAMA_STREAMING', True),
+    "llm_image_long_edge": getattr(config, 'LLM_IMAGE_LONG_EDGE', 896),
+    "llm_image_max_bytes": getattr(config, 'LLM_IMAGE_MAX_BYTES', 150 * 1024),
+    "description_cache_ttl": getattr(config, 'DESCRIPTION_CACHE_TTL', 300),
+    "description_cache_max_distance": getattr(config, 'DESCRIPTION_CACHE_MAX_DISTANCE', 10),
+    "ollama_keep_alive": getattr(config, 'OLLAMA_KEEP_ALIVE', "10m"),
+    "visit_history_file": getattr(config, 'VISIT_HISTORY_FILE', "visit_history.json"),
+    "llm_backends": getattr(config, 'LLM_BACKENDS', [
+        {"name": "primary", "kind": "ollama", "url": "http://localhost:11434/api/chat",
+         "model": "gemma3:4b", "deadline": 20},
+    ]),
+    "analysis_coalesce_window": getattr(config, 'ANALYSIS_COALESCE_WINDOW', 10.0),
+    "analysis_max_pending": getattr(config, 'ANALYSIS_MAX_PENDING', 1),
+    "analysis_cancel_stale": getattr(config, 'ANALYSIS_CANCEL_STALE', False),
+    "speculative_llm_policy": getattr(config, 'SPECULATIVE_LLM_POLICY', "adaptive"),
+    "speculative_max_known_ratio": getattr(config, 'SPECULATIVE_MAX_KNOWN_RATIO', 0.6),
 }
 
+# 配信・保存用オーバーレイ（取得フレームには描画しない）
+frame_overlay = FrameOverlay(
+    clock_anchor="top_left",
+    font_scale=0.8,
+    detection_ttl=CONFIG["overlay_detection_ttl"]
+)
+
+# LLM送信画像の準備（訪問者の切り出し・縮小・品質選択）
+image_preparer = ImagePreparer(
+    long_edge=CONFIG["llm_image_long_edge"],
+    max_bytes=CONFIG["llm_image_max_bytes"]
+)
+
+# 似た訪問者のLLM説明を再利用するキャッシュ
+description_cache = DescriptionCache(
+    ttl=CONFIG["description_cache_ttl"],
+    max_distance=CONFIG["description_cache_max_distance"]
+)
+
+# 接続・スレッドを持つサービスは init_services() で生成
+# （推論ワーカーの spawn でこのモジュールが再読み込みされても起動しないように）
+llm_session = None  # 接続プールを共有するLLM用セッション
+llm_router = None  # 複数バックエンドへのルーティング
+model_residency = None  # Ollama モデルの事前読み込み・keep_alive・混雑時間帯の学習
+analysis_scheduler = None  # 呼び鈴押下の合流・待ち行列
+
+# YOLO顔認識と並行してOllama分析を先行させる方針と統計
+speculation = SpeculationController(
+    policy=CONFIG["speculative_llm_policy"],
+    max_known_ratio=CONFIG["speculative_max_known_ratio"]
+)
+
 # カメラクラス
 class RealtimeCamera:
     def __init__(self, use_camera=False, camera_id=0, frame_rate=3):
@@ -170,23 +227,16 @@ class RealtimeCamera:
                 logger.error("カメラからのフレーム取得に失敗しました")
                 return None
             
-            # フレームにタイムスタンプを追加
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cv2.putText(frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            
             return frame
         else:
             if not self.test_images:
                 return None
                 
             # 次のテスト画像を取得（ローテーション）
-            frame = self.test_images[self.current_test_index].copy()
+            # 時刻表示は配信時のオーバーレイで行うため、テスト画像はコピーせず共有
+            frame = self.test_images[self.current_test_index]
             self.current_test_index = (self.current_test_index + 1) % len(self.test_images)
             
-            # フレームにタイムスタンプを追加
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cv2.putText(frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            
             return frame
 
     def stop(self):
@@ -197,9 +247,11 @@ class RealtimeCamera:
         logger.info("カメラを停止しました")
 
 # 顔認識 + 画像分析機能
-def analyze_visitor(image):
+def analyze_visitor(image, on_sentence=None, cancel_token=None):
     """
     訪問者を分析（YOLO → Ollama の順序で処理）
+    on_sentence: Ollama の説明を文ごとに受け取るコールバック
+    cancel_token: 中止されると Ollama の受信を打ち切る
     
     Returns:
         dict: {
@@ -218,12 +270,34 @@ def analyze_visitor(image):
         }
     
     # Step 1: YOLO顔認識（有効な場合）
+    speculative = None
     if CONFIG["use_face_detection"] and face_detector and face_detector.is_model_available():
+        # 認識と並行してOllama分析を開始（既知の人物ならキャンセル）
+        if speculation.should_speculate():
+            speculative = speculation.begin(
+                lambda sentence_callback, token: analyze_with_ollama(image, sentence_callback, token),
+                parent_token=cancel_token
+            )
+        
         logger.info("YOLO顔認識を実行中...")
-        face_result = face_detector.detect_known_faces(image)
+        try:
+            face_result = face_detector.detect_known_faces(image)
+        except Exception:
+            if speculative:
+                speculative.cancel()
+            raise
+        speculation.record_outcome(face_result['has_known_faces'])
+        
+        # 配信映像に最新の認識結果を重ねる
+        frame_overlay.update_detections([
+            (face['bbox'], f"{face['name']} {face['confidence']:.2f}", (0, 255, 0))
+            for face in face_result['known_faces']
+        ])
         
         if face_result['has_known_faces']:
             # 既知の顔が検出された場合
+            if speculative:
+                speculative.cancel()
             known_faces = face_result['known_faces']
             if len(known_faces) == 1:
                 user = known_faces[0]
@@ -243,7 +317,10 @@ def analyze_visitor(image):
     
     # Step 2: 未知の人物 → Ollama分析
     logger.info("未知の訪問者のため、詳細分析を実行中...")
-    ollama_result = analyze_with_ollama(image)
+    if speculative:
+        ollama_result = speculative.result(on_sentence)
+    else:
+        ollama_result = analyze_with_ollama(image, on_sentence, cancel_token)
     
     return {
         'type': 'unknown',
@@ -253,49 +330,54 @@ def analyze_visitor(image):
         }
     }
 
-def analyze_with_ollama(image):
-    """OllamaのGPU機能を使用して画像分析"""
+def analyze_with_ollama(image, on_sentence=None, cancel_token=None):
+    """OllamaのGPU機能を使用して画像分析（on_sentence 指定時は文ごとに逐次通知）"""
     if image is None:
         return "画像の取得に失敗しました"
     
     try:
-        # 画像をBase64エンコード
-        _, buffer = cv2.imencode('.jpg', image)
-        base64_image = base64.b64encode(buffer).decode('utf-8')
-        
-        # APIリクエスト準備
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        payload = {
-            "model": CONFIG["model_name"],
-            "messages": [
-                {"role": "system", "content": CONFIG["system_prompt"]},
-                {"role": "user", 
-                 "content": "この画像に映っている人物について説明してください。", 
-                 "images": [base64_image]}
-            ],
-            "stream": False,
-            "options": {
+        # 訪問者領域を切り出し、送信用に縮小・エンコード
+        prepared = image_preparer.prepare(image)
+        base64_image = prepared.base64
+        logger.info(f"LLM送信画像: {prepared.summary()}")
+        
+        # 直近に似た訪問者を分析済みならその説明を再利用（訪問者を切り出せたときのみ）
+        cached = description_cache.get(prepared.crop) if prepared.cacheable else None
+        if cached is not None:
+            logger.info(f"説明キャッシュにヒット: {cached}")
+            if on_sentence is not None:
+                for sentence in split_sentences(cached):
+                    on_sentence(sentence)
+            return cached
+        
+        # 先頭のバックエンドから順に試し、遮断中・期限切れなら軽量モデルへ切り替え
+        routed = llm_router.describe(
+            CONFIG["system_prompt"],
+            "この画像に映っている人物について説明してください。",
+            base64_image,
+            on_sentence=on_sentence if CONFIG["ollama_streaming"] else None,
+            options={
                 "num_gpu": getattr(config, 'OLLAMA_GPU_LAYERS', -1),  # GPU使用設定
                 "num_thread": 4,
-            }
-        }
-        
-        # APIリクエスト送信
-        response = requests.post(CONFIG["api_url"], headers=headers, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result["message"]["content"]
-            logger.info(f"Ollama分析結果: {content}")
-            return content
-        else:
-            error_message = f"API通信エラー: ステータスコード {response.status_code}"
-            logger.error(error_message)
-            return error_message
+            },
+            keep_alive=model_residency.request_keep_alive(),
+            on_done=model_residency.record_response,
+            cancel_token=cancel_token
+        )
+        content = routed.content
+        logger.info(f"Ollama分析結果（{routed.backend}/{routed.model}）: {content}")
+        if prepared.cacheable and not routed.truncated:  # 途中で切れた説明は再利用しない
+            description_cache.put(prepared.crop, content)
+        return content
             
+    except LLMRouterError as e:
+        error_message = str(e)
+        logger.error(error_message)
+        return error_message
+    except OllamaStreamError as e:
+        error_message = str(e)
+        logger.error(error_message)
+        return error_message
     except Exception as e:
         error_message = f"画像分析中にエラーが発生しました: {str(e)}"
         logger.error(error_message)
@@ -364,10 +446,10 @@ def frame_capture_thread():
     while camera and camera.is_running:
         frame = camera.get_frame()
         if frame is not None:
-            # 現在のフレームとバッファを更新
-            current_frame = frame.copy()
+            # 現在のフレームとバッファを更新（取得フレームは以降書き換えないので共有）
+            current_frame = frame
             timestamp = datetime.now()
-            frame_buffer.append((timestamp, frame.copy()))
+            frame_buffer.append((timestamp, frame))
             
             # 古いフレームをクリア
             while len(frame_buffer) > 0:
@@ -389,8 +471,8 @@ def generate_frames():
     
     while stream_active:
         if current_frame is not None:
-            # フレームをJPEG形式にエンコード
-            frame = current_frame.copy()
+            # 時刻・検出枠を重ねてJPEG形式にエンコード
+            frame = frame_overlay.render(current_frame)
             _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, CONFIG["stream_quality"]])
             frame_bytes = buffer.tobytes()
             
@@ -411,17 +493,23 @@ def generate_frames():
         time.sleep(1.0 / CONFIG["frame_rate"])
 
 # 呼び鈴処理関数
-def process_doorbell():
-    """呼び鈴が押されたときの処理（YOLO→Ollama統合版）"""
-    global is_processing, last_result, frame_buffer
+def process_doorbell(cancel_token=None, timing=None):
+    """呼び鈴が押されたときの処理（YOLO→Ollama統合版、cancel_token で中止、timing に最初の結果読み上げ時刻を記録）"""
+    global last_result, frame_buffer
     
-    is_processing = True
     logger.info("呼び鈴処理を開始します")
     
+    def mark_first_audio():
+        if timing is not None:
+            timing.setdefault("first_audio_time", time.time())
+    
     try:
         # 音声通知
         speak_text("訪問者を確認しています。少々お待ちください。")
         
+        # 混雑時間帯の学習用に来訪を記録
+        model_residency.record_visit()
+        
         # オフセットを考慮してフレームを選択
         target_time = datetime.now() + timedelta(seconds=CONFIG["time_offset"])
         selected_frame = None
@@ -448,7 +536,6 @@ def process_doorbell():
                 selected_frame = current_frame.copy()
             else:
                 speak_text("画像の取得に失敗しました。")
-                is_processing = False
                 return "画像の取得に失敗しました"
         
         # 保存用にタイムスタンプを付与
@@ -458,8 +545,21 @@ def process_doorbell():
         analysis_frame = selected_frame.copy()
         cv2.putText(analysis_frame, "分析中...", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
         
-        # YOLO + Ollama統合分析
-        result_data = analyze_visitor(selected_frame)
+        # Ollama の説明は完成した文から順に読み上げ・画面表示
+        def show_partial(text):
+            global last_result
+            mark_first_audio()
+            last_result = f"未知の訪問者です。{text}"
+        
+        speaker = SentenceSpeaker(speak_text, intro="未知の訪問者です。", on_text=show_partial)
+        
+        # YOLO + Ollama統合分析（失敗時も読み上げスレッドを終了させる）
+        try:
+            result_data = analyze_visitor(selected_frame, on_sentence=speaker, cancel_token=cancel_token)
+        finally:
+            streamed = speaker.finish()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
         result_message = result_data['message']
         last_result = result_message
         
@@ -475,12 +575,15 @@ def process_doorbell():
             # 元の画像を保存
             save_frame = selected_frame
         
-        cv2.imwrite(f"captures/analysis_{timestamp}.jpg", save_frame)
+        cv2.imwrite(f"captures/analysis_{timestamp}.jpg", frame_overlay.compose(save_frame))
         
         # 音声出力（結果の種類に応じて）
+        mark_first_audio()
         if result_data['type'] == 'known':
             speak_text(result_message)
             speak_text("いらっしゃいませ。")
+        elif result_data['type'] == 'unknown' and streamed:
+            pass  # 逐次読み上げ済み
         elif result_data['type'] == 'unknown':
             speak_text("未知の訪問者です。")
             time.sleep(0.5)
@@ -489,16 +592,27 @@ def process_doorbell():
             speak_text("エラーが発生しました。")
         
         logger.info("呼び鈴処理が完了しました")
-        is_processing = False
         return result_message
         
+    except AnalysisCancelled:
+        logger.info("呼び鈴処理は新しい押下に置き換えられました")
+        raise
     except Exception as e:
         error_message = f"呼び鈴処理中にエラーが発生しました: {str(e)}"
         logger.error(error_message)
         speak_text("処理中にエラーが発生しました。")
-        is_processing = False
         return error_message
 
+def run_doorbell_analysis(cancel_token=None):
+    """スケジューラから実行する呼び鈴処理（結果と時刻を返す、合流した押下にも同じ値が渡る）"""
+    timing = {}
+    message = process_doorbell(cancel_token=cancel_token, timing=timing)
+    return {
+        'message': message,
+        'first_audio_time': timing.get('first_audio_time'),
+        'result_time': time.time()
+    }
+
 # HTMLをインメモリで提供
 @app.route('/')
 def index():
@@ -930,32 +1044,55 @@ def video_feed():
 
 @app.route('/api/doorbell', methods=['POST'])
 def doorbell():
-    """呼び鈴API"""
-    global is_processing
+    """呼び鈴API（wait: true なら分析完了まで待って結果と時刻を返す）"""
+    data = request.get_json(silent=True) or {}
+    supersede = bool(data.get('supersede', False))
+    pressed_at = time.time()
     
-    if is_processing:
-        return jsonify({
-            'success': False,
-            'message': '別の処理が実行中です'
-        })
+    # 分析スケジューラに登録（連続押下は実行中の分析に合流し、重複したLLM要求を出さない）
+    future, disposition = analysis_scheduler.submit(supersede=supersede)
+    messages = {
+        'coalesced': '実行中の訪問者確認に合流しました',
+        'queued': '訪問者確認を開始しました',
+        'superseded': '新しい訪問者確認に置き換えました'
+    }
+    response = {
+        'success': True,
+        'message': messages[disposition],
+        'disposition': disposition,
+        'pressed_at': pressed_at
+    }
     
-    # 非同期で処理
-    threading.Thread(target=process_doorbell, daemon=True).start()
+    if data.get('wait'):
+        try:
+            result = future.result(timeout=float(data.get('timeout', 120)))
+        except Exception as e:
+            # 新しい押下に置き換えられた場合（AnalysisCancelled）も含む
+            response.update(success=False, error=str(e) or type(e).__name__)
+            return jsonify(response)
+        response.update(
+            result=result['message'],
+            first_audio_time=result['first_audio_time'],
+            result_time=result['result_time']
+        )
     
-    return jsonify({
-        'success': True,
-        'message': '訪問者確認を開始しました'
-    })
+    return jsonify(response)
 
 @app.route('/api/status', methods=['GET'])
 def status():
     """ステータスAPI"""
-    global is_processing, last_result
+    global last_result
     
+    is_processing = analysis_scheduler.is_busy()
     return jsonify({
         'status': '分析中...' if is_processing else '準備完了',
         'processing': is_processing,
-        'result': last_result if last_result else None
+        'result': last_result if last_result else None,
+        'description_cache': description_cache.get_stats(),
+        'model_residency': model_residency.get_stats(),
+        'analysis_scheduler': analysis_scheduler.get_stats(),
+        'llm_router': llm_router.get_stats(),
+        'speculative_llm': speculation.get_stats()
     })
 
 @app.route('/api/speak', methods=['POST'])
@@ -993,7 +1130,7 @@ def capture():
         filename = f"captures/manual_{timestamp}.jpg"
         
         # 画像保存
-        cv2.imwrite(filename, current_frame)
+        cv2.imwrite(filename, frame_overlay.compose(current_frame))
         
         return jsonify({
             'success': True,
@@ -1096,15 +1233,48 @@ def shutdown():
             'error': f'停止エラー: {str(e)}'
         }), 500
 
+def init_services():
+    """LLMセッション・ルーター・モデル常駐管理・分析スケジューラを生成"""
+    global llm_session, llm_router, model_residency, analysis_scheduler
+    
+    # 接続プールを共有するLLM用セッション（呼び鈴ごとのTCP接続確立を避ける）
+    llm_session = get_llm_session()
+    
+    # 複数バックエンドへのルーティング（遮断・軽量モデルへの切り替え）
+    llm_router = LLMRouter(llm_session, [LLMBackend.from_dict(backend) for backend in CONFIG["llm_backends"]])
+    
+    # Ollama モデルの事前読み込み・keep_alive・混雑時間帯の学習
+    model_residency = ModelResidencyManager(
+        llm_session,
+        CONFIG["api_url"],
+        CONFIG["model_name"],
+        history_path=CONFIG["visit_history_file"],
+        keep_alive=CONFIG["ollama_keep_alive"]
+    )
+    
+    # 呼び鈴押下の合流・待ち行列（押下ごとにスレッドを作らない）
+    analysis_scheduler = AnalysisScheduler(
+        run_doorbell_analysis,
+        max_pending=CONFIG["analysis_max_pending"],
+        coalesce_window=CONFIG["analysis_coalesce_window"],
+        cancel_stale=CONFIG["analysis_cancel_stale"]
+    )
+
 # メイン処理
 def main():
     """メイン関数"""
     global camera, face_detector
     
     try:
+        init_services()
+        
         # YOLO顔認識の初期化
         if CONFIG["use_face_detection"] and FaceDetector:
-            face_detector = FaceDetector()
+            # YOLO推論は別プロセスで実行し、映像配信スレッドを止めない
+            if CONFIG["use_inference_worker"] and RemoteFaceDetector:
+                face_detector = RemoteFaceDetector()
+            else:
+                face_detector = FaceDetector()
             if face_detector.is_model_available():
                 logger.info("YOLO顔認識が利用可能です")
                 known_users = face_detector.get_known_users()
@@ -1132,6 +1302,9 @@ def main():
         capture_thread = threading.Thread(target=frame_capture_thread, daemon=True)
         capture_thread.start()
         
+        # モデルの事前読み込みと常駐スケジューラ
+        model_residency.start()
+        
         # 起動メッセージ
         logger.info("システムが起動しました")
         if face_detector and face_detector.is_model_available():
@@ -1153,6 +1326,12 @@ def main():
         
         if camera and camera.is_running:
             camera.stop()
+        if analysis_scheduler:
+            analysis_scheduler.stop()
+        if model_residency:
+            model_residency.stop()
+        if face_detector and hasattr(face_detector, 'stop'):
+            face_detector.stop()
         logger.info("システムを終了しました")
 
 if __name__ == "__main__":
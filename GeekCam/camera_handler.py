@@ -7,8 +7,6 @@ import time
 import numpy as np
 from datetime import datetime
 import base64
-from io import BytesIO
-from PIL import Image
 import config
 
 class CameraHandler:
@@ -172,13 +170,10 @@ class CameraHandler:
         if frame is None:
             return None
             
-        # OpenCVはBGR、PILはRGBなので変換
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(rgb_frame)
-        
-        # Base64エンコード
-        buffered = BytesIO()
-        pil_image.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        # BGRのままOpenCVでJPEGエンコード（RGB変換とPIL経由のコピーを省略）
+        success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        if not success:
+            return None
+        img_str = base64.b64encode(buffer).decode('utf-8')
         
         return img_str
\ No newline at end of file
@@ -7,12 +7,40 @@ import os
 API_BASE_URL = "http://localhost:11434/api/chat"  # Ollama用に変更
 API_KEY = "dummy-key"  
 MODEL_NAME = "gemma3:4b"  # 使用するOllamaモデル
+OLLAMA_STREAMING = True  # 応答を文単位で受信し、完成した文から読み上げ
+# LLMルーティング: 先頭から順に試し、失敗・期限切れ（deadline 秒）なら次へ
+# kind: "ollama"（/api/chat）または "openai"（LMStudio などの /v1/chat/completions）
+LLM_BACKENDS = [
+    {"name": "primary", "kind": "ollama", "url": API_BASE_URL, "model": MODEL_NAME, "deadline": 20},
+    {"name": "fallback", "kind": "ollama", "url": API_BASE_URL, "model": "qwen2.5vl:3b", "deadline": 10},
+    # {"name": "lmstudio", "kind": "openai", "url": "http://localhost:1234/v1/chat/completions",
+    #  "model": "gemma-3-vision", "deadline": 15, "api_key": API_KEY},
+]
+LLM_IMAGE_LONG_EDGE = 896  # LLM送信画像の長辺（gemma3 の視覚エンコーダ入力に合わせる）
+LLM_IMAGE_MAX_BYTES = 150 * 1024  # LLM送信画像のJPEGサイズ予算
+DESCRIPTION_CACHE_TTL = 300  # 似た訪問者の説明を再利用する期間（秒）
+DESCRIPTION_CACHE_MAX_DISTANCE = 10  # 同一訪問者とみなす知覚ハッシュのハミング距離（64ビット中）
+OLLAMA_KEEP_ALIVE = "10m"  # リクエスト後にモデルを保持する時間（混雑時間帯は自動で延長）
+VISIT_HISTORY_FILE = "visit_history.json"  # 来訪履歴（混雑時間帯の学習用）
+ANALYSIS_COALESCE_WINDOW = 10.0  # 分析開始からこの秒数以内の呼び鈴押下は実行中の分析に合流
+ANALYSIS_MAX_PENDING = 1  # 待ち行列の上限（超えたら古い押下を新しい押下で置き換え）
+SPECULATIVE_LLM_POLICY = "adaptive"  # 顔認識と並行してLLM分析を開始: "off" / "always" / "adaptive"
+SPECULATIVE_MAX_KNOWN_RATIO = 0.6  # adaptive: 直近の既知人物の割合がこれを超えたら投機実行しない
+ANALYSIS_CANCEL_STALE = False  # True: 合流期間を過ぎた押下で実行中の分析（LLM要求）をキャンセル
 
 # YOLO顔認識設定
 YOLO_MODEL_PATH = "runs/train_yolov11/face_identifier/weights/best.pt"  # 学習済みYOLOモデルのパス
 YOLO_CONFIDENCE_THRESHOLD = 0.7  # 顔認識の信頼度閾値
 USE_FACE_DETECTION = True  # 顔認識機能を使用するかどうか
 
+# 推論ワーカー設定（YOLO推論を別プロセスで実行）
+USE_INFERENCE_WORKER = True  # Falseの場合はWebサーバーと同じプロセスで推論
+INFERENCE_WORKERS = 1  # 推論ワーカープロセス数
+INFERENCE_SHARED_SLOTS = 4  # フレーム受け渡し用の共有メモリスロット数
+INFERENCE_SLOT_BYTES = 1920 * 1080 * 3  # 1スロットの容量（最大フレームサイズ）
+INFERENCE_TIMEOUT = 10.0  # 推論結果の待ち時間上限（秒）
+INFERENCE_STARTUP_TIMEOUT = 120.0  # ワーカーのモデル読み込み待ち時間（秒）
+
 # 画像設定
 USE_CAMERA = True  # カメラを使用するかどうか（Falseの場合は画像ファイルを使用）
 CAMERA_ID = "/dev/video0"  # デフォルトカメラ（Docker環境用）
@@ -20,6 +48,7 @@ CAMERA_ID = "/dev/video0"  # デフォルトカメラ（Docker環境用）
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
 FRAME_RATE = 3  # フレームレート
+OVERLAY_DETECTION_TTL = 5.0  # 配信映像に認識結果の枠を表示し続ける秒数
 
 # テスト用画像フォルダ設定（カメラがない場合）
 TEST_IMAGES_DIR = "test_images"  # テスト用画像ファイルのディレクトリ
@@ -0,0 +1,91 @@
+"""
+訪問者説明キャッシュ - 訪問者画像の知覚ハッシュが近ければLLMの説明を再利用
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """DCTベースの知覚ハッシュ（64ビット）"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8].flatten()
+
+    # 直流成分を除いた中央値との大小でビット化
+    bits = low_freq > np.median(low_freq[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def hamming_distance(a: int, b: int) -> int:
+    """ハッシュ間のハミング距離"""
+    return bin(a ^ b).count("1")
+
+class DescriptionCache:
+    """類似した訪問者の説明を TTL 付き LRU で保持"""
+
+    def __init__(self, max_entries: int = 64, ttl: float = 300.0, max_distance: int = 10):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()  # ハッシュ -> (登録時刻, 説明)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def _expire(self, now: float):
+        """期限切れの説明を削除（古い順に並んでいるとは限らないので全件確認）"""
+        expired = [key for key, (stored_at, _) in self.entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        self.stats["expirations"] += len(expired)
+
+    def get(self, image: np.ndarray) -> Optional[str]:
+        """類似した訪問者の説明があれば返す"""
+        image_hash = perceptual_hash(image)
+        now = time.monotonic()
+
+        with self.lock:
+            self._expire(now)
+
+            best_key, best_distance = None, self.max_distance + 1
+            for key in self.entries:
+                distance = hamming_distance(image_hash, key)
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.stats["hits"] += 1
+            return self.entries[best_key][1]
+
+    def put(self, image: np.ndarray, description: str):
+        """説明を登録（上限を超えたら最も使われていないものを削除）"""
+        image_hash = perceptual_hash(image)
+
+        with self.lock:
+            self.entries[image_hash] = (time.monotonic(), description)
+            self.entries.move_to_end(image_hash)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        """キャッシュを消去"""
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict:
+        """ヒット率などの統計"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.entries)
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
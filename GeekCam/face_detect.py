@@ -5,6 +5,7 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 import os
+from inference_worker import InferenceWorkerPool
 try:
     import config
 except ImportError:
@@ -15,6 +16,30 @@ except ImportError:
         DEBUG_MODE = True
     config = Config()
 
+def draw_known_faces(frame, known_faces):
+    """既知の顔の検出結果を画像に描画"""
+    detection_frame = frame.copy()
+    
+    for face_info in known_faces:
+        x1, y1, x2, y2 = face_info['bbox']
+        user_name = face_info['name']
+        confidence = face_info['confidence']
+        
+        color = (0, 255, 0)  # 緑色で既知の顔
+        cv2.rectangle(detection_frame, (x1, y1), (x2, y2), color, 2)
+        
+        # ラベル描画
+        label = f"{user_name} ({confidence:.2f})"
+        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+        cv2.rectangle(detection_frame, 
+                    (x1, y1 - label_size[1] - 10), 
+                    (x1 + label_size[0], y1), 
+                    color, -1)
+        cv2.putText(detection_frame, label, (x1, y1 - 5),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    
+    return detection_frame
+
 class FaceDetector:
     def __init__(self):
         """YOLO顔認識の初期化"""
@@ -41,6 +66,43 @@ class FaceDetector:
             print(f"YOLOモデルの読み込みに失敗しました: {e}")
             self.model = None
     
+    def find_known_faces(self, frame):
+        """
+        YOLO推論で既知の顔を検出（描画なし）
+        
+        Returns:
+            list: [{'name': str, 'confidence': float, 'bbox': [x1,y1,x2,y2]}]
+        """
+        known_faces = []
+        
+        if self.model is None:
+            return known_faces
+        
+        # YOLO推論実行
+        results = self.model(frame, verbose=False)[0]
+        
+        # 検出された顔を処理
+        for box, conf, cls in zip(results.boxes.xyxy, results.boxes.conf, results.boxes.cls):
+            confidence = float(conf)
+            
+            if confidence < self.confidence_threshold:
+                continue
+                
+            # バウンディングボックス
+            x1, y1, x2, y2 = map(int, box.tolist())
+            
+            # クラス名（ユーザー名）を取得
+            class_id = int(cls.item())
+            user_name = self.class_names.get(class_id, f"unknown_{class_id}")
+            
+            known_faces.append({
+                'name': user_name,
+                'confidence': confidence,
+                'bbox': [x1, y1, x2, y2]
+            })
+        
+        return known_faces
+    
     def detect_known_faces(self, frame):
         """
         フレームから既知の顔を検出
@@ -62,48 +124,8 @@ class FaceDetector:
             return result
             
         try:
-            # YOLO推論実行
-            results = self.model(frame, verbose=False)[0]
-            
-            if len(results.boxes) == 0:
-                return result
-            
-            # 検出された顔を処理
-            for box, conf, cls in zip(results.boxes.xyxy, results.boxes.conf, results.boxes.cls):
-                confidence = float(conf)
-                
-                if confidence < self.confidence_threshold:
-                    continue
-                    
-                # バウンディングボックス
-                x1, y1, x2, y2 = map(int, box.tolist())
-                
-                # クラス名（ユーザー名）を取得
-                class_id = int(cls.item())
-                user_name = self.class_names.get(class_id, f"unknown_{class_id}")
-                
-                face_info = {
-                    'name': user_name,
-                    'confidence': confidence,
-                    'bbox': [x1, y1, x2, y2]
-                }
-                
-                result['known_faces'].append(face_info)
-                
-                # 検出結果を画像に描画
-                color = (0, 255, 0)  # 緑色で既知の顔
-                cv2.rectangle(result['detection_frame'], (x1, y1), (x2, y2), color, 2)
-                
-                # ラベル描画
-                label = f"{user_name} ({confidence:.2f})"
-                label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-                cv2.rectangle(result['detection_frame'], 
-                            (x1, y1 - label_size[1] - 10), 
-                            (x1 + label_size[0], y1), 
-                            color, -1)
-                cv2.putText(result['detection_frame'], label, (x1, y1 - 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            
+            result['known_faces'] = self.find_known_faces(frame)
+            result['detection_frame'] = draw_known_faces(frame, result['known_faces'])
             result['has_known_faces'] = len(result['known_faces']) > 0
             
             if config.DEBUG_MODE:
@@ -124,4 +146,86 @@ class FaceDetector:
         """登録済みユーザーのリストを取得"""
         if self.model is None:
             return []
-        return list(self.class_names.values())
\ No newline at end of file
+        return list(self.class_names.values())
+
+def _create_inference_handler():
+    """推論ワーカープロセス内でYOLOモデルを読み込む"""
+    detector = FaceDetector()
+    
+    def handle(method, images):
+        if method == "model_info":
+            return {
+                'available': detector.is_model_available(),
+                'known_users': detector.get_known_users()
+            }
+        return detector.find_known_faces(images[0])
+    
+    return handle
+
+class RemoteFaceDetector:
+    """推論ワーカープロセスでYOLOを実行する FaceDetector 互換クライアント"""
+    
+    def __init__(self):
+        self.known_users = []
+        self.model_available = False
+        self.pool = InferenceWorkerPool(
+            _create_inference_handler,
+            workers=getattr(config, 'INFERENCE_WORKERS', 1),
+            slots=getattr(config, 'INFERENCE_SHARED_SLOTS', 4),
+            slot_bytes=getattr(config, 'INFERENCE_SLOT_BYTES', 1920 * 1080 * 3),
+            timeout=getattr(config, 'INFERENCE_TIMEOUT', 10.0)
+        )
+        self.start()
+    
+    def start(self):
+        """推論ワーカーを起動してモデル情報を取得"""
+        if not self.pool.start():
+            print("推論ワーカーの起動に失敗しました。顔認識機能は無効化されます")
+            return
+        
+        try:
+            # 初回はワーカー側のモデル読み込みを待つ
+            info = self.pool.submit("model_info", [],
+                                    timeout=getattr(config, 'INFERENCE_STARTUP_TIMEOUT', 120.0))
+            self.model_available = info['available']
+            self.known_users = info['known_users']
+            print(f"推論ワーカーでYOLOモデルを読み込みました（登録済みユーザー: {self.known_users}）")
+        except Exception as e:
+            print(f"推論ワーカーの初期化に失敗しました: {e}")
+            self.pool.stop()
+    
+    def detect_known_faces(self, frame):
+        """フレームから既知の顔を検出（推論はワーカープロセスで実行）"""
+        result = {
+            'known_faces': [],
+            'has_known_faces': False,
+            'detection_frame': frame.copy()
+        }
+        
+        if not self.model_available:
+            return result
+        
+        try:
+            result['known_faces'] = self.pool.submit("find_known_faces", [frame])
+            result['detection_frame'] = draw_known_faces(frame, result['known_faces'])
+            result['has_known_faces'] = len(result['known_faces']) > 0
+            
+            if config.DEBUG_MODE:
+                print(f"YOLO検出結果: {len(result['known_faces'])}人の既知の顔を検出")
+                
+        except Exception as e:
+            print(f"YOLO顔検出でエラーが発生しました: {e}")
+        
+        return result
+    
+    def is_model_available(self):
+        """モデルが利用可能かどうか"""
+        return self.model_available
+    
+    def get_known_users(self):
+        """登録済みユーザーのリストを取得"""
+        return list(self.known_users)
+    
+    def stop(self):
+        """推論ワーカーを停止"""
+        self.pool.stop()
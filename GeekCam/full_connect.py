@@ -6,15 +6,20 @@ import sys
 import time
 import cv2
 import numpy as np
-import base64
 import json
 import logging
 import threading
-import requests
 import collections
-import base64
 from datetime import datetime, timedelta
 from flask import Flask, render_template, request, jsonify, Response
+from overlay import FrameOverlay
+from ollama_stream import OllamaStreamError, SentenceSpeaker, split_sentences
+from image_prep import ImagePreparer
+from description_cache import DescriptionCache
+from model_residency import ModelResidencyManager
+from llm_http import get_llm_session
+from llm_router import LLMBackend, LLMRouter, LLMRouterError
+from analysis_scheduler import AnalysisCancelled, AnalysisScheduler
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,7 +30,6 @@ app = Flask(__name__)
 
 # グローバル変数
 camera = None
-is_processing = False
 last_result = None
 frame_buffer = collections.deque(maxlen=30)  # 最大30フレーム（約10秒間）のバッファ
 current_frame = None
@@ -41,6 +45,23 @@ CONFIG = {
     "test_images_dir": "test_images",  # テスト画像ディレクトリ
     "time_offset": 0,              # 呼び鈴時のオフセット（秒）、正：未来、負：過去
     "stream_quality": 75,          # JPEG品質（1-100）
+    "overlay_detection_ttl": 5.0,  # 認識結果の枠を表示し続ける秒数
+    "ollama_streaming": True,      # 応答を文単位で受信し、完成した文から読み上げ
+    "llm_image_long_edge": 896,    # LLM送信画像の長辺
+    "llm_image_max_bytes": 150 * 1024,  # LLM送信画像のJPEGサイズ予算
+    "description_cache_ttl": 300,  # 似た訪問者の説明を再利用する期間（秒）
+    "description_cache_max_distance": 10,  # 同一訪問者とみなす知覚ハッシュの距離
+    "ollama_keep_alive": "10m",    # リクエスト後にモデルを保持する時間
+    "visit_history_file": "visit_history.json",  # 来訪履歴（混雑時間帯の学習用）
+    "llm_backends": [              # 先頭から順に試すLLM（失敗・期限切れなら次へ）
+        {"name": "primary", "kind": "ollama", "url": "http://localhost:11434/api/chat",
+         "model": "gemma3:4b", "deadline": 20},
+        {"name": "fallback", "kind": "ollama", "url": "http://localhost:11434/api/chat",
+         "model": "qwen2.5vl:3b", "deadline": 10},
+    ],
+    "analysis_coalesce_window": 10.0,  # 分析開始からこの秒数以内の押下は実行中の分析に合流
+    "analysis_max_pending": 1,     # 待ち行列の上限（超えたら古い押下を置き換え）
+    "analysis_cancel_stale": False,  # 合流期間を過ぎた押下で実行中の分析をキャンセルするか
     "system_prompt": """
     あなたは視覚障害者や高齢者を支援するAIです。カメラに映っている人物の特徴を簡潔に説明してください。
     以下の情報を含めてください：
@@ -59,6 +80,40 @@ CONFIG = {
     """
 }
 
+# 配信・保存用オーバーレイ（取得フレームには描画しない）
+frame_overlay = FrameOverlay(
+    clock_anchor="top_left",
+    font_scale=0.8,
+    detection_ttl=CONFIG["overlay_detection_ttl"]
+)
+
+# LLM送信画像の準備（訪問者の切り出し・縮小・品質選択）
+image_preparer = ImagePreparer(
+    long_edge=CONFIG["llm_image_long_edge"],
+    max_bytes=CONFIG["llm_image_max_bytes"]
+)
+
+# 似た訪問者のLLM説明を再利用するキャッシュ
+description_cache = DescriptionCache(
+    ttl=CONFIG["description_cache_ttl"],
+    max_distance=CONFIG["description_cache_max_distance"]
+)
+
+# 接続プールを共有するLLM用セッション（呼び鈴ごとのTCP接続確立を避ける）
+llm_session = get_llm_session()
+
+# 複数バックエンドへのルーティング（遮断・軽量モデルへの切り替え）
+llm_router = LLMRouter(llm_session, [LLMBackend.from_dict(backend) for backend in CONFIG["llm_backends"]])
+
+# Ollama モデルの事前読み込み・keep_alive・混雑時間帯の学習
+model_residency = ModelResidencyManager(
+    llm_session,
+    CONFIG["api_url"],
+    "gemma3:4b",
+    history_path=CONFIG["visit_history_file"],
+    keep_alive=CONFIG["ollama_keep_alive"]
+)
+
 # カメラクラス
 class RealtimeCamera:
     def __init__(self, use_camera=False, camera_id=0, frame_rate=3):
@@ -174,23 +229,16 @@ class RealtimeCamera:
                 logger.error("カメラからのフレーム取得に失敗しました")
                 return None
             
-            # フレームにタイムスタンプを追加
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cv2.putText(frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            
             return frame
         else:
             if not self.test_images:
                 return None
                 
             # 次のテスト画像を取得（ローテーション）
-            frame = self.test_images[self.current_test_index].copy()
+            # 時刻表示は配信時のオーバーレイで行うため、テスト画像はコピーせず共有
+            frame = self.test_images[self.current_test_index]
             self.current_test_index = (self.current_test_index + 1) % len(self.test_images)
             
-            # フレームにタイムスタンプを追加
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cv2.putText(frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            
             return frame
 
     def stop(self):
@@ -201,44 +249,50 @@ class RealtimeCamera:
         logger.info("カメラを停止しました")
 
 # 画像分析機能
-def analyze_image(image):
-    """画像をAPIに送信して分析結果を取得"""
+def analyze_image(image, on_sentence=None, cancel_token=None):
+    """画像をAPIに送信して分析結果を取得（on_sentence 指定時は文ごとに逐次通知、cancel_token で受信を中止）"""
     if image is None:
         return "画像の取得に失敗しました"
     
     try:
-        # 画像をBase64エンコード
-        _, buffer = cv2.imencode('.jpg', image)
-        base64_image = base64.b64encode(buffer).decode('utf-8')
-        
-        # APIリクエスト準備
-        headers = {
-            "Content-Type": "application/json",
-        }
+        # 訪問者領域を切り出し、送信用に縮小・エンコード
+        prepared = image_preparer.prepare(image)
+        base64_image = prepared.base64
+        logger.info(f"LLM送信画像: {prepared.summary()}")
         
-        payload = {
-            "model": "gemma3:4b",
-            "messages": [
-                {"role": "system", "content": CONFIG["system_prompt"]},
-                {"role": "user","content": "この画像に映っている人物について説明してください。",
-                "images":[base64_image]},
-            ],
-            "stream": False,
-        }
+        # 直近に似た訪問者を分析済みならその説明を再利用（訪問者を切り出せたときのみ）
+        cached = description_cache.get(prepared.crop) if prepared.cacheable else None
+        if cached is not None:
+            logger.info(f"説明キャッシュにヒット: {cached}")
+            if on_sentence is not None:
+                for sentence in split_sentences(cached):
+                    on_sentence(sentence)
+            return cached
         
-        # APIリクエスト送信
-        response = requests.post(CONFIG["api_url"], headers=headers, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result["message"]["content"]
-            logger.info(f"分析結果: {content}")
-            return content
-        else:
-            error_message = f"API通信エラー: ステータスコード {response.status_code}"
-            logger.error(error_message)
-            return error_message
+        # 先頭のバックエンドから順に試し、遮断中・期限切れなら軽量モデルへ切り替え
+        routed = llm_router.describe(
+            CONFIG["system_prompt"],
+            "この画像に映っている人物について説明してください。",
+            base64_image,
+            on_sentence=on_sentence if CONFIG["ollama_streaming"] else None,
+            keep_alive=model_residency.request_keep_alive(),
+            on_done=model_residency.record_response,
+            cancel_token=cancel_token
+        )
+        content = routed.content
+        logger.info(f"分析結果（{routed.backend}/{routed.model}）: {content}")
+        if prepared.cacheable and not routed.truncated:  # 途中で切れた説明は再利用しない
+            description_cache.put(prepared.crop, content)
+        return content
             
+    except LLMRouterError as e:
+        error_message = str(e)
+        logger.error(error_message)
+        return error_message
+    except OllamaStreamError as e:
+        error_message = str(e)
+        logger.error(error_message)
+        return error_message
     except Exception as e:
         error_message = f"画像分析中にエラーが発生しました: {str(e)}"
         logger.error(error_message)
@@ -307,10 +361,10 @@ def frame_capture_thread():
     while camera and camera.is_running:
         frame = camera.get_frame()
         if frame is not None:
-            # 現在のフレームとバッファを更新
-            current_frame = frame.copy()
+            # 現在のフレームとバッファを更新（取得フレームは以降書き換えないので共有）
+            current_frame = frame
             timestamp = datetime.now()
-            frame_buffer.append((timestamp, frame.copy()))
+            frame_buffer.append((timestamp, frame))
             
             # 古いフレームをクリア
             while len(frame_buffer) > 0:
@@ -332,8 +386,8 @@ def generate_frames():
     
     while stream_active:
         if current_frame is not None:
-            # フレームをJPEG形式にエンコード
-            frame = current_frame.copy()
+            # 時刻・検出枠を重ねてJPEG形式にエンコード
+            frame = frame_overlay.render(current_frame)
             _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, CONFIG["stream_quality"]])
             frame_bytes = buffer.tobytes()
             
@@ -354,17 +408,19 @@ def generate_frames():
         time.sleep(1.0 / CONFIG["frame_rate"])
 
 # 呼び鈴処理関数
-def process_doorbell():
-    """呼び鈴が押されたときの処理（非同期実行用）"""
-    global is_processing, last_result, frame_buffer
+def process_doorbell(cancel_token=None):
+    """呼び鈴が押されたときの処理（分析スケジューラから実行、cancel_token で中止）"""
+    global last_result, frame_buffer
     
-    is_processing = True
     logger.info("呼び鈴処理を開始します")
     
     try:
         # 音声通知
         speak_text("画像分析を開始します。少々お待ちください。")
         
+        # 混雑時間帯の学習用に来訪を記録
+        model_residency.record_visit()
+        
         # オフセットを考慮してフレームを選択
         target_time = datetime.now() + timedelta(seconds=CONFIG["time_offset"])
         selected_frame = None
@@ -391,7 +447,6 @@ def process_doorbell():
                 selected_frame = current_frame.copy()
             else:
                 speak_text("画像の取得に失敗しました。")
-                is_processing = False
                 return "画像の取得に失敗しました"
         
         # 保存用にタイムスタンプを付与
@@ -401,31 +456,53 @@ def process_doorbell():
         # 分析中であることを表示
         cv2.putText(analysis_frame, "分析中...", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
         
-        # 画像分析
-        result = analyze_image(selected_frame)
+        # 完成した文から順に読み上げ・画面表示
+        def show_partial(text):
+            global last_result
+            last_result = text
+        
+        speaker = SentenceSpeaker(speak_text, intro="分析結果: ", on_text=show_partial)
+        
+        # 画像分析（失敗時も読み上げスレッドを終了させる）
+        try:
+            result = analyze_image(selected_frame, on_sentence=speaker, cancel_token=cancel_token)
+        finally:
+            streamed = speaker.finish()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
         last_result = result
         
         # 画像保存
         if not os.path.exists("captures"):
             os.makedirs("captures")
-        cv2.imwrite(f"captures/analysis_{timestamp}.jpg", selected_frame)
+        cv2.imwrite(f"captures/analysis_{timestamp}.jpg", frame_overlay.compose(selected_frame))
         
-        # 音声出力
-        speak_text("分析結果: " + result)
+        # 音声出力（逐次読み上げ済みなら確認の1回のみ）
+        if not streamed:
+            speak_text("分析結果: " + result)
         time.sleep(1)  # 少し間をあける
         speak_text(result)  # 重要なので2回読み上げ
         
         logger.info("呼び鈴処理が完了しました")
-        is_processing = False
         return result
         
+    except AnalysisCancelled:
+        logger.info("呼び鈴処理は新しい押下に置き換えられました")
+        raise
     except Exception as e:
         error_message = f"呼び鈴処理中にエラーが発生しました: {str(e)}"
         logger.error(error_message)
         speak_text("処理中にエラーが発生しました。")
-        is_processing = False
         return error_message
 
+# 呼び鈴押下の合流・待ち行列（押下ごとにスレッドを作らない）
+analysis_scheduler = AnalysisScheduler(
+    process_doorbell,
+    max_pending=CONFIG["analysis_max_pending"],
+    coalesce_window=CONFIG["analysis_coalesce_window"],
+    cancel_stale=CONFIG["analysis_cancel_stale"]
+)
+
 # HTMLをインメモリで提供
 @app.route('/')
 def index():
@@ -815,31 +892,36 @@ def video_feed():
 @app.route('/api/doorbell', methods=['POST'])
 def doorbell():
     """呼び鈴API"""
-    global is_processing
-    
-    if is_processing:
-        return jsonify({
-            'success': False,
-            'message': '別の処理が実行中です'
-        })
+    supersede = bool((request.get_json(silent=True) or {}).get('supersede', False))
     
-    # 非同期で処理
-    threading.Thread(target=process_doorbell, daemon=True).start()
+    # 分析スケジューラに登録（連続押下は実行中の分析に合流し、重複したLLM要求を出さない）
+    _, disposition = analysis_scheduler.submit(supersede=supersede)
+    messages = {
+        'coalesced': '実行中の分析に合流しました',
+        'queued': '分析を開始しました',
+        'superseded': '新しい分析に置き換えました'
+    }
     
     return jsonify({
         'success': True,
-        'message': '分析を開始しました'
+        'message': messages[disposition],
+        'disposition': disposition
     })
 
 @app.route('/api/status', methods=['GET'])
 def status():
     """ステータスAPI"""
-    global is_processing, last_result
+    global last_result
     
+    is_processing = analysis_scheduler.is_busy()
     return jsonify({
         'status': '分析中...' if is_processing else '準備完了',
         'processing': is_processing,
-        'result': last_result if last_result else None
+        'result': last_result if last_result else None,
+        'description_cache': description_cache.get_stats(),
+        'model_residency': model_residency.get_stats(),
+        'analysis_scheduler': analysis_scheduler.get_stats(),
+        'llm_router': llm_router.get_stats()
     })
 
 @app.route('/api/speak', methods=['POST'])
@@ -877,7 +959,7 @@ def capture():
         filename = f"captures/manual_{timestamp}.jpg"
         
         # 画像保存
-        cv2.imwrite(filename, current_frame)
+        cv2.imwrite(filename, frame_overlay.compose(current_frame))
         
         return jsonify({
             'success': True,
@@ -1000,6 +1082,9 @@ def main():
         capture_thread = threading.Thread(target=frame_capture_thread, daemon=True)
         capture_thread.start()
         
+        # モデルの事前読み込みと常駐スケジューラ
+        model_residency.start()
+        
         # 起動メッセージ
         logger.info("システムが起動しました")
         speak_text("玄関訪問者認識システムが起動しました。リアルタイム映像表示を開始します。")
@@ -1018,6 +1103,8 @@ def main():
         
         if camera and camera.is_running:
             camera.stop()
+        analysis_scheduler.stop()
+        model_residency.stop()
         logger.info("システムを終了しました")
 
 if __name__ == "__main__":
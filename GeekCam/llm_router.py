@@ -0,0 +1,346 @@
+"""
+LLMルーター - 複数バックエンド（Ollama / OpenAI互換）を順に試し、遅延・失敗時は軽量モデルへ切り替え
+"""
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ollama_stream import stream_chat
+
+logger = logging.getLogger(__name__)
+
+class LLMRouterError(Exception):
+    """すべてのバックエンドが失敗した"""
+
+    def __init__(self, message: str, attempts: List[Tuple[str, str]]):
+        super().__init__(message)
+        self.attempts = attempts
+
+@dataclass
+class LLMBackend:
+    """ルーティング先（kind: "ollama" は /api/chat、"openai" は /v1/chat/completions の URL）"""
+    name: str
+    kind: str
+    url: str
+    model: str
+    deadline: float = 20.0  # 最初の応答までの期限（秒）。超えたら次のバックエンドへ（ストリーミングは以降、行間の無通信で判定）
+    api_key: str = ""
+    pooled: bool = False  # True: url の代わりに Ollama ノードプールから送信先を選ぶ
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LLMBackend":
+        return cls(
+            name=data.get("name") or data["model"],
+            kind=data.get("kind", "ollama"),
+            url=data["url"],
+            model=data["model"],
+            deadline=float(data.get("deadline", 20.0)),
+            api_key=data.get("api_key", ""),
+            pooled=bool(data.get("pooled", False))
+        )
+
+class CircuitBreaker:
+    """連続失敗または直近の失敗率で遮断し、reset_timeout 後に1件だけ試行（half-open）"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0,
+                 error_rate_threshold: float = 0.5, window: int = 20, min_samples: int = 5):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.outcomes = deque(maxlen=window)  # True: 失敗
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.trial_in_flight = False
+        if self.state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def record_success(self):
+        self.outcomes.append(False)
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+        self.state = "closed"
+
+    def record_cancelled(self):
+        """キャンセルされた試行は成否に数えず、half-open の試行枠だけ戻す"""
+        self.trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """失敗を記録し、遮断状態になったら True"""
+        self.outcomes.append(True)
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        too_many = self.consecutive_failures >= self.failure_threshold
+        too_often = len(self.outcomes) >= self.min_samples and self.error_rate() >= self.error_rate_threshold
+        if self.state == "half_open" or too_many or too_often:
+            opened = self.state != "open"
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            return opened
+        return False
+
+@dataclass
+class RoutedResponse:
+    """ルーティング結果"""
+    content: str
+    backend: str
+    model: str
+    streamed: bool = False
+    first_sentence_time: Optional[float] = None
+    fallback: bool = False  # 先頭以外のバックエンドが応答したか
+    truncated: bool = False  # ストリーミングが途中で切れ、読み上げ済みの文までを返したか
+    attempts: List[Tuple[str, str]] = field(default_factory=list)  # 失敗したバックエンドと理由
+
+class LLMRouter:
+    """順序付きバックエンドへのルーティング（遮断中・期限切れのバックエンドは飛ばす）"""
+
+    def __init__(self, session, backends: List[LLMBackend], failure_threshold: int = 3,
+                 reset_timeout: float = 60.0, latency_window: int = 20, node_pool=None):
+        if not backends:
+            raise ValueError("LLMバックエンドが設定されていません")
+        self.session = session
+        self.backends = backends
+        self.node_pool = node_pool
+        self.breakers = {backend.name: CircuitBreaker(failure_threshold, reset_timeout, window=latency_window)
+                         for backend in backends}
+        self.latencies = {backend.name: deque(maxlen=latency_window) for backend in backends}
+        self.counts = {backend.name: {"requests": 0, "failures": 0, "timeouts": 0, "skipped": 0}
+                       for backend in backends}
+        self.last_errors: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def primary(self) -> LLMBackend:
+        return self.backends[0]
+
+    def _build_payload(self, backend: LLMBackend, system_prompt: str, prompt: str, image_base64: str,
+                       options: Optional[Dict], keep_alive) -> Dict:
+        if backend.kind == "openai":
+            return {
+                "model": backend.model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": [
+                        {"type": "text", "text": prompt},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
+                    ]}
+                ],
+                "max_tokens": (options or {}).get("max_tokens", 150)
+            }
+
+        payload = {
+            "model": backend.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt, "images": [image_base64]}
+            ],
+            "stream": False
+        }
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    def _call(self, backend: LLMBackend, payload: Dict, on_sentence, on_done, cancel_token) -> Tuple[str, bool, Optional[float]]:
+        """1つのバックエンドを期限付きで呼び出す → (本文, 逐次通知したか, 最初の文までの秒数)"""
+        if not (backend.pooled and self.node_pool is not None):
+            return self._send(backend, backend.url, payload, on_sentence, on_done, cancel_token)
+
+        # ノードプールから送信先を選ぶ。文を通知する前の失敗は別のノードで1回だけ再試行
+        tried = set()
+        emitted = []
+
+        def track(sentence: str):
+            emitted.append(sentence)
+            on_sentence(sentence)
+
+        while True:
+            node = self.node_pool.acquire(backend.model, exclude=tried)
+            tried.add(node.url)
+            start_time = time.perf_counter()
+            try:
+                result = self._send(backend, node.url, payload, track if on_sentence is not None else None,
+                                    on_done, cancel_token)
+            except Exception as e:
+                cancelled = cancel_token is not None and cancel_token.cancelled
+                self.node_pool.release(node, backend.model, False, time.perf_counter() - start_time,
+                                       counted=not cancelled)
+                if cancelled or emitted or len(tried) >= min(2, len(self.node_pool.nodes)):
+                    raise
+                logger.warning(f"Ollama ノード {node.url} 失敗のため別ノードで再試行: {e}")
+                continue
+            self.node_pool.release(node, backend.model, True, time.perf_counter() - start_time)
+            return result
+
+    def _send(self, backend: LLMBackend, url: str, payload: Dict, on_sentence, on_done,
+              cancel_token) -> Tuple[str, bool, Optional[float]]:
+        """指定URLへ送信"""
+        headers = {"Authorization": f"Bearer {backend.api_key}"} if backend.api_key else None
+
+        if backend.kind == "ollama" and on_sentence is not None:
+            content, first_sentence_time = stream_chat(
+                self.session, url, payload, on_sentence, timeout=backend.deadline,
+                headers=headers, on_done=on_done, cancel_token=cancel_token
+            )
+            return content, True, first_sentence_time
+
+        response = self.session.post(url, json=payload, headers=headers, timeout=backend.deadline)
+        if response.status_code != 200:
+            raise RuntimeError(f"ステータス {response.status_code}")
+        data = response.json()
+        if backend.kind == "openai":
+            return data["choices"][0]["message"]["content"], False, None
+        if on_done:
+            on_done(data)
+        return data.get("message", {}).get("content", ""), False, None
+
+    def describe(self, system_prompt: str, prompt: str, image_base64: str,
+                 on_sentence: Optional[Callable[[str], None]] = None, options: Optional[Dict] = None,
+                 keep_alive=None, on_done: Optional[Callable[[dict], None]] = None,
+                 cancel_token=None) -> RoutedResponse:
+        """
+        画像の説明を取得。先頭から順に試し、失敗・期限切れなら次のバックエンドへ
+        keep_alive と on_done は先頭（主モデル）のバックエンドにのみ適用する
+        """
+        attempts: List[Tuple[str, str]] = []
+        emitted = []
+        first_sentence_at = []
+
+        def track(sentence: str):
+            if not emitted:
+                first_sentence_at.append(time.perf_counter())
+            emitted.append(sentence)
+            on_sentence(sentence)
+
+        for index, backend in enumerate(self.backends):
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+
+            with self.lock:
+                allowed = self.breakers[backend.name].allow()
+                if not allowed:
+                    self.counts[backend.name]["skipped"] += 1
+            if not allowed:
+                attempts.append((backend.name, "遮断中"))
+                continue
+
+            is_primary = index == 0
+            payload = self._build_payload(backend, system_prompt, prompt, image_base64, options,
+                                          keep_alive if is_primary else None)
+            start_time = time.perf_counter()
+            try:
+                content, streamed, first_sentence_time = self._call(
+                    backend, payload, track if on_sentence is not None else None,
+                    on_done if is_primary else None, cancel_token
+                )
+                if not content:
+                    raise RuntimeError("応答が空です")
+            except Exception as e:
+                elapsed = time.perf_counter() - start_time
+                if cancel_token is not None and cancel_token.cancelled:
+                    # キャンセルはバックエンドの失敗として数えない（試行枠を戻さないと遮断が解けなくなる）
+                    with self.lock:
+                        self.breakers[backend.name].record_cancelled()
+                    raise
+                self._record_failure(backend, elapsed, e, started=bool(emitted))
+                attempts.append((backend.name, str(e)))
+                if emitted:
+                    # 途中まで読み上げた説明を別モデルでやり直すと重複するため、読み上げ済みの文までを結果とする
+                    logger.warning(f"LLMバックエンド {backend.name} の応答が途中で切れたため、受信済みの{len(emitted)}文を返します")
+                    return RoutedResponse(
+                        content="".join(emitted),
+                        backend=backend.name,
+                        model=backend.model,
+                        streamed=True,
+                        first_sentence_time=first_sentence_at[0] - start_time,
+                        fallback=not is_primary,
+                        truncated=True,
+                        attempts=attempts
+                    )
+                continue
+
+            self._record_success(backend, time.perf_counter() - start_time)
+            if not is_primary:
+                logger.warning(f"代替バックエンド {backend.name}（{backend.model}）で応答しました")
+            return RoutedResponse(
+                content=content,
+                backend=backend.name,
+                model=backend.model,
+                streamed=streamed,
+                first_sentence_time=first_sentence_time,
+                fallback=not is_primary,
+                attempts=attempts
+            )
+
+        summary = ", ".join(f"{name}: {reason}" for name, reason in attempts) or "キャンセル"
+        raise LLMRouterError(f"すべてのLLMバックエンドが失敗しました ({summary})", attempts)
+
+    def _record_success(self, backend: LLMBackend, elapsed: float):
+        with self.lock:
+            self.counts[backend.name]["requests"] += 1
+            self.latencies[backend.name].append(elapsed)
+            self.breakers[backend.name].record_success()
+
+    def _record_failure(self, backend: LLMBackend, elapsed: float, error: Exception, started: bool = False):
+        """失敗を記録（started: 文の受信後の失敗。期限は最初の応答までなので経過時間では期限切れと判定しない）"""
+        timed_out = (not started and elapsed >= backend.deadline * 0.95) or "timeout" in type(error).__name__.lower()
+        with self.lock:
+            counts = self.counts[backend.name]
+            counts["requests"] += 1
+            counts["failures"] += 1
+            if timed_out:
+                counts["timeouts"] += 1
+            self.latencies[backend.name].append(elapsed)
+            self.last_errors[backend.name] = str(error)
+            opened = self.breakers[backend.name].record_failure()
+        reason = f"{backend.deadline:g}秒の期限切れ" if timed_out else str(error)
+        logger.error(f"LLMバックエンド {backend.name} 失敗 ({reason})")
+        if opened:
+            logger.warning(f"LLMバックエンド {backend.name} を遮断します")
+
+    def set_primary_model(self, model_name: str):
+        """先頭バックエンドのモデルを切り替え"""
+        self.primary.model = model_name
+
+    def get_stats(self) -> Dict:
+        """バックエンドごとの状態・遅延・失敗率"""
+        stats = {}
+        with self.lock:
+            for backend in self.backends:
+                latencies = sorted(self.latencies[backend.name])
+                breaker = self.breakers[backend.name]
+
+                def percentile(ratio: float) -> float:
+                    if not latencies:
+                        return 0.0
+                    return round(latencies[min(len(latencies) - 1, int(len(latencies) * ratio))] * 1000, 1)
+
+                stats[backend.name] = dict(
+                    self.counts[backend.name],
+                    kind=backend.kind,
+                    model=backend.model,
+                    deadline=backend.deadline,
+                    state=breaker.state,
+                    error_rate=round(breaker.error_rate(), 3),
+                    p50_ms=percentile(0.5),
+                    p95_ms=percentile(0.95),
+                    last_error=self.last_errors.get(backend.name)
+                )
+        return stats
@@ -0,0 +1,167 @@
+"""
+Ollama ストリーミング応答 - NDJSON チャンクを逐次受信し、文が完成するたびに通知
+"""
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_DELIMITERS = "。！？"
+
+class OllamaStreamError(Exception):
+    """ストリーミング応答のエラー"""
+    pass
+
+class SentenceSplitter:
+    """逐次届くテキストを日本語の文末（。！？）で区切る"""
+
+    def __init__(self, delimiters: str = SENTENCE_DELIMITERS):
+        # 文末記号の直後の閉じ括弧までを1文に含める
+        escaped = re.escape(delimiters)
+        self.pattern = re.compile(f"[^{escaped}]*[{escaped}]+[」』）)]*")
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """テキストを追加し、完成した文を返す"""
+        self.buffer += text
+        sentences = []
+        position = 0
+
+        for match in self.pattern.finditer(self.buffer):
+            # 末尾で終わる一致は閉じ括弧が続く可能性があるため次のチャンクを待つ
+            if match.end() >= len(self.buffer):
+                break
+            sentence = match.group().strip()
+            if sentence:
+                sentences.append(sentence)
+            position = match.end()
+
+        self.buffer = self.buffer[position:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """残りのテキストを最後の文として返す"""
+        sentence = self.buffer.strip()
+        self.buffer = ""
+        return sentence or None
+
+def split_sentences(text: str) -> List[str]:
+    """完成済みのテキストを文に分割"""
+    splitter = SentenceSplitter()
+    sentences = splitter.feed(text)
+    remainder = splitter.flush()
+    if remainder:
+        sentences.append(remainder)
+    return sentences
+
+def stream_chat(session, url: str, payload: dict, on_sentence: Optional[Callable[[str], None]] = None,
+                timeout: float = 30, headers: dict = None,
+                on_done: Optional[Callable[[dict], None]] = None,
+                cancel_token=None) -> Tuple[str, Optional[float]]:
+    """
+    /api/chat をストリーミングで呼び出し、文ごとに on_sentence を呼ぶ
+    on_done には最終チャンク（load_duration などの統計を含む）を渡す
+    cancel_token（CancelToken）が中止されると応答を閉じ、OllamaStreamError を送出する
+
+    Returns:
+        (応答全文, 最初の文が届くまでの秒数)
+    """
+    start_time = time.time()
+    first_sentence_time = None
+    splitter = SentenceSplitter()
+    parts = []
+
+    def emit(sentence: str):
+        nonlocal first_sentence_time
+        if first_sentence_time is None:
+            first_sentence_time = time.time() - start_time
+            logger.info(f"最初の文を受信 ({first_sentence_time:.2f}s): {sentence}")
+        if on_sentence:
+            try:
+                on_sentence(sentence)
+            except Exception as e:
+                logger.error(f"文の通知エラー: {e}")
+
+    response = session.post(url, json=dict(payload, stream=True), headers=headers,
+                            timeout=timeout, stream=True)
+    if cancel_token is not None:
+        cancel_token.add_callback(response.close)
+    try:
+        if response.status_code != 200:
+            raise OllamaStreamError(f"API通信エラー: ステータス {response.status_code}")
+
+        for line in response.iter_lines():
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+            if not line:
+                continue
+
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise OllamaStreamError(f"Ollamaエラー: {chunk['error']}")
+
+            text = chunk.get("message", {}).get("content", "")
+            if text:
+                parts.append(text)
+                for sentence in splitter.feed(text):
+                    emit(sentence)
+
+            if chunk.get("done"):
+                if on_done:
+                    on_done(chunk)
+                break
+
+        if cancel_token is not None and cancel_token.cancelled:
+            raise OllamaStreamError("ストリーミング分析はキャンセルされました")
+
+        remainder = splitter.flush()
+        if remainder:
+            emit(remainder)
+
+    finally:
+        response.close()
+
+    return "".join(parts), first_sentence_time
+
+class SentenceSpeaker:
+    """受信した文を生成と並行して順番に読み上げる（同期的な読み上げ関数用）"""
+
+    def __init__(self, speak: Callable[[str], object], intro: str = "",
+                 on_text: Optional[Callable[[str], None]] = None):
+        self.speak = speak
+        self.intro = intro
+        self.on_text = on_text
+        self.sentences = []
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __call__(self, sentence: str):
+        """stream_chat の on_sentence として使う"""
+        if not self.sentences and self.intro:
+            self.queue.put(self.intro)
+        self.sentences.append(sentence)
+        self.queue.put(sentence)
+        if self.on_text:
+            self.on_text("".join(self.sentences))
+
+    def _run(self):
+        while True:
+            sentence = self.queue.get()
+            if sentence is None:
+                break
+            try:
+                self.speak(sentence)
+            except Exception as e:
+                logger.error(f"逐次読み上げエラー: {e}")
+
+    def finish(self) -> bool:
+        """読み上げ完了を待つ（1文でも読み上げたら True）"""
+        self.queue.put(None)
+        self.thread.join()
+        return bool(self.sentences)
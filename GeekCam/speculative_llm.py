@@ -0,0 +1,167 @@
+"""
+投機的LLM分析 - 顔認識と並行してLLM分析を開始し、既知の人物と確定した時点でキャンセル
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from analysis_scheduler import CancelToken
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_POLICIES = ("off", "always", "adaptive")
+
+class SpeculativeAnalysis:
+    """
+    バックグラウンドで実行中のLLM分析
+    確定（result）までは届いた文を保留し、既知の人物なら読み上げずに破棄する
+    """
+
+    def __init__(self, analyze: Callable, controller: "SpeculationController",
+                 parent_token: Optional[CancelToken] = None):
+        self.analyze = analyze
+        self.controller = controller
+        self.token = CancelToken()
+        self.buffered: List[str] = []
+        self.on_sentence: Optional[Callable[[str], None]] = None
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.result_value = None
+        self.error: Optional[BaseException] = None
+        self.resolved = False
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+        # 呼び鈴処理自体が置き換えられた場合は投機分析も止める
+        if parent_token is not None:
+            parent_token.add_callback(self.token.cancel)
+
+        self.thread = threading.Thread(target=self._run, name="speculative-llm", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.result_value = self.analyze(self._on_sentence, self.token)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished_at = time.perf_counter()
+            self.done.set()
+
+    def _on_sentence(self, sentence: str):
+        """確定前は保留、確定後は呼び出し元へそのまま渡す"""
+        with self.lock:
+            if self.on_sentence is None:
+                self.buffered.append(sentence)
+                return
+            on_sentence = self.on_sentence
+        on_sentence(sentence)
+
+    def _elapsed_ms(self, until: float) -> float:
+        end = self.finished_at if self.finished_at is not None else until
+        return (min(end, until) - self.started_at) * 1000
+
+    def result(self, on_sentence: Optional[Callable[[str], None]] = None, timeout: Optional[float] = None):
+        """投機分析を採用：保留中の文を流し、完了を待って結果を返す"""
+        committed_at = time.perf_counter()
+        # 保留分を流し終えるまで新しい文を待たせ、順序を保つ
+        with self.lock:
+            self.resolved = True
+            self.on_sentence = on_sentence or (lambda sentence: None)
+            for sentence in self.buffered:
+                self.on_sentence(sentence)
+            self.buffered = []
+
+        # 認識と重なっていた時間が、逐次実行に比べて短縮できた時間
+        self.controller._record_used(self._elapsed_ms(committed_at))
+
+        if not self.done.wait(timeout):
+            self.token.cancel()
+            raise TimeoutError("投機的LLM分析が時間内に完了しませんでした")
+        if self.error is not None:
+            raise self.error
+        return self.result_value
+
+    def cancel(self):
+        """投機分析を破棄（既知の人物・顔なしの場合）"""
+        with self.lock:
+            if self.resolved:
+                return
+            self.resolved = True
+            self.buffered = []
+        self.token.cancel()
+        self.controller._record_wasted(self._elapsed_ms(time.perf_counter()))
+
+class SpeculationController:
+    """
+    投機実行の方針と統計
+    - off: 従来どおり認識後にLLMを実行
+    - always: 毎回認識と並行してLLMを開始
+    - adaptive: 直近の来訪で既知の人物の割合が max_known_ratio 以下のときだけ投機実行
+    """
+
+    def __init__(self, policy: str = "adaptive", max_known_ratio: float = 0.6, history: int = 20):
+        if policy not in SPECULATION_POLICIES:
+            logger.warning(f"不明な投機実行ポリシー: {policy}（adaptive を使用）")
+            policy = "adaptive"
+        self.policy = policy
+        self.max_known_ratio = max_known_ratio
+        self.outcomes = deque(maxlen=history)  # True: 既知の人物
+        self.lock = threading.Lock()
+        self.stats = {"started": 0, "used": 0, "cancelled": 0, "skipped": 0,
+                      "saved_ms": 0.0, "wasted_ms": 0.0}
+
+    def known_ratio(self) -> float:
+        with self.lock:
+            return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def should_speculate(self) -> bool:
+        """今回の来訪で投機実行するか"""
+        if self.policy == "off":
+            return False
+        if self.policy == "adaptive" and self.known_ratio() > self.max_known_ratio:
+            with self.lock:
+                self.stats["skipped"] += 1
+            return False
+        return True
+
+    def begin(self, analyze: Callable, parent_token: Optional[CancelToken] = None) -> SpeculativeAnalysis:
+        """
+        analyze(on_sentence, cancel_token) を並行して開始
+        Returns: 採用なら result()、不要なら cancel() を呼ぶ
+        """
+        with self.lock:
+            self.stats["started"] += 1
+        return SpeculativeAnalysis(analyze, self, parent_token)
+
+    def record_outcome(self, known: bool):
+        """認識結果を記録（adaptive 方針の判断材料）"""
+        with self.lock:
+            self.outcomes.append(bool(known))
+
+    def _record_used(self, saved_ms: float):
+        with self.lock:
+            self.stats["used"] += 1
+            self.stats["saved_ms"] += saved_ms
+        logger.info(f"投機的LLM分析を採用（認識と並行して {saved_ms:.0f}ms 先行）")
+
+    def _record_wasted(self, wasted_ms: float):
+        with self.lock:
+            self.stats["cancelled"] += 1
+            self.stats["wasted_ms"] += wasted_ms
+        logger.info(f"投機的LLM分析をキャンセル（{wasted_ms:.0f}ms 分のLLM処理が無駄）")
+
+    def get_stats(self) -> Dict:
+        """短縮できた時間と無駄になったLLM処理時間"""
+        known_ratio = self.known_ratio()
+        with self.lock:
+            stats = dict(self.stats)
+        stats["policy"] = self.policy
+        stats["known_ratio"] = round(known_ratio, 3)
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["wasted_ms"] = round(stats["wasted_ms"], 1)
+        stats["avg_saved_ms"] = round(stats["saved_ms"] / stats["used"], 1) if stats["used"] else 0.0
+        stats["avg_wasted_ms"] = round(stats["wasted_ms"] / stats["cancelled"], 1) if stats["cancelled"] else 0.0
+        return stats
@@ -2,15 +2,20 @@
 API通信モジュール - Ollama専用、依存性最小化
 """
 import requests
-import base64
 import json
 import time
 import logging
-import cv2
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 import config
 from models import CameraFrame, APIResponse
+from ollama_stream import OllamaStreamError, split_sentences
+from llm_router import LLMBackend, LLMRouter, LLMRouterError
+from ollama_pool import OllamaNodePool
+from image_prep import ImagePreparer, PreparedImage
+from description_cache import DescriptionCache
+from model_residency import ModelResidencyManager
+from llm_http import get_llm_client, get_llm_session
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +26,50 @@ class OllamaClient:
         self.base_url = config.OLLAMA_BASE_URL
         self.model_name = config.MODEL_NAME
         self.timeout = config.REQUEST_TIMEOUT
-        self.session = requests.Session()
+        # 接続プールを共有するLLM用セッション（httpx がなければ requests.Session）
+        self.session = get_llm_session()
+        self.image_preparer = ImagePreparer(
+            long_edge=config.LLM_IMAGE_LONG_EDGE,
+            max_bytes=config.LLM_IMAGE_MAX_BYTES,
+            max_quality=config.LLM_IMAGE_MAX_QUALITY,
+            min_quality=config.LLM_IMAGE_MIN_QUALITY,
+            use_person_detector=config.LLM_IMAGE_USE_PERSON_DETECTOR
+        )
+        self.description_cache = DescriptionCache(
+            max_entries=config.DESCRIPTION_CACHE_MAX_ENTRIES,
+            ttl=config.DESCRIPTION_CACHE_TTL,
+            max_distance=config.DESCRIPTION_CACHE_MAX_DISTANCE
+        ) if config.DESCRIPTION_CACHE_ENABLED else None
+        backends = [LLMBackend.from_dict(backend) for backend in config.LLM_BACKENDS]
+        self.residency = ModelResidencyManager(
+            self.session,
+            self.base_url,
+            self.model_name,
+            history_path=config.VISIT_HISTORY_FILE,
+            keep_alive=config.OLLAMA_KEEP_ALIVE,
+            busy_keep_alive=config.OLLAMA_BUSY_KEEP_ALIVE,
+            idle_unload_minutes=config.OLLAMA_IDLE_UNLOAD_MINUTES,
+            preload_lead_minutes=config.OLLAMA_PRELOAD_LEAD_MINUTES,
+            busy_threshold=config.OLLAMA_BUSY_VISITS_PER_WEEK,
+            # 主モデルをノードプールから送る場合は全ノードで事前読み込み・解放する
+            chat_urls=config.OLLAMA_NODES if backends[0].pooled else None
+        )
+        
+        self.node_pool = OllamaNodePool(
+            self.session,
+            config.OLLAMA_NODES,
+            eject_failures=config.OLLAMA_NODE_EJECT_FAILURES,
+            eject_seconds=config.OLLAMA_NODE_EJECT_SECONDS,
+            ps_interval=config.OLLAMA_NODE_CHECK_INTERVAL
+        )
+        self.router = LLMRouter(
+            self.session,
+            backends,
+            failure_threshold=config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=config.LLM_CIRCUIT_RESET_SECONDS,
+            latency_window=config.LLM_LATENCY_WINDOW,
+            node_pool=self.node_pool
+        )
         
         # セッション設定
         self.session.headers.update({
@@ -45,7 +93,7 @@ class OllamaClient:
                 logger.error(f"Ollama API接続テスト失敗: ステータス {response.status_code}")
                 return False
                 
-        except requests.exceptions.ConnectError:
+        except requests.exceptions.ConnectionError:
             logger.error("Ollama APIサーバーに接続できません。Ollamaが起動しているか確認してください。")
             return False
         except Exception as e:
@@ -71,83 +119,81 @@ class OllamaClient:
             logger.error(f"モデル一覧取得エラー: {e}")
             return []
     
-    def analyze_image(self, frame: CameraFrame) -> APIResponse:
-        """画像分析リクエスト"""
+    def analyze_image(self, frame: CameraFrame,
+                      on_sentence: Optional[Callable[[str], None]] = None,
+                      face_boxes: Optional[List[Tuple[int, int, int, int]]] = None,
+                      cancel_token=None) -> APIResponse:
+        """画像分析リクエスト（on_sentence 指定時は文ごとに逐次通知、cancel_token で受信を中止）"""
         start_time = time.time()
         
         try:
-            # 画像をBase64エンコード
-            base64_image = self._encode_image(frame.image)
-            if not base64_image:
+            # 訪問者領域を切り出して送信用に縮小・エンコード
+            prepared = self._prepare_image(frame.image, face_boxes)
+            if not prepared:
                 return APIResponse(
                     success=False,
                     error_message="画像のエンコードに失敗しました"
                 )
+            base64_image = prepared.base64
+            
+            # 直近に似た訪問者を分析済みならその説明を再利用
+            cached_response = self._lookup_cached_description(prepared, on_sentence, start_time)
+            if cached_response:
+                return cached_response
             
-            # APIリクエスト構築
-            payload = {
-                "model": self.model_name,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": config.SYSTEM_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": "この画像に映っている人物について説明してください。",
-                        "images": [base64_image]
-                    }
-                ],
-                "stream": False,
-                "options": {
+            # 先頭のバックエンドから順に試し、遮断中・期限切れなら軽量モデルへ切り替え
+            routed = self.router.describe(
+                config.SYSTEM_PROMPT,
+                "この画像に映っている人物について説明してください。",
+                base64_image,
+                on_sentence=on_sentence if config.OLLAMA_STREAMING else None,
+                options={
                     "temperature": 0.7,
                     "top_p": 0.9,
                     "max_tokens": 150
-                }
-            }
+                },
+                keep_alive=self.residency.request_keep_alive(),
+                on_done=self.residency.record_response,
+                cancel_token=cancel_token
+            )
+            response_time = time.time() - start_time
+            
+            logger.info(f"API分析成功 ({response_time:.2f}s, {routed.backend}/{routed.model}, "
+                        f"最初の文 {routed.first_sentence_time or 0:.2f}s, "
+                        f"送信 {len(prepared.jpeg) / 1024:.1f}KB): {routed.content[:100]}...")
             
-            # APIリクエスト送信
-            response = self.session.post(
-                self.base_url,
-                json=payload,
-                timeout=self.timeout
+            api_response = APIResponse(
+                success=True,
+                content=routed.content,
+                response_time=response_time,
+                model_used=routed.model,
+                first_sentence_time=routed.first_sentence_time or 0.0,
+                streamed=routed.streamed,
+                payload_bytes=len(prepared.jpeg)
             )
+            if not routed.truncated:
+                # 途中で切れた説明は再利用しない
+                self._store_description(prepared, api_response)
+            return api_response
             
-            response_time = time.time() - start_time
+        except LLMRouterError as e:
+            error_msg = str(e)
+            logger.error(error_msg)
+            return APIResponse(
+                success=False,
+                error_message=error_msg,
+                response_time=time.time() - start_time
+            )
+            
+        except OllamaStreamError as e:
+            error_msg = str(e)
+            logger.error(error_msg)
+            return APIResponse(
+                success=False,
+                error_message=error_msg,
+                response_time=time.time() - start_time
+            )
             
-            if response.status_code == 200:
-                data = response.json()
-                content = data.get("message", {}).get("content", "")
-                
-                if not content:
-                    return APIResponse(
-                        success=False,
-                        error_message="APIからの応答が空です",
-                        response_time=response_time
-                    )
-                
-                logger.info(f"API分析成功 ({response_time:.2f}s): {content[:100]}...")
-                
-                return APIResponse(
-                    success=True,
-                    content=content,
-                    response_time=response_time,
-                    model_used=self.model_name
-                )
-                
-            else:
-                error_msg = f"API通信エラー: ステータス {response.status_code}"
-                if response.text:
-                    error_msg += f" - {response.text[:200]}"
-                
-                logger.error(error_msg)
-                
-                return APIResponse(
-                    success=False,
-                    error_message=error_msg,
-                    response_time=response_time
-                )
-                
         except requests.exceptions.Timeout:
             error_msg = f"API要求がタイムアウトしました ({self.timeout}秒)"
             logger.error(error_msg)
@@ -157,7 +203,7 @@ class OllamaClient:
                 response_time=time.time() - start_time
             )
             
-        except requests.exceptions.ConnectError:
+        except requests.exceptions.ConnectionError:
             error_msg = "Ollamaサーバーに接続できません"
             logger.error(error_msg)
             return APIResponse(
@@ -175,23 +221,61 @@ class OllamaClient:
                 response_time=time.time() - start_time
             )
     
-    def _encode_image(self, image) -> Optional[str]:
-        """画像をBase64エンコード"""
+    def _lookup_cached_description(self, prepared: PreparedImage,
+                                   on_sentence: Optional[Callable[[str], None]],
+                                   start_time: float) -> Optional[APIResponse]:
+        """説明キャッシュを検索（ヒット時はストリーミング時と同じく文ごとに通知）"""
+        if self.description_cache is None or not prepared.cacheable:
+            return None
+        
+        content = self.description_cache.get(prepared.crop)
+        if content is None:
+            return None
+        
+        logger.info(f"説明キャッシュにヒット: {content[:100]}...")
+        if on_sentence is not None:
+            for sentence in split_sentences(content):
+                on_sentence(sentence)
+        
+        return APIResponse(
+            success=True,
+            content=content,
+            response_time=time.time() - start_time,
+            model_used=self.model_name,
+            streamed=on_sentence is not None,
+            cached=True
+        )
+    
+    def _store_description(self, prepared: PreparedImage, api_response: APIResponse):
+        """成功した説明をキャッシュに登録"""
+        if self.description_cache is not None and api_response.success and prepared.cacheable:
+            self.description_cache.put(prepared.crop, api_response.content)
+    
+    def get_router_stats(self) -> dict:
+        """LLMバックエンドごとの遮断状態・遅延・失敗率"""
+        return self.router.get_stats()
+    
+    def get_node_stats(self) -> dict:
+        """Ollama ノードごとの未処理数・常駐モデル・除外状態"""
+        return self.node_pool.get_stats()
+    
+    def get_http_stats(self) -> dict:
+        """LLM HTTPクライアントの統計（再試行・タイムアウト・キャンセル）"""
+        client = get_llm_client()
+        return client.get_stats() if client else {"pooled": False}
+    
+    def get_cache_stats(self) -> dict:
+        """説明キャッシュの統計"""
+        if self.description_cache is None:
+            return {"enabled": False}
+        return dict(self.description_cache.get_stats(), enabled=True)
+    
+    def _prepare_image(self, image, face_boxes=None) -> Optional[PreparedImage]:
+        """訪問者領域の切り出し・縮小・品質選択を行いJPEG化"""
         try:
-            # OpenCV画像をJPEGとしてエンコード
-            success, buffer = cv2.imencode('.jpg', image, [
-                cv2.IMWRITE_JPEG_QUALITY, 85
-            ])
-            
-            if not success:
-                logger.error("画像のJPEGエンコードに失敗")
-                return None
-            
-            # Base64エンコード
-            base64_image = base64.b64encode(buffer).decode('utf-8')
-            
-            logger.debug(f"画像をBase64エンコード完了 ({len(base64_image)} 文字)")
-            return base64_image
+            prepared = self.image_preparer.prepare(image, face_boxes)
+            logger.info(f"LLM送信画像: {prepared.summary()}")
+            return prepared
             
         except Exception as e:
             logger.error(f"画像エンコードエラー: {e}")
@@ -239,6 +323,8 @@ class OllamaClient:
                 return False
             
             self.model_name = model_name
+            self.residency.model_name = model_name
+            self.router.set_primary_model(model_name)
             logger.info(f"使用モデルを切り替え: {model_name}")
             return True
             
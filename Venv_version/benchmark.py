@@ -0,0 +1,252 @@
+"""
+性能ベンチマーク - 認識パイプライン各段の処理時間計測
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import cv2
+import numpy as np
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+import config
+
+
+def load_benchmark_images(image_dir: str = None) -> List[np.ndarray]:
+    """ベンチマーク用画像を読み込み"""
+    directory = Path(image_dir) if image_dir else config.TEST_IMAGES_DIR
+    images = []
+
+    for image_path in sorted(directory.glob("*")):
+        if image_path.suffix.lower() not in ['.jpg', '.jpeg', '.png', '.bmp']:
+            continue
+        image = cv2.imread(str(image_path))
+        if image is not None:
+            images.append(image)
+
+    print(f"ベンチマーク画像: {len(images)}枚 ({directory})")
+    return images
+
+def load_video_frames(video_path: str, max_frames: int = 300) -> List[np.ndarray]:
+    """動画ファイルから連続フレームを読み込み"""
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+
+    print(f"動画フレーム: {len(frames)}枚 ({video_path})")
+    return frames
+
+def to_camera_frames(images: List[np.ndarray], frame_rate: float) -> list:
+    """画像列を一定間隔のタイムスタンプ付き CameraFrame に変換"""
+    from models import CameraFrame
+
+    start_time = datetime.now()
+    return [
+        CameraFrame(
+            image=image,
+            timestamp=start_time + timedelta(seconds=index / frame_rate),
+            width=image.shape[1],
+            height=image.shape[0],
+            source="benchmark"
+        )
+        for index, image in enumerate(images)
+    ]
+
+def measure(func, images: List[np.ndarray], repeat: int) -> dict:
+    """画像ごとの処理時間を計測（初回はウォームアップとして除外）"""
+    func(images[0])
+
+    timings = []
+    results = []
+    for _ in range(repeat):
+        for image in images:
+            start_time = time.perf_counter()
+            results.append(func(image))
+            timings.append(time.perf_counter() - start_time)
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        "mean_ms": float(np.mean(timings_ms)),
+        "p50_ms": float(np.percentile(timings_ms, 50)),
+        "p95_ms": float(np.percentile(timings_ms, 95)),
+        "results": results
+    }
+
+def print_row(label: str, stats: dict, extra: str = ""):
+    """計測結果を1行表示"""
+    print(f"{label:<28} 平均 {stats['mean_ms']:8.1f}ms  "
+          f"p50 {stats['p50_ms']:8.1f}ms  p95 {stats['p95_ms']:8.1f}ms  {extra}")
+
+def benchmark_face_detection(images: List[np.ndarray], repeat: int):
+    """顔位置検出の縮小率・モデル別の処理時間"""
+    print("\n" + "=" * 60)
+    print(" 顔位置検出ベンチマーク (face_recognition)")
+    print("=" * 60)
+
+    from face_recognition_advanced import AdvancedFaceRecognizer
+    recognizer = AdvancedFaceRecognizer()
+
+    if not recognizer.is_available():
+        print("✗ face_recognition ライブラリが利用できません")
+        return
+
+    rgb_images = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in images]
+    settings = [
+        (model, scale, upsample)
+        for model in ["hog", "cnn"]
+        for scale in [1.0, 0.5, 0.25]
+        for upsample in [0, 1]
+    ]
+
+    baseline_faces = None
+    for model, scale, upsample in settings:
+        recognizer.detection_model = model
+        recognizer.detection_scale = scale
+        recognizer.detection_upsample = upsample
+
+        try:
+            stats = measure(recognizer.locate_faces, rgb_images, repeat)
+        except Exception as e:
+            print(f"{model} scale={scale} upsample={upsample}: エラー {e}")
+            continue
+
+        face_count = sum(len(locations) for locations in stats["results"][:len(rgb_images)])
+        if baseline_faces is None:
+            baseline_faces = face_count
+
+        print_row(f"{model} scale={scale} up={upsample}", stats,
+                  f"検出顔数 {face_count} (基準 {baseline_faces})")
+
+def benchmark_mediapipe_modes(images: List[np.ndarray], repeat: int, video_path: str = None):
+    """MediaPipe 静止画モードと動画モードのフレームあたり処理時間"""
+    print("\n" + "=" * 60)
+    print(" MediaPipe 静止画 / 動画モード比較")
+    print("=" * 60)
+
+    from face_recognition_module_updated import MediaPipeFaceRecognizer, MediaPipeVideoFaceRecognizer
+
+    # 動画がない場合は各画像を repeat 回続けて流し、静止した来訪者を模擬する
+    if video_path:
+        sequence = load_video_frames(video_path)
+    else:
+        sequence = [image for image in images for _ in range(repeat)]
+    frames = to_camera_frames(sequence, config.FRAME_RATE)
+
+    if not frames:
+        print("✗ フレームがありません")
+        return
+
+    for label, recognizer_class in [("still (solutions)", MediaPipeFaceRecognizer),
+                                    ("video (tasks)", MediaPipeVideoFaceRecognizer)]:
+        recognizer = recognizer_class()
+        if not recognizer.is_available():
+            print(f"✗ {label}: 利用できません")
+            continue
+
+        # 時刻順に1回だけ流す（動画モードはタイムスタンプの巻き戻りを許さない）
+        stats = measure(recognizer.detect_faces, frames, 1)
+        face_count = sum(len(detections) for detections in stats["results"])
+        extra = f"検出顔数 {face_count}"
+        if hasattr(recognizer, "stats"):
+            extra += f"  推論実行 {recognizer.stats['detections_run']}/{recognizer.stats['frames']}フレーム"
+        print_row(label, stats, extra)
+
+def benchmark_llm_payload(images: List[np.ndarray]):
+    """LLM送信画像の準備前後のペイロードと応答時間"""
+    print("\n" + "=" * 60)
+    print(" LLM送信画像 準備前後の比較")
+    print("=" * 60)
+
+    import base64
+    from api_client import OllamaClient
+
+    client = OllamaClient()
+    ollama_available = client.test_connection()
+    if not ollama_available:
+        print("✗ Ollamaに接続できないため、ペイロードのみ比較します")
+
+    def request_seconds(base64_image: str) -> float:
+        """非ストリーミングで1回分析して応答時間を返す"""
+        payload = {
+            "model": client.model_name,
+            "messages": [
+                {"role": "system", "content": config.SYSTEM_PROMPT},
+                {"role": "user", "content": "この画像に映っている人物について説明してください。",
+                 "images": [base64_image]}
+            ],
+            "stream": False
+        }
+        start_time = time.perf_counter()
+        client.session.post(client.base_url, json=payload, timeout=client.timeout)
+        return time.perf_counter() - start_time
+
+    for index, image in enumerate(images):
+        # 準備前: 従来どおりフレーム全体を品質85でエンコード
+        _, full_buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        prepared = client.image_preparer.prepare(image)
+
+        line = (f"画像{index + 1}: 準備前 {image.shape[1]}x{image.shape[0]} {len(full_buffer) / 1024:7.1f}KB"
+                f"  → 準備後 {prepared.size[0]}x{prepared.size[1]} {len(prepared.jpeg) / 1024:7.1f}KB"
+                f" q={prepared.quality} ({prepared.region_source}, {prepared.prep_ms:.1f}ms)")
+
+        if ollama_available:
+            # 初回のモデル読み込みを計測に含めない
+            if index == 0:
+                request_seconds(prepared.base64)
+            before = request_seconds(base64.b64encode(full_buffer).decode('utf-8'))
+            after = request_seconds(prepared.base64)
+            line += f"  応答 {before:.2f}s → {after:.2f}s"
+
+        print(line)
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="認識パイプライン性能ベンチマーク",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python benchmark.py detection           # 顔位置検出の縮小率・モデル比較
+  python benchmark.py mediapipe --video visitor.mp4  # MediaPipe 静止画/動画モード比較
+  python benchmark.py llm                 # LLM送信画像の準備前後のサイズ・応答時間
+  python benchmark.py all --repeat 5      # すべてのベンチマーク
+"""
+    )
+
+    parser.add_argument(
+        "target",
+        choices=["detection", "mediapipe", "llm", "all"],
+        help="計測対象"
+    )
+    parser.add_argument("--images", help="ベンチマーク画像ディレクトリ（デフォルト: config.TEST_IMAGES_DIR）")
+    parser.add_argument("--repeat", type=int, default=3, help="画像ごとの繰り返し回数")
+    parser.add_argument("--video", help="連続フレーム比較に使う動画ファイル（mediapipe）")
+
+    args = parser.parse_args()
+
+    images = load_benchmark_images(args.images)
+    if not images and not args.video:
+        print("✗ ベンチマーク画像がありません")
+        return
+
+    if args.target in ["detection", "all"]:
+        benchmark_face_detection(images, args.repeat)
+
+    if args.target in ["mediapipe", "all"]:
+        benchmark_mediapipe_modes(images, args.repeat, args.video)
+
+    if args.target in ["llm", "all"]:
+        benchmark_llm_payload(images)
+
+if __name__ == "__main__":
+    main()
@@ -227,16 +227,12 @@ class CameraManager:
                 # テスト画像からフレーム取得
                 if not self.test_images:
                     return None
-                frame = self.test_images[self.current_test_index].copy()
+                frame = self.test_images[self.current_test_index]
                 self.current_test_index = (self.current_test_index + 1) % len(self.test_images)
                 source = "test_image"
                 logger.debug(f"テスト画像 {self.current_test_index}/{len(self.test_images)} を使用")
             
-            # タイムスタンプ追加（元のコードと同じ）
-            timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cv2.putText(frame, timestamp_str, (10, frame.shape[0] - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-            
+            # 時刻表示は配信・保存時にオーバーレイで描画（取得画像は加工しない）
             # CameraFrameオブジェクト作成
             camera_frame = CameraFrame(
                 image=frame,
@@ -259,7 +255,7 @@ class CameraManager:
     def get_current_frame(self) -> Optional[CameraFrame]:
         """最新フレームを取得（スレッドセーフ）"""
         with self.frame_lock:
-            return self.current_frame.copy() if self.current_frame else None
+            return self.current_frame
     
     def stop(self):
         """カメラ停止"""
@@ -289,7 +285,7 @@ class FrameBuffer:
     def get_latest_frame(self) -> Optional[CameraFrame]:
         """最新フレーム取得"""
         with self.lock:
-            return self.frames[-1].copy() if self.frames else None
+            return self.frames[-1] if self.frames else None
     
     def get_frame_by_offset(self, seconds_offset: float) -> Optional[CameraFrame]:
         """指定秒数オフセットのフレーム取得"""
@@ -308,4 +304,18 @@ class FrameBuffer:
                     min_diff = diff
                     best_frame = frame
             
-            return best_frame.copy() if best_frame else None
\ No newline at end of file
+            return best_frame
+    
+    def get_frames_around(self, timestamp: datetime, count: int) -> List[CameraFrame]:
+        """指定時刻に近いフレームを最大 count 枚取得（時刻順）"""
+        with self.lock:
+            if not self.frames:
+                return []
+            
+            target_time = timestamp.timestamp()
+            nearest = sorted(
+                self.frames,
+                key=lambda frame: abs(frame.timestamp.timestamp() - target_time)
+            )[:count]
+            
+            return sorted(nearest, key=lambda frame: frame.seq)
@@ -28,15 +28,113 @@ CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
 FRAME_RATE = 3
 
+# === オーバーレイ設定（配信・保存時のみ描画）===
+OVERLAY_CLOCK_FORMAT = "%Y-%m-%d %H:%M:%S"  # 空文字で時刻表示なし
+OVERLAY_DETECTION_TTL = 5.0  # 最後の認識結果の枠を表示し続ける秒数
+
 # === Ollama API設定 ===
 OLLAMA_BASE_URL = "http://localhost:11434/api/chat"
 MODEL_NAME = "gemma3:4b"
 REQUEST_TIMEOUT = 300
+OLLAMA_STREAMING = True  # 応答を文単位で受信し、完成した文から読み上げ
+
+# === LLMルーティング（先頭から順に試し、失敗・期限切れなら次へ）===
+# kind: "ollama"（/api/chat）または "openai"（LMStudio などの /v1/chat/completions）
+# pooled: True のバックエンドは OLLAMA_NODES から送信先を選ぶ
+LLM_BACKENDS = [
+    {"name": "primary", "kind": "ollama", "url": OLLAMA_BASE_URL, "model": MODEL_NAME, "deadline": 20,
+     "pooled": True},
+    {"name": "fallback", "kind": "ollama", "url": OLLAMA_BASE_URL, "model": "qwen2.5vl:3b", "deadline": 10,
+     "pooled": True},
+    # {"name": "lmstudio", "kind": "openai", "url": "http://localhost:1234/v1/chat/completions",
+    #  "model": "gemma-3-vision", "deadline": 15, "api_key": "dummy-key"},
+]
+LLM_CIRCUIT_FAILURE_THRESHOLD = 3  # 連続でこの回数失敗したバックエンドを遮断
+LLM_CIRCUIT_RESET_SECONDS = 60  # 遮断後、この秒数経過したら1件だけ試行
+LLM_LATENCY_WINDOW = 20  # 遅延・失敗率を集計する直近のリクエスト数
+
+# === Ollama ノードプール（複数の呼び鈴が同時に鳴る拠点向け）===
+OLLAMA_NODES = [OLLAMA_BASE_URL]  # 例: ["http://gpu1:11434/api/chat", "http://gpu2:11434/api/chat"]
+OLLAMA_NODE_EJECT_FAILURES = 3  # 連続でこの回数失敗したノードを一時除外
+OLLAMA_NODE_EJECT_SECONDS = 30  # 除外する秒数（/api/ps に応答すれば早期復帰）
+OLLAMA_NODE_CHECK_INTERVAL = 15  # 常駐モデル・死活を確認する間隔（秒）
+
+# === モデル常駐管理 ===
+OLLAMA_WARMUP_ON_START = True  # 起動時にモデルを事前読み込み
+OLLAMA_KEEP_ALIVE = "10m"  # 通常時にリクエスト後モデルを保持する時間
+OLLAMA_BUSY_KEEP_ALIVE = "60m"  # 混雑時間帯の保持時間
+OLLAMA_IDLE_UNLOAD_MINUTES = 120  # この時間利用がなければモデルを解放（混雑時間帯を除く）
+OLLAMA_PRELOAD_LEAD_MINUTES = 10  # 混雑時間帯の何分前に読み込むか
+OLLAMA_BUSY_VISITS_PER_WEEK = 0.5  # 曜日・時間帯ごとの週あたり来訪数がこれ以上なら混雑とみなす
+VISIT_HISTORY_FILE = LOGS_DIR / "visit_history.json"  # 来訪履歴（混雑時間帯の学習用）
+
+# === 呼び鈴押下のスケジューリング ===
+ANALYSIS_COALESCE_WINDOW = 10.0  # 分析開始からこの秒数以内の押下は実行中の分析に合流
+ANALYSIS_MAX_PENDING = 1  # 待ち行列の上限（超えたら古い押下を新しい押下で置き換え）
+ANALYSIS_CANCEL_STALE = False  # True: 合流期間を過ぎた押下で実行中の分析（LLM要求）をキャンセル
+
+# === 投機的LLM分析（顔認識と並行して開始し、既知の人物ならキャンセル）===
+SPECULATIVE_LLM_POLICY = "adaptive"  # "off" / "always" / "adaptive"
+SPECULATIVE_MAX_KNOWN_RATIO = 0.6  # adaptive: 直近の既知人物の割合がこれを超えたら投機実行しない
+SPECULATIVE_HISTORY = 20  # adaptive の判断に使う直近の来訪数
+
+# === LLM送信画像の準備 ===
+LLM_IMAGE_LONG_EDGE = 896  # 送信画像の長辺（gemma3 の視覚エンコーダ入力に合わせる）
+LLM_IMAGE_MAX_BYTES = 150 * 1024  # JPEGサイズの予算（超える場合は品質を下げる）
+LLM_IMAGE_MAX_QUALITY = 90
+LLM_IMAGE_MIN_QUALITY = 50
+LLM_IMAGE_USE_PERSON_DETECTOR = True  # 顔枠がない場合にHOG人物検出で切り出す
+
+# === 訪問者説明キャッシュ ===
+DESCRIPTION_CACHE_ENABLED = True
+DESCRIPTION_CACHE_TTL = 300  # 説明を再利用する期間（秒）
+DESCRIPTION_CACHE_MAX_ENTRIES = 64  # 保持する訪問者数の上限（LRUで削除）
+DESCRIPTION_CACHE_MAX_DISTANCE = 10  # 同一訪問者とみなす知覚ハッシュのハミング距離（64ビット中）
 
 # === 人物認識設定 ===
 USE_FACE_RECOGNITION = True
 FACE_RECOGNITION_METHOD = "opencv_haar"  # Linuxでは安定性のためHaarを推奨
 FACE_CONFIDENCE_THRESHOLD = 0.7
+FACE_GALLERY_HOT_RELOAD = True  # 登録データの変更を検知して再起動なしで反映
+FACE_GALLERY_WATCH_INTERVAL = 0.5  # 変更検知の間隔（秒）
+PERSON_CACHE_CHECK_INTERVAL = 1.0  # 人物メタデータキャッシュ参照時にDBの外部変更を確認する間隔（秒）
+FACE_ENCODING_WORKERS = 0  # 登録時のエンコーディング抽出プロセス数（0: CPUコア数）
+FACE_DETECTION_SCALE = 0.5  # 顔検出時の縮小率（1.0: 縮小なし、0.25: 1/4）
+FACE_DETECTION_MODEL = "hog"  # "hog"（CPU向け）または "cnn"（GPU向け、高精度）
+FACE_DETECTION_UPSAMPLE = 1  # 検出時のアップサンプル回数（小さい顔の検出に有効）
+FACE_ENCODING_MODEL_ID = "dlib_resnet_v1"  # キャッシュキー用。モデル変更時に変えると再計算される
+FACE_MULTI_FRAME_COUNT = 3  # 呼び鈴時に統合するフレーム数（1: 単一フレーム）
+FACE_MULTI_FRAME_IOU = 0.3  # フレーム間で同一人物とみなす枠の重なり
+FACE_GALLERY_MAX_PROTOTYPES = 5  # ギャラリー圧縮時に1人あたり残す代表エンコーディング数
+FACE_CASCADE_ENABLED = True  # 軽量検出器で顔を確認してから高精度認識を実行
+FACE_CASCADE_DETECTOR = "opencv_haar"  # カスケード前段の検出器（"opencv_haar" または "mediapipe"）
+FACE_CASCADE_MIN_FACE_SIZE = 60  # 高精度認識に回す顔の最小サイズ（ピクセル）
+FACE_RECOGNIZER_AUTO_CALIBRATE = True  # 起動時に各手法を計測して自動選択
+FACE_RECOGNITION_LATENCY_BUDGET_MS = 500  # 1フレームあたりの認識処理時間の上限（p95, ミリ秒）
+FACE_CALIBRATION_MAX_IMAGES = 5  # キャリブレーションに使うサンプル画像数の上限
+FACE_IDENTITY_ENGINE = "dlib"  # face_manager で登録に使う埋め込み方式（"dlib" または "sface"）
+
+# === OpenCV DNN 顔認識（YuNet + SFace）===
+MODELS_DIR = DATA_DIR / "models"
+SFACE_DETECTOR_MODEL = MODELS_DIR / "face_detection_yunet_2023mar.onnx"
+SFACE_RECOGNIZER_MODEL = MODELS_DIR / "face_recognition_sface_2021dec.onnx"
+SFACE_MODEL_ID = "sface_2021dec"  # キャッシュキー用
+SFACE_SCORE_THRESHOLD = 0.8  # YuNet の顔検出スコア閾値
+SFACE_MAX_DISTANCE = 1.128  # 正規化特徴量の距離閾値（コサイン類似度 0.363 相当）
+SFACE_RECOGNITION_THRESHOLD = 0.3  # 既知人物と判定する信頼度（1 - 距離/最大距離、0.3 で距離 0.79 ≒ コサイン類似度 0.69）
+
+# === MediaPipe 動画モード設定 ===
+MEDIAPIPE_FACE_MODEL = MODELS_DIR / "blaze_face_short_range.tflite"
+MEDIAPIPE_VIDEO_KEYFRAME_INTERVAL = 5  # 画面が静止していても再検出するフレーム間隔
+MEDIAPIPE_VIDEO_MOTION_THRESHOLD = 4.0  # 検出を省略する画面変化の上限（縮小グレー画像の平均差分）
+
+# === 推論ワーカー設定 ===
+INFERENCE_WORKER_ENABLED = True  # 顔認識を別プロセスで実行（Web配信の停滞を防ぐ）
+INFERENCE_WORKERS = 1  # 推論ワーカープロセス数
+INFERENCE_SHARED_SLOTS = 6  # フレーム受け渡し用の共有メモリスロット数
+INFERENCE_SLOT_BYTES = 1920 * 1080 * 3  # 1スロットの容量（最大フレームサイズ）
+INFERENCE_TIMEOUT = 10.0  # 推論結果の待ち時間上限（秒）
+INFERENCE_STARTUP_TIMEOUT = 120.0  # ワーカーのモデル読み込み待ち時間（秒）
 
 # === 音声設定 ===
 VOICE_RATE = 150
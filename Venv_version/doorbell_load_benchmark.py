@@ -0,0 +1,196 @@
+"""
+呼び鈴負荷ベンチマーク - 起動中のアプリの /api/doorbell を同時に押し、押下から最初の音声・結果までの遅延を計測
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mock_ollama import MockOllamaServer
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp']
+DEFAULT_IMAGE_DIRS = [
+    Path(__file__).parent.parent / "GeekCam" / "test_images",
+    Path(__file__).parent / "data" / "test_images",
+]
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """最近傍順位法のパーセンタイル"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+def count_images(directory: Path) -> int:
+    if not directory.exists():
+        return 0
+    return sum(1 for path in directory.iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+
+def check_image_dirs(directories: List[Path]):
+    """カメラなしで起動したアプリが使うテスト画像の有無を確認"""
+    for directory in directories:
+        count = count_images(directory)
+        print(f"テスト画像: {count}枚 ({directory})")
+        if count == 0:
+            print("  ⚠ 画像がありません（アプリは合成サンプル画像で分析します）")
+
+def wait_until_idle(session: requests.Session, base_url: str, timeout: float = 120.0) -> bool:
+    """前の計測の分析が終わるまで待つ"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status = session.get(f"{base_url}/api/status", timeout=5).json()
+            # GeekCam は processing、Venv_version は system.is_processing
+            busy = status.get("processing", status.get("system", {}).get("is_processing", False))
+            if not busy:
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+def press(session: requests.Session, base_url: str, supersede: bool, timeout: float) -> Dict:
+    """呼び鈴を1回押して分析完了まで待つ"""
+    sent_at = time.time()
+    try:
+        response = session.post(f"{base_url}/api/doorbell",
+                                json={"wait": True, "supersede": supersede, "timeout": timeout},
+                                timeout=timeout + 10)
+        data = response.json()
+    except Exception as e:
+        return {"success": False, "error": str(e), "sent_at": sent_at}
+    data["sent_at"] = sent_at
+    data["received_at"] = time.time()
+    return data
+
+def run_level(base_url: str, presses: int, concurrency: int, supersede: bool, timeout: float) -> Dict:
+    """同時 concurrency 件で presses 回押下"""
+    results = []
+    lock = threading.Lock()
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max(concurrency, 10)))
+
+    def one(_):
+        result = press(session, base_url, supersede, timeout)
+        with lock:
+            results.append(result)
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(presses)))
+    elapsed = time.time() - start_time
+
+    succeeded = [r for r in results if r.get("success") and r.get("result_time")]
+    # 時刻はサーバー側で記録（押下受付 → 最初の結果読み上げ / 分析完了）
+    first_audio = [r["first_audio_time"] - r["pressed_at"] for r in succeeded if r.get("first_audio_time")]
+    to_result = [r["result_time"] - r["pressed_at"] for r in succeeded]
+    dispositions: Dict[str, int] = {}
+    for r in results:
+        key = r.get("disposition", "error")
+        dispositions[key] = dispositions.get(key, 0) + 1
+    # 合流した押下は同じ分析結果を共有するため、完了時刻の種類が実際の分析回数
+    analyses = len({round(r["result_time"], 6) for r in succeeded})
+
+    return {
+        "elapsed": elapsed,
+        "presses": len(results),
+        "succeeded": len(succeeded),
+        "analyses": analyses,
+        "press_throughput": len(succeeded) / elapsed if elapsed else 0.0,
+        "analysis_throughput": analyses / elapsed if elapsed else 0.0,
+        "first_audio": first_audio,
+        "to_result": to_result,
+        "dispositions": dispositions,
+        "errors": sorted({r.get("error", "") for r in results if not r.get("success")} - {""})
+    }
+
+def print_level(concurrency: int, result: Dict):
+    def line(label: str, values: List[float]) -> str:
+        if not values:
+            return f"    {label}: -"
+        return (f"    {label}: p50 {percentile(values, 0.5) * 1000:7.0f}ms  "
+                f"p95 {percentile(values, 0.95) * 1000:7.0f}ms  p99 {percentile(values, 0.99) * 1000:7.0f}ms")
+
+    dispositions = ", ".join(f"{key} {count}" for key, count in sorted(result["dispositions"].items()))
+    print(f"  同時{concurrency:>3}件: 成功 {result['succeeded']}/{result['presses']}  "
+          f"押下 {result['press_throughput']:.2f} 件/秒  分析 {result['analyses']}回 "
+          f"({result['analysis_throughput']:.2f} 回/秒)  [{dispositions}]")
+    print(line("押下→最初の音声", result["first_audio"]))
+    print(line("押下→結果", result["to_result"]))
+    for error in result["errors"][:3]:
+        print(f"    ✗ {error}")
+
+def parse_target(spec: str):
+    name, _, url = spec.partition("=")
+    if not url:
+        raise argparse.ArgumentTypeError(f"name=url の形式で指定してください: {spec}")
+    return name, url.rstrip("/")
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="呼び鈴の負荷ベンチマーク（GeekCam/app.py・Venv_version/web_app.py）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+準備:
+  各アプリを USE_CAMERA = False で起動し（test_images の画像を使用）、
+  Ollama の送信先（Venv_version: OLLAMA_BASE_URL・OLLAMA_NODES、GeekCam: API_BASE_URL）を代替サーバーに向ける。
+  両アプリとも既定はポート8080のため、同時に計測する場合は片方のポートを変更する。
+
+使用例:
+  python doorbell_load_benchmark.py --target venv=http://localhost:8080 --mock-ollama 11434
+  python doorbell_load_benchmark.py --target geekcam=http://localhost:8080 --target venv=http://localhost:8081
+  python doorbell_load_benchmark.py --target venv=http://localhost:8080 --concurrency 1,4,16 --supersede
+        """
+    )
+    parser.add_argument("--target", action="append", type=parse_target, required=True,
+                        metavar="NAME=URL", help="計測するアプリ（複数指定可）")
+    parser.add_argument("--presses", type=int, default=20, help="同時数ごとの押下回数")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="同時押下数（カンマ区切り）")
+    parser.add_argument("--supersede", action="store_true", help="押下ごとに実行中の分析を置き換える")
+    parser.add_argument("--timeout", type=float, default=120.0, help="1回の押下の待ち時間上限（秒）")
+    parser.add_argument("--images", action="append", type=Path, help="確認するテスト画像ディレクトリ")
+    parser.add_argument("--mock-ollama", type=int, metavar="PORT", help="このポートで Ollama 代替サーバーを起動")
+    parser.add_argument("--latency", default="lognormal:-0.7,0.4", help="代替サーバーの遅延分布")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="代替サーバーの生成速度（トークン/秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="代替サーバーの失敗率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="代替サーバーのストリーム切断率")
+    args = parser.parse_args()
+
+    levels = [int(value) for value in args.concurrency.split(",") if value]
+    check_image_dirs(args.images or DEFAULT_IMAGE_DIRS)
+
+    mock = None
+    if args.mock_ollama:
+        mock = MockOllamaServer(port=args.mock_ollama, latency=args.latency, token_rate=args.token_rate,
+                                failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+                                models=["gemma3:4b", "qwen2.5vl:3b", "gemma3:12b"]).start()
+        print(f"Ollama 代替サーバー: {mock.base_url} (遅延 {args.latency}, {args.token_rate:g} トークン/秒)")
+
+    try:
+        for name, base_url in args.target:
+            print(f"\n=== {name} ({base_url}) ===")
+            session = requests.Session()
+            for concurrency in levels:
+                if not wait_until_idle(session, base_url):
+                    print(f"  {base_url} が応答しないか分析が終わりません")
+                    break
+                result = run_level(base_url, args.presses, concurrency, args.supersede, args.timeout)
+                print_level(concurrency, result)
+    finally:
+        if mock:
+            print(f"\n代替サーバー統計: {mock.get_stats()}")
+            mock.stop()
+
+
+if __name__ == "__main__":
+    main()
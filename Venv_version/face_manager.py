@@ -55,14 +55,15 @@ def calculate_brightness_score(image: np.ndarray) -> float:
         print(f"明るさスコア計算エラー: {e}")
         return 0.0
 
-def detect_face_quality(image: np.ndarray) -> Tuple[bool, float, tuple]:
+def detect_face_quality(image: np.ndarray, gray: Optional[np.ndarray] = None) -> Tuple[bool, float, tuple]:
     """顔の品質を評価（顔検出 + サイズチェック）"""
     try:
         # OpenCVの顔検出器を使用
         face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         
-        # グレースケール変換
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        # グレースケール変換（変換済みの画像があれば再利用）
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # 顔検出
         faces = face_cascade.detectMultiScale(
@@ -258,10 +259,11 @@ def extract_best_frames_from_video(video_path: str, person_id: str, target_count
         
         # 5フレームに1回評価（処理速度向上）
         if frame_count % 5 == 0:
-            # 各種品質スコアを計算
-            blur_score = calculate_blur_score(frame)
-            brightness_score = calculate_brightness_score(frame)
-            has_face, face_ratio, face_bbox = detect_face_quality(frame)
+            # 各種品質スコアを計算（グレースケール変換は1回だけ）
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            blur_score = calculate_blur_score(gray)
+            brightness_score = calculate_brightness_score(gray)
+            has_face, face_ratio, face_bbox = detect_face_quality(frame, gray)
             
             # 品質評価
             quality_score = 0.0
@@ -447,8 +449,8 @@ def register_person_with_video():
     
     # 顔認識システムで登録
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
-        recognizer = AdvancedFaceRecognizer()
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
         
         if not recognizer.is_available():
             print("❌ face_recognition ライブラリが利用できません")
@@ -691,17 +693,16 @@ def register_person_interactive():
     # 顔認識システムで登録（写真がある場合のみ）
     if photo_paths:
         try:
-            # face_recognitionライブラリのテスト
-            import face_recognition
-            print("✅ face_recognition ライブラリが利用可能です")
-            
-            from face_recognition_advanced import AdvancedFaceRecognizer
-            recognizer = AdvancedFaceRecognizer()
+            # 設定された顔認識エンジン（dlib / sface）で登録
+            from face_recognition_advanced import create_face_engine
+            recognizer = create_face_engine()
             
             if not recognizer.is_available():
-                print("❌ face_recognition ライブラリが利用できません")
-                print("インストール: pip install face-recognition")
+                print(f"❌ 顔認識エンジン（{recognizer.method_name}）が利用できません")
+                print("dlib: pip install face-recognition")
+                print("sface: YuNet / SFace の ONNX モデルを配置（config.SFACE_DETECTOR_MODEL / SFACE_RECOGNIZER_MODEL）")
                 return
+            print(f"✅ 顔認識エンジン（{recognizer.method_name}）が利用可能です")
             
             print(f"\n📊 {len(photo_paths)}枚の画像から顔エンコーディングを抽出中...")
             
@@ -728,11 +729,9 @@ def register_person_interactive():
                 print("❌ 登録に失敗しました")
                 print("写真に顔が明確に写っているか確認してください")
                 
-        except ImportError:
-            print("❌ face_recognition ライブラリがインストールされていません")
-            print("インストール方法:")
-            print("1. pip install face-recognition")
-            print("2. または: python setup_advanced_face.py")
+        except ImportError as e:
+            print(f"❌ 顔認識モジュールを読み込めません: {e}")
+            print("インストール方法: python setup_advanced_face.py")
             
         except Exception as e:
             print(f"❌ 登録中にエラーが発生しました: {e}")
@@ -746,10 +745,10 @@ def test_recognition_for_person(person_id: str, name: str):
     print("カメラの前に座ってください（Escキーで終了）")
     
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
+        from face_recognition_advanced import create_face_engine
         from models import CameraFrame
         
-        recognizer = AdvancedFaceRecognizer()
+        recognizer = create_face_engine()
         
         # カメラ初期化
         camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)
@@ -830,8 +829,8 @@ def test_recognition_for_person(person_id: str, name: str):
 def list_registered_persons():
     """登録済み人物一覧表示"""
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
-        recognizer = AdvancedFaceRecognizer()
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
         
         if not recognizer.is_available():
             print("❌ face_recognition ライブラリが利用できません")
@@ -869,8 +868,8 @@ def list_registered_persons():
 def delete_person_interactive():
     """対話式で人物を削除"""
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
-        recognizer = AdvancedFaceRecognizer()
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
         
         if not recognizer.is_available():
             print("❌ face_recognition ライブラリが利用できません")
@@ -916,8 +915,8 @@ def delete_person_interactive():
 def show_recognition_stats():
     """認識統計表示"""
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
-        recognizer = AdvancedFaceRecognizer()
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
         
         if not recognizer.is_available():
             print("❌ face_recognition ライブラリが利用できません")
@@ -931,6 +930,7 @@ def show_recognition_stats():
         print(f"登録人数: {stats.get('total_persons', 0)}人")
         print(f"総認識回数: {stats.get('total_recognitions', 0)}回")
         print(f"今日の認識回数: {stats.get('today_recognitions', 0)}回")
+        print(f"直近7日間の認識回数: {stats.get('week_recognitions', 0)}回")
         print(f"エンコーディング数: {stats.get('encodings_count', 0)}個")
         print(f"データベース: {stats.get('database_path', 'N/A')}")
         
@@ -946,8 +946,8 @@ def test_recognition_system():
     print("="*60)
     
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
-        recognizer = AdvancedFaceRecognizer()
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
         
         if not recognizer.is_available():
             print("❌ face_recognition ライブラリが利用できません")
@@ -1039,11 +1039,105 @@ def test_recognition_system():
     except Exception as e:
         print(f"❌ 認識テストエラー: {e}")
 
+def reencode_all_persons():
+    """登録済み全人物の顔エンコーディングを再計算"""
+    try:
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
+        
+        if not recognizer.is_available():
+            print("❌ face_recognition ライブラリが利用できません")
+            return
+        
+        print("📊 登録画像から顔エンコーディングを再計算中...")
+        start_time = time.time()
+        summary = recognizer.reencode_all()
+        elapsed = time.time() - start_time
+        
+        for person_id, image_count in summary.items():
+            print(f"  {person_id}: {image_count}枚")
+        print(f"✅ 再エンコード完了: {len(summary)}人 ({elapsed:.1f}秒)")
+        
+    except ImportError:
+        print("❌ face_recognition ライブラリがインストールされていません")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+
+def migrate_to_sface():
+    """登録写真から SFace（OpenCV DNN）用の特徴量を作成"""
+    try:
+        from face_recognition_advanced import SFaceRecognizer
+        recognizer = SFaceRecognizer()
+        
+        if not recognizer.is_available():
+            print("❌ YuNet/SFace モデルを読み込めません")
+            print(f"   配置先: {config.SFACE_DETECTOR_MODEL}")
+            print(f"           {config.SFACE_RECOGNIZER_MODEL}")
+            return
+        
+        print("📊 登録写真から SFace 特徴量を作成中...")
+        start_time = time.time()
+        summary = recognizer.migrate_from_gallery()
+        elapsed = time.time() - start_time
+        
+        for person_id, image_count in summary.items():
+            print(f"  {person_id}: {image_count}枚")
+        print(f"✅ 移行完了: {len(summary)}人 ({elapsed:.1f}秒)")
+        print("💡 config.FACE_IDENTITY_ENGINE = \"sface\" で以降の登録も SFace で行えます")
+        
+    except FileNotFoundError as e:
+        print(f"❌ 移行元のギャラリーがありません: {e}")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+
+def compact_gallery_interactive():
+    """登録エンコーディングを人物ごとの代表プロトタイプに圧縮"""
+    try:
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
+        
+        if not recognizer.is_available():
+            print("❌ face_recognition ライブラリが利用できません")
+            return
+        
+        max_input = input(f"1人あたりの代表エンコーディング数（デフォルト{config.FACE_GALLERY_MAX_PROTOTYPES}）: ").strip()
+        try:
+            max_prototypes = int(max_input) if max_input else config.FACE_GALLERY_MAX_PROTOTYPES
+            max_prototypes = max(1, max_prototypes)
+        except ValueError:
+            max_prototypes = config.FACE_GALLERY_MAX_PROTOTYPES
+        
+        # まず評価のみ実行
+        report = recognizer.compact_gallery(max_prototypes, dry_run=True)
+        
+        print("\n" + "="*60)
+        print(" ギャラリー圧縮の評価")
+        print("="*60)
+        print(f"対象人数: {report.get('persons', 0)}人")
+        print(f"エンコーディング数: {report.get('encodings_before', 0)} → {report.get('encodings_after', 0)}")
+        print(f"評価フレーム数: {report.get('holdout_samples', 0)}")
+        print(f"認識率: {report.get('recognition_rate_before', 0):.1%} → "
+              f"{report.get('recognition_rate_after', 0):.1%} "
+              f"({report.get('recognition_rate_delta', 0):+.1%})")
+        
+        confirm = input("\nこの内容で圧縮しますか？ (y/N): ").lower()
+        if confirm not in ['y', 'yes']:
+            print("❌ 圧縮をキャンセルしました")
+            return
+        
+        recognizer.compact_gallery(max_prototypes)
+        print("✅ ギャラリーを圧縮しました")
+        
+    except ImportError:
+        print("❌ face_recognition ライブラリがインストールされていません")
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+
 def export_database():
     """データベースをJSONでエクスポート"""
     try:
-        from face_recognition_advanced import AdvancedFaceRecognizer
-        recognizer = AdvancedFaceRecognizer()
+        from face_recognition_advanced import create_face_engine
+        recognizer = create_face_engine()
         
         if not recognizer.is_available():
             print("❌ face_recognition ライブラリが利用できません")
@@ -1128,13 +1222,16 @@ def main():
   python face_manager.py test            # 認識システムテスト
   python face_manager.py stats           # 認識統計表示
   python face_manager.py export          # データベースエクスポート
+  python face_manager.py reencode        # 全人物のエンコーディング再計算
+  python face_manager.py compact         # ギャラリーを代表プロトタイプに圧縮
+  python face_manager.py migrate         # 登録写真から SFace 用の特徴量を作成
   python face_manager.py sample_guide    # サンプルデータ設定ガイド
 """
     )
 
     parser.add_argument(
         "command",
-        choices=["register", "register_video", "list", "delete", "test", "stats", "export", "sample_guide"],
+        choices=["register", "register_video", "list", "delete", "test", "stats", "export", "reencode", "compact", "migrate", "sample_guide"],
         help="実行するコマンド"
     )
 
@@ -1157,6 +1254,12 @@ def main():
         show_recognition_stats()
     elif args.command == "export":
         export_database()
+    elif args.command == "reencode":
+        reencode_all_persons()
+    elif args.command == "compact":
+        compact_gallery_interactive()
+    elif args.command == "migrate":
+        migrate_to_sface()
     elif args.command == "sample_guide":
         setup_sample_persons()
     else:
@@ -3,49 +3,133 @@
 """
 import cv2
 import numpy as np
+import hashlib
 import json
 import logging
+import os
 import pickle
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
+import time
 
 import config
 from models import CameraFrame, FaceDetection, PersonRecognitionResult
 
 logger = logging.getLogger(__name__)
 
+def _extract_encoding_worker(image_path: str) -> Tuple[int, Optional[np.ndarray]]:
+    """画像1枚から顔エンコーディングを抽出（プロセスプールのワーカー）"""
+    import face_recognition
+    
+    image = face_recognition.load_image_file(image_path)
+    face_encodings = face_recognition.face_encodings(image)
+    
+    if len(face_encodings) == 1:
+        return 1, face_encodings[0]
+    return len(face_encodings), None
+
+def _box_iou(box_a: Tuple[int, int, int, int], box_b: Tuple[int, int, int, int]) -> float:
+    """2つの枠 (x1, y1, x2, y2) の IoU"""
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+    
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+def _select_prototypes(encodings: List[np.ndarray], k: int, max_iter: int = 20) -> List[int]:
+    """k-medoids で代表エンコーディングのインデックスを選択"""
+    points = np.asarray(encodings)
+    if len(points) <= k:
+        return list(range(len(points)))
+    
+    distances = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+    
+    # 全体の中心から始め、最も遠い点を順に追加（顔向きのばらつきを残す）
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        nearest = distances[:, medoids].min(axis=1)
+        medoids.append(int(np.argmax(nearest)))
+    
+    for _ in range(max_iter):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        new_medoids = []
+        for cluster, medoid in enumerate(medoids):
+            members = np.where(labels == cluster)[0]
+            if len(members) == 0:
+                new_medoids.append(medoid)
+                continue
+            costs = distances[np.ix_(members, members)].sum(axis=1)
+            new_medoids.append(int(members[np.argmin(costs)]))
+        
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+    
+    return sorted(set(medoids))
+
 class AdvancedFaceRecognizer:
     """高精度顔認識システム（face_recognition ライブラリ使用）"""
     
+    # 埋め込み方式ごとに差し替える項目（人物DBは共通）
+    encodings_filename = "face_encodings.pkl"
+    extraction_worker = staticmethod(_extract_encoding_worker)
+    method_name = "face_recognition_advanced"
+    
     def __init__(self):
         self.face_recognition = None
         self.face_encodings_db = {}  # 顔エンコーディングデータベース
         self.person_metadata = {}    # 人物メタデータ
         self.db_path = config.DATA_DIR / "face_database.db"
-        self.encodings_path = config.DATA_DIR / "face_encodings.pkl"
+        self.encodings_path = config.DATA_DIR / self.encodings_filename
+        self.encoding_cache_path = config.DATA_DIR / "encoding_cache.pkl"
         self.lock = threading.Lock()
         
+        # 画像内容ハッシュをキーにしたエンコーディングキャッシュ
+        self.encoding_cache = {}
+        self.encoding_cache_lock = threading.Lock()
+        
+        # 人物メタデータのメモリキャッシュ（person_id -> 人物情報）
+        self._person_cache = None
+        self._person_cache_lock = threading.Lock()
+        self._db_signature = None
+        self._person_cache_checked_at = 0.0
+        
+        # ギャラリー変更検知（ホットリロード）
+        self._gallery_signature = None
+        self._watcher_thread = None
+        self._watcher_stop = threading.Event()
+        
         # 認識設定
         self.recognition_threshold = 0.6  # 低いほど厳密
         self.max_distance = 0.6
         
+        # 顔検出設定（縮小画像で検出し、エンコーディングは元解像度で行う）
+        self.detection_scale = config.FACE_DETECTION_SCALE
+        self.detection_model = config.FACE_DETECTION_MODEL
+        self.detection_upsample = config.FACE_DETECTION_UPSAMPLE
+        
         self._initialize()
     
     def _initialize(self):
         """システム初期化"""
         try:
-            import face_recognition
-            self.face_recognition = face_recognition
-            logger.info("face_recognition ライブラリを初期化")
+            self._load_backend()
             
             # データベース初期化
             self._init_database()
             
             # 既存のエンコーディング読み込み
             self._load_face_encodings()
+            self._load_encoding_cache()
             
         except ImportError:
             logger.warning("face_recognition ライブラリがインストールされていません")
@@ -53,6 +137,17 @@ class AdvancedFaceRecognizer:
         except Exception as e:
             logger.error(f"高精度顔認識初期化エラー: {e}")
     
+    def _load_backend(self):
+        """顔検出・エンコーディングのバックエンドを読み込み"""
+        import face_recognition
+        self.face_recognition = face_recognition
+        logger.info("face_recognition ライブラリを初期化")
+    
+    @property
+    def encoding_model_id(self) -> str:
+        """エンコーディングキャッシュのキーに使うモデル識別子"""
+        return config.FACE_ENCODING_MODEL_ID
+    
     def _init_database(self):
         """SQLiteデータベース初期化"""
         try:
@@ -95,10 +190,39 @@ class AdvancedFaceRecognizer:
                     timestamp TEXT NOT NULL,
                     confidence REAL,
                     image_path TEXT,
+                    ts_epoch INTEGER,
                     FOREIGN KEY (person_id) REFERENCES persons (person_id)
                 )
             ''')
             
+            # 日別・人物別の集計テーブル（履歴の全件走査を避ける）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recognition_daily (
+                    day TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recognition_person_daily (
+                    person_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (person_id, day)
+                )
+            ''')
+            
+            self._migrate_recognition_history(cursor)
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_recognition_history_ts
+                ON recognition_history (ts_epoch)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_recognition_history_person_ts
+                ON recognition_history (person_id, ts_epoch)
+            ''')
+            
             conn.commit()
             conn.close()
             logger.info("顔認識データベース初期化完了")
@@ -106,14 +230,49 @@ class AdvancedFaceRecognizer:
         except Exception as e:
             logger.error(f"データベース初期化エラー: {e}")
     
+    def _migrate_recognition_history(self, cursor):
+        """既存の認識履歴に ts_epoch 列と集計テーブルの内容を補完"""
+        cursor.execute('PRAGMA table_info(recognition_history)')
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'ts_epoch' not in columns:
+            cursor.execute('ALTER TABLE recognition_history ADD COLUMN ts_epoch INTEGER')
+            logger.info("認識履歴テーブルに ts_epoch 列を追加")
+        
+        cursor.execute('SELECT id, timestamp FROM recognition_history WHERE ts_epoch IS NULL')
+        rows = cursor.fetchall()
+        if rows:
+            updates = []
+            for row_id, timestamp in rows:
+                try:
+                    updates.append((int(datetime.fromisoformat(timestamp).timestamp()), row_id))
+                except (TypeError, ValueError):
+                    continue
+            cursor.executemany('UPDATE recognition_history SET ts_epoch = ? WHERE id = ?', updates)
+            logger.info(f"認識履歴の ts_epoch を補完: {len(updates)}件")
+        
+        # 集計テーブルが空なら履歴から再構築
+        cursor.execute('SELECT COUNT(*) FROM recognition_daily')
+        if cursor.fetchone()[0] == 0:
+            cursor.execute('''
+                INSERT INTO recognition_daily (day, count)
+                SELECT substr(timestamp, 1, 10), COUNT(*)
+                FROM recognition_history GROUP BY substr(timestamp, 1, 10)
+            ''')
+            cursor.execute('''
+                INSERT INTO recognition_person_daily (person_id, day, count)
+                SELECT person_id, substr(timestamp, 1, 10), COUNT(*)
+                FROM recognition_history GROUP BY person_id, substr(timestamp, 1, 10)
+            ''')
+    
     def _load_face_encodings(self):
         """保存された顔エンコーディングを読み込み"""
         try:
             if self.encodings_path.exists():
+                signature = self._get_gallery_signature()
                 with open(self.encodings_path, 'rb') as f:
                     data = pickle.load(f)
-                    self.face_encodings_db = data.get('encodings', {})
-                    self.person_metadata = data.get('metadata', {})
+                self._swap_gallery(data.get('encodings', {}), data.get('metadata', {}))
+                self._gallery_signature = signature
                 logger.info(f"顔エンコーディング読み込み完了: {len(self.face_encodings_db)}人")
             else:
                 logger.info("顔エンコーディングファイルが存在しません（初回起動）")
@@ -132,18 +291,225 @@ class AdvancedFaceRecognizer:
                 'saved_date': datetime.now().isoformat()
             }
             
-            with open(self.encodings_path, 'wb') as f:
+            # 読み込み側が書きかけのファイルを見ないよう一時ファイル経由で置き換え
+            tmp_path = self.encodings_path.with_suffix('.pkl.tmp')
+            with open(tmp_path, 'wb') as f:
                 pickle.dump(data, f)
+            os.replace(tmp_path, self.encodings_path)
+            
+            # 自プロセスの書き込みは再読み込み対象にしない
+            self._gallery_signature = self._get_gallery_signature()
             
             logger.info("顔エンコーディング保存完了")
             
         except Exception as e:
             logger.error(f"顔エンコーディング保存エラー: {e}")
     
+    def _swap_gallery(self, encodings: Dict, metadata: Dict):
+        """ギャラリーを丸ごと差し替え（読み取り側は古い辞書を参照し続けられる）"""
+        self.face_encodings_db = encodings
+        self.person_metadata = metadata
+    
+    def _get_gallery_signature(self) -> Optional[Tuple[int, int]]:
+        """エンコーディングファイルの変更検知用シグネチャ (mtime_ns, size)"""
+        try:
+            stat = self.encodings_path.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def reload_if_changed(self) -> bool:
+        """エンコーディングファイルが外部で更新されていれば差分を反映"""
+        signature = self._get_gallery_signature()
+        if signature is None or signature == self._gallery_signature:
+            return False
+        
+        try:
+            with open(self.encodings_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            # 書き込み途中などで読めない場合は次回の検知で再試行
+            logger.debug(f"ギャラリー再読み込み保留: {e}")
+            return False
+        
+        new_encodings = data.get('encodings', {})
+        new_metadata = data.get('metadata', {})
+        
+        with self.lock:
+            current_encodings = self.face_encodings_db
+            current_metadata = self.person_metadata
+            
+            added = [pid for pid in new_encodings if pid not in current_encodings]
+            removed = [pid for pid in current_encodings if pid not in new_encodings]
+            updated = [
+                pid for pid in new_encodings
+                if pid in current_encodings
+                and new_metadata.get(pid) != current_metadata.get(pid)
+            ]
+            
+            # コピーに差分だけ適用してから参照を差し替える
+            encodings = dict(current_encodings)
+            metadata = dict(current_metadata)
+            for pid in removed:
+                encodings.pop(pid, None)
+                metadata.pop(pid, None)
+            for pid in added + updated:
+                encodings[pid] = new_encodings[pid]
+                if pid in new_metadata:
+                    metadata[pid] = new_metadata[pid]
+            
+            self._swap_gallery(encodings, metadata)
+            self._gallery_signature = signature
+        
+        if added or removed or updated:
+            logger.info(
+                f"ギャラリーを再読み込み: 追加 {len(added)}人, "
+                f"更新 {len(updated)}人, 削除 {len(removed)}人"
+            )
+        return True
+    
+    def start_gallery_watcher(self, interval: float = 0.5):
+        """ギャラリー変更検知スレッドを開始"""
+        if self._watcher_thread and self._watcher_thread.is_alive():
+            return
+        
+        self._watcher_stop.clear()
+        self._watcher_thread = threading.Thread(
+            target=self._gallery_watch_loop,
+            args=(interval,),
+            daemon=True
+        )
+        self._watcher_thread.start()
+        logger.info(f"ギャラリー変更検知を開始 (間隔: {interval}秒)")
+    
+    def stop_gallery_watcher(self):
+        """ギャラリー変更検知スレッドを停止"""
+        self._watcher_stop.set()
+        if self._watcher_thread and self._watcher_thread.is_alive():
+            self._watcher_thread.join(timeout=2)
+        self._watcher_thread = None
+    
+    def _gallery_watch_loop(self, interval: float):
+        """ギャラリー変更検知ループ"""
+        while not self._watcher_stop.wait(interval):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"ギャラリー変更検知エラー: {e}")
+    
     def is_available(self) -> bool:
         """利用可能性チェック"""
         return self.face_recognition is not None
     
+    def _load_encoding_cache(self):
+        """エンコーディングキャッシュを読み込み"""
+        try:
+            if self.encoding_cache_path.exists():
+                with open(self.encoding_cache_path, 'rb') as f:
+                    self.encoding_cache = pickle.load(f)
+                logger.info(f"エンコーディングキャッシュ読み込み: {len(self.encoding_cache)}件")
+        except Exception as e:
+            logger.error(f"エンコーディングキャッシュ読み込みエラー: {e}")
+            self.encoding_cache = {}
+    
+    def _save_encoding_cache(self):
+        """エンコーディングキャッシュを保存"""
+        try:
+            with self.encoding_cache_lock:
+                cache = dict(self.encoding_cache)
+            
+            tmp_path = self.encoding_cache_path.with_suffix('.pkl.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cache, f)
+            os.replace(tmp_path, self.encoding_cache_path)
+            
+        except Exception as e:
+            logger.error(f"エンコーディングキャッシュ保存エラー: {e}")
+    
+    def _encoding_cache_key(self, image_path: str) -> str:
+        """キャッシュキー（エンコーディングモデル + 画像内容のハッシュ）"""
+        with open(image_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        return f"{self.encoding_model_id}:{digest}"
+    
+    def extract_encodings(self, image_paths: List[str]) -> Tuple[List[np.ndarray], List[str]]:
+        """複数画像から顔エンコーディングを抽出（キャッシュ + プロセスプール）"""
+        results = {}
+        pending = {}
+        
+        # キャッシュ済みの画像は抽出をスキップ
+        for image_path in image_paths:
+            try:
+                key = self._encoding_cache_key(image_path)
+            except Exception as e:
+                logger.error(f"画像読み込みエラー {image_path}: {e}")
+                continue
+            
+            with self.encoding_cache_lock:
+                cached = self.encoding_cache.get(key)
+            
+            if cached is not None:
+                results[image_path] = cached
+            else:
+                pending[image_path] = key
+        
+        if pending:
+            logger.info(f"顔エンコーディング抽出: {len(pending)}枚 (キャッシュ済み {len(results)}枚)")
+            new_entries = {}
+            
+            for image_path, outcome in self._run_extraction(list(pending)):
+                if isinstance(outcome, Exception):
+                    logger.error(f"画像処理エラー {image_path}: {outcome}")
+                    continue
+                
+                face_count, encoding = outcome
+                if face_count == 0:
+                    logger.warning(f"顔が検出されませんでした: {image_path}")
+                elif face_count > 1:
+                    logger.warning(f"複数の顔が検出されました: {image_path}")
+                
+                # 顔が1つでない結果もキャッシュして再処理を避ける
+                new_entries[pending[image_path]] = (face_count, encoding)
+                results[image_path] = (face_count, encoding)
+            
+            with self.encoding_cache_lock:
+                self.encoding_cache.update(new_entries)
+            self._save_encoding_cache()
+        
+        encodings = []
+        successful_images = []
+        for image_path in image_paths:
+            face_count, encoding = results.get(image_path, (0, None))
+            if encoding is not None:
+                encodings.append(encoding)
+                successful_images.append(image_path)
+                logger.info(f"顔エンコーディング抽出成功: {image_path}")
+        
+        return encodings, successful_images
+    
+    def _run_extraction(self, image_paths: List[str]):
+        """抽出処理を実行（2枚以上はプロセスプールで並列化）"""
+        workers = config.FACE_ENCODING_WORKERS or os.cpu_count() or 1
+        
+        if len(image_paths) == 1 or workers == 1:
+            for image_path in image_paths:
+                try:
+                    yield image_path, self.extraction_worker(image_path)
+                except Exception as e:
+                    yield image_path, e
+            return
+        
+        with ProcessPoolExecutor(max_workers=min(workers, len(image_paths))) as executor:
+            futures = {
+                image_path: executor.submit(self.extraction_worker, image_path)
+                for image_path in image_paths
+            }
+            for image_path, future in futures.items():
+                try:
+                    yield image_path, future.result()
+                except Exception as e:
+                    yield image_path, e
+    
     def register_person(self, person_id: str, name: str, image_paths: List[str], 
                        relationship: str = "", notes: str = "") -> bool:
         """新しい人物を登録"""
@@ -152,38 +518,22 @@ class AdvancedFaceRecognizer:
             return False
         
         try:
+            # 抽出はロック外で行い、認識処理をブロックしない
+            encodings, successful_images = self.extract_encodings(image_paths)
+            
+            if not encodings:
+                logger.error(f"有効な顔エンコーディングが取得できませんでした: {person_id}")
+                return False
+            
             with self.lock:
-                encodings = []
-                successful_images = []
-                
-                # 各画像から顔エンコーディングを抽出
-                for image_path in image_paths:
-                    try:
-                        image = self.face_recognition.load_image_file(image_path)
-                        face_encodings = self.face_recognition.face_encodings(image)
-                        
-                        if len(face_encodings) == 1:
-                            encodings.append(face_encodings[0])
-                            successful_images.append(image_path)
-                            logger.info(f"顔エンコーディング抽出成功: {image_path}")
-                        elif len(face_encodings) == 0:
-                            logger.warning(f"顔が検出されませんでした: {image_path}")
-                        else:
-                            logger.warning(f"複数の顔が検出されました: {image_path}")
-                            
-                    except Exception as e:
-                        logger.error(f"画像処理エラー {image_path}: {e}")
-                
-                if not encodings:
-                    logger.error(f"有効な顔エンコーディングが取得できませんでした: {person_id}")
-                    return False
-                
                 # データベースに登録
                 self._save_person_to_db(person_id, name, relationship, notes)
                 
-                # 顔エンコーディングを保存
-                self.face_encodings_db[person_id] = encodings
-                self.person_metadata[person_id] = {
+                # 顔エンコーディングを保存（コピーを更新して差し替え）
+                face_encodings_db = dict(self.face_encodings_db)
+                person_metadata = dict(self.person_metadata)
+                face_encodings_db[person_id] = encodings
+                person_metadata[person_id] = {
                     'name': name,
                     'relationship': relationship,
                     'notes': notes,
@@ -191,53 +541,191 @@ class AdvancedFaceRecognizer:
                     'image_count': len(encodings),
                     'image_paths': successful_images
                 }
+                self._swap_gallery(face_encodings_db, person_metadata)
                 
                 # ファイルに保存
                 self._save_face_encodings()
-                
-                logger.info(f"人物登録完了: {person_id} ({name}) - {len(encodings)}枚の画像")
-                return True
+            
+            logger.info(f"人物登録完了: {person_id} ({name}) - {len(encodings)}枚の画像")
+            return True
                 
         except Exception as e:
             logger.error(f"人物登録エラー: {e}")
             return False
     
+    def _evaluate_gallery(self, gallery: Dict, samples: List[Tuple[str, np.ndarray]]) -> float:
+        """評価サンプルに対する認識率（正しい人物に照合された割合）"""
+        if not samples:
+            return 0.0
+        
+        correct = 0
+        for person_id, encoding in samples:
+            matched_id, _ = self._match_face(encoding, gallery)
+            if matched_id == person_id:
+                correct += 1
+        return correct / len(samples)
+    
+    def compact_gallery(self, max_prototypes: int,
+                        holdout_samples: Optional[List[Tuple[str, np.ndarray]]] = None,
+                        dry_run: bool = False) -> Dict[str, Any]:
+        """人物ごとのエンコーディングを代表プロトタイプに圧縮し、認識率の変化を報告"""
+        if not self.is_available():
+            return {}
+        
+        gallery = self.face_encodings_db
+        
+        # 評価用フレームが指定されない場合は登録エンコーディングから一部を取り分ける
+        if holdout_samples is None:
+            holdout_samples = []
+            reference_gallery = {}
+            for person_id, encodings in gallery.items():
+                held_out = encodings[1::4] if len(encodings) >= 4 else []
+                holdout_samples.extend((person_id, e) for e in held_out)
+                reference_gallery[person_id] = [
+                    e for i, e in enumerate(encodings) if not (len(encodings) >= 4 and i % 4 == 1)
+                ]
+        else:
+            reference_gallery = gallery
+        
+        compacted_reference = {
+            person_id: [encodings[i] for i in _select_prototypes(encodings, max_prototypes)]
+            for person_id, encodings in reference_gallery.items()
+        }
+        rate_before = self._evaluate_gallery(reference_gallery, holdout_samples)
+        rate_after = self._evaluate_gallery(compacted_reference, holdout_samples)
+        
+        # 本番ギャラリーを圧縮
+        compacted = {}
+        kept_indices = {}
+        for person_id, encodings in gallery.items():
+            kept_indices[person_id] = _select_prototypes(encodings, max_prototypes)
+            compacted[person_id] = [encodings[i] for i in kept_indices[person_id]]
+        
+        report = {
+            'persons': len(gallery),
+            'encodings_before': sum(len(e) for e in gallery.values()),
+            'encodings_after': sum(len(e) for e in compacted.values()),
+            'holdout_samples': len(holdout_samples),
+            'recognition_rate_before': rate_before,
+            'recognition_rate_after': rate_after,
+            'recognition_rate_delta': rate_after - rate_before
+        }
+        
+        if dry_run:
+            return report
+        
+        with self.lock:
+            person_metadata = dict(self.person_metadata)
+            for person_id, indices in kept_indices.items():
+                metadata = person_metadata.get(person_id)
+                if not metadata:
+                    continue
+                image_paths = metadata.get('image_paths', [])
+                if len(image_paths) == len(gallery[person_id]):
+                    image_paths = [image_paths[i] for i in indices]
+                person_metadata[person_id] = dict(
+                    metadata,
+                    image_count=len(indices),
+                    image_paths=image_paths,
+                    compacted_from=len(gallery[person_id])
+                )
+            
+            self._swap_gallery(compacted, person_metadata)
+            self._save_face_encodings()
+        
+        logger.info(
+            f"ギャラリー圧縮完了: {report['encodings_before']} → {report['encodings_after']}件, "
+            f"認識率 {rate_before:.3f} → {rate_after:.3f}"
+        )
+        return report
+    
+    def reencode_all(self) -> Dict[str, int]:
+        """登録済み全人物のエンコーディングを再計算（変更のない画像はキャッシュを利用）"""
+        if not self.is_available():
+            return {}
+        
+        person_metadata = self.person_metadata
+        all_paths = []
+        for metadata in person_metadata.values():
+            all_paths.extend(p for p in metadata.get('image_paths', []) if Path(p).exists())
+        
+        # 全員分をまとめて抽出し、プロセスプールを最大限使う
+        encodings, successful_images = self.extract_encodings(all_paths)
+        encoding_by_path = dict(zip(successful_images, encodings))
+        
+        summary = {}
+        with self.lock:
+            face_encodings_db = dict(self.face_encodings_db)
+            new_metadata = dict(self.person_metadata)
+            
+            for person_id, metadata in person_metadata.items():
+                paths = [p for p in metadata.get('image_paths', []) if p in encoding_by_path]
+                if not paths:
+                    logger.warning(f"再エンコード可能な画像がありません: {person_id}")
+                    continue
+                
+                face_encodings_db[person_id] = [encoding_by_path[p] for p in paths]
+                new_metadata[person_id] = dict(metadata, image_count=len(paths), image_paths=paths)
+                summary[person_id] = len(paths)
+            
+            self._swap_gallery(face_encodings_db, new_metadata)
+            self._save_face_encodings()
+        
+        logger.info(f"再エンコード完了: {len(summary)}人, {len(encoding_by_path)}枚")
+        return summary
+    
     def _save_person_to_db(self, person_id: str, name: str, relationship: str, notes: str):
         """人物情報をデータベースに保存"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            created_date = datetime.now().isoformat()
             cursor.execute('''
                 INSERT OR REPLACE INTO persons 
                 (person_id, name, relationship, notes, created_date)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (person_id, name, relationship, notes, datetime.now().isoformat()))
+            ''', (person_id, name, relationship, notes, created_date))
             
             conn.commit()
             conn.close()
             
+            # キャッシュにも反映（INSERT OR REPLACE で認識回数はリセットされる）
+            self._update_person_cache(person_id, {
+                'person_id': person_id,
+                'name': name,
+                'relationship': relationship,
+                'notes': notes,
+                'created_date': created_date,
+                'last_seen': None,
+                'recognition_count': 0,
+                'is_active': 1
+            })
+            
         except Exception as e:
             logger.error(f"データベース保存エラー: {e}")
     
-    def recognize_faces(self, frame: CameraFrame) -> List[FaceDetection]:
-        """フレーム内の顔を認識"""
-        if not self.is_available() or not self.face_encodings_db:
+    def recognize_faces(self, frame: CameraFrame,
+                        face_locations: Optional[List[Tuple[int, int, int, int]]] = None) -> List[FaceDetection]:
+        """フレーム内の顔を認識（face_locations 指定時は位置検出を省略）"""
+        gallery = self.face_encodings_db
+        if not self.is_available() or not gallery:
             return []
         
         try:
-            # OpenCV BGR から RGB に変換
-            rgb_image = cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB)
+            # OpenCV BGR からモデル入力形式に変換
+            rgb_image = self.to_model_image(frame)
             
             # 顔の位置と顔エンコーディングを取得
-            face_locations = self.face_recognition.face_locations(rgb_image)
-            face_encodings = self.face_recognition.face_encodings(rgb_image, face_locations)
+            if face_locations is None:
+                face_locations = self.locate_faces(rgb_image, frame)
+            face_encodings = self.compute_encodings(rgb_image, face_locations)
             
             detections = []
             
             for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
                 # 既知の顔との比較
-                person_id, confidence = self._match_face(face_encoding)
+                person_id, confidence = self._match_face(face_encoding, gallery)
                 
                 detection = FaceDetection(
                     bbox=(left, top, right, bottom),
@@ -256,15 +744,70 @@ class AdvancedFaceRecognizer:
             logger.error(f"顔認識エラー: {e}")
             return []
     
-    def _match_face(self, face_encoding) -> Tuple[Optional[str], float]:
+    def to_model_image(self, frame: CameraFrame) -> np.ndarray:
+        """フレームをモデル入力形式（RGB）で取得"""
+        return frame.rgb()
+    
+    def compute_encodings(self, rgb_image: np.ndarray,
+                          face_locations: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """顔位置ごとのエンコーディングを計算"""
+        return self.face_recognition.face_encodings(rgb_image, face_locations)
+    
+    def _face_distance(self, known_encodings: List[np.ndarray], face_encoding: np.ndarray) -> np.ndarray:
+        """登録済みエンコーディングとの距離"""
+        return self.face_recognition.face_distance(known_encodings, face_encoding)
+    
+    def fuse_encodings(self, encodings: List[np.ndarray], weights: List[float]) -> np.ndarray:
+        """同一人物の複数フレームのエンコーディングを重み付き平均で統合"""
+        return np.average(np.asarray(encodings), axis=0, weights=weights)
+    
+    def locate_faces(self, rgb_image: np.ndarray,
+                     frame: Optional[CameraFrame] = None) -> List[Tuple[int, int, int, int]]:
+        """顔位置を検出し、元画像の座標 (top, right, bottom, left) で返す"""
+        scale = self.detection_scale
+        if scale <= 0 or scale >= 1.0:
+            return self.face_recognition.face_locations(
+                rgb_image,
+                number_of_times_to_upsample=self.detection_upsample,
+                model=self.detection_model
+            )
+        
+        # フレームがあれば縮小済みの画像を共有する
+        if frame is not None:
+            small_image = frame.rgb(scale)
+        else:
+            small_image = cv2.resize(rgb_image, (0, 0), fx=scale, fy=scale,
+                                     interpolation=cv2.INTER_AREA)
+        small_locations = self.face_recognition.face_locations(
+            small_image,
+            number_of_times_to_upsample=self.detection_upsample,
+            model=self.detection_model
+        )
+        
+        # 縮小座標を元解像度に戻す
+        height, width = rgb_image.shape[:2]
+        locations = []
+        for top, right, bottom, left in small_locations:
+            locations.append((
+                max(0, int(round(top / scale))),
+                min(width, int(round(right / scale))),
+                min(height, int(round(bottom / scale))),
+                max(0, int(round(left / scale)))
+            ))
+        return locations
+    
+    def _match_face(self, face_encoding, gallery: Optional[Dict] = None) -> Tuple[Optional[str], float]:
         """顔エンコーディングを既知の顔と照合"""
+        if gallery is None:
+            gallery = self.face_encodings_db
+        
         best_match_person_id = None
         best_confidence = 0.0
         min_distance = float('inf')
         
-        for person_id, known_encodings in self.face_encodings_db.items():
+        for person_id, known_encodings in gallery.items():
             # 各登録画像との距離を計算
-            distances = self.face_recognition.face_distance(known_encodings, face_encoding)
+            distances = self._face_distance(known_encodings, face_encoding)
             
             # 最も近い距離を取得
             min_person_distance = min(distances)
@@ -283,12 +826,26 @@ class AdvancedFaceRecognizer:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            recognized_at = datetime.now()
+            now = recognized_at.isoformat()
+            day = recognized_at.strftime('%Y-%m-%d')
+            
             # 認識履歴を追加
             cursor.execute('''
                 INSERT INTO recognition_history 
-                (person_id, timestamp, confidence)
-                VALUES (?, ?, ?)
-            ''', (person_id, datetime.now().isoformat(), confidence))
+                (person_id, timestamp, confidence, ts_epoch)
+                VALUES (?, ?, ?, ?)
+            ''', (person_id, now, confidence, int(recognized_at.timestamp())))
+            
+            # 集計テーブルを加算
+            cursor.execute('''
+                INSERT INTO recognition_daily (day, count) VALUES (?, 1)
+                ON CONFLICT(day) DO UPDATE SET count = count + 1
+            ''', (day,))
+            cursor.execute('''
+                INSERT INTO recognition_person_daily (person_id, day, count) VALUES (?, ?, 1)
+                ON CONFLICT(person_id, day) DO UPDATE SET count = count + 1
+            ''', (person_id, day))
             
             # 人物の認識回数を更新
             cursor.execute('''
@@ -296,18 +853,25 @@ class AdvancedFaceRecognizer:
                 SET recognition_count = recognition_count + 1,
                     last_seen = ?
                 WHERE person_id = ?
-            ''', (datetime.now().isoformat(), person_id))
+            ''', (now, person_id))
             
             conn.commit()
             conn.close()
             
+            self._increment_person_cache(person_id, now)
+            
         except Exception as e:
             logger.error(f"認識履歴記録エラー: {e}")
     
-    def recognize_person(self, frame: CameraFrame) -> PersonRecognitionResult:
+    def recognize_person(self, frame: CameraFrame,
+                         face_locations: Optional[List[Tuple[int, int, int, int]]] = None) -> PersonRecognitionResult:
         """人物認識実行"""
-        face_detections = self.recognize_faces(frame)
-        
+        face_detections = self.recognize_faces(frame, face_locations)
+        return self._build_recognition_result(face_detections, self.method_name)
+    
+    def _build_recognition_result(self, face_detections: List[FaceDetection],
+                                  method_used: str) -> PersonRecognitionResult:
+        """検出結果から最も信頼度の高い既知人物を選んで認識結果を作成"""
         # 最も信頼度の高い認識結果を選択
         best_detection = None
         for detection in face_detections:
@@ -321,88 +885,207 @@ class AdvancedFaceRecognizer:
                 person_id=best_detection.person_id,
                 confidence=best_detection.confidence,
                 face_detections=face_detections,
-                method_used="face_recognition_advanced"
+                method_used=method_used
             )
         else:
             return PersonRecognitionResult(
                 is_known_person=False,
                 face_detections=face_detections,
-                method_used="face_recognition_advanced"
+                method_used=method_used
             )
     
-    def get_person_info(self, person_id: str) -> Optional[Dict]:
-        """人物情報を取得"""
+    def recognize_person_multi(self, frames: List[CameraFrame],
+                               face_locations: Optional[List[List[Tuple[int, int, int, int]]]] = None) -> PersonRecognitionResult:
+        """複数フレームの顔エンコーディングを追跡・統合して人物認識（face_locations はフレームごとの顔位置、指定時は検出を省略）"""
+        if not frames:
+            return PersonRecognitionResult(is_known_person=False, method_used=f"{self.method_name}_multi")
+        if len(frames) == 1:
+            return self.recognize_person(frames[0], face_locations[0] if face_locations else None)
+        
+        gallery = self.face_encodings_db
+        if not self.is_available() or not gallery:
+            return PersonRecognitionResult(is_known_person=False,
+                                           method_used=f"{self.method_name}_multi")
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # トラック: {'bbox': 最新の枠, 'encodings': [...], 'weights': [...]}
+            tracks = []
             
-            cursor.execute('''
-                SELECT * FROM persons WHERE person_id = ?
-            ''', (person_id,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            for index, frame in enumerate(frames):
+                rgb_image = self.to_model_image(frame)
+                frame_locations = face_locations[index] if face_locations else self.locate_faces(rgb_image, frame)
+                if not frame_locations:
+                    continue
+                face_encodings = self.compute_encodings(rgb_image, frame_locations)
+                
+                assigned = set()
+                for (top, right, bottom, left), face_encoding in zip(frame_locations, face_encodings):
+                    bbox = (left, top, right, bottom)
+                    
+                    # 枠の重なりが最も大きいトラックに対応付け
+                    best_track, best_iou = None, config.FACE_MULTI_FRAME_IOU
+                    for index, track in enumerate(tracks):
+                        if index in assigned:
+                            continue
+                        iou = _box_iou(track['bbox'], bbox)
+                        if iou >= best_iou:
+                            best_track, best_iou = index, iou
+                    
+                    # 大きく写った顔ほど重みを大きくする
+                    weight = float(max(1, (right - left) * (bottom - top)))
+                    if best_track is None:
+                        tracks.append({'bbox': bbox, 'encodings': [face_encoding], 'weights': [weight]})
+                        assigned.add(len(tracks) - 1)
+                    else:
+                        track = tracks[best_track]
+                        track['bbox'] = bbox
+                        track['encodings'].append(face_encoding)
+                        track['weights'].append(weight)
+                        assigned.add(best_track)
             
-            if result:
-                return {
-                    'person_id': result[1],
-                    'name': result[2],
-                    'relationship': result[3],
-                    'notes': result[4],
-                    'created_date': result[5],
-                    'last_seen': result[6],
-                    'recognition_count': result[7],
-                    'is_active': result[8]
-                }
+            detections = []
+            for track in tracks:
+                # 重み付き平均で統合したエンコーディングを1回だけ照合
+                fused_encoding = self.fuse_encodings(track['encodings'], track['weights'])
+                person_id, confidence = self._match_face(fused_encoding, gallery)
+                
+                detections.append(FaceDetection(
+                    bbox=track['bbox'],
+                    confidence=confidence,
+                    person_id=person_id
+                ))
+                
+                if person_id:
+                    self._record_recognition(person_id, confidence)
             
-            return None
+            return self._build_recognition_result(detections, f"{self.method_name}_multi")
             
         except Exception as e:
-            logger.error(f"人物情報取得エラー: {e}")
+            logger.error(f"複数フレーム顔認識エラー: {e}")
+            return PersonRecognitionResult(is_known_person=False,
+                                           method_used=f"{self.method_name}_multi")
+    
+    def _get_db_signature(self) -> Optional[Tuple[int, int]]:
+        """データベースファイルの変更検知用シグネチャ (mtime_ns, size)"""
+        try:
+            stat = Path(self.db_path).stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
             return None
     
-    def get_all_persons(self) -> List[Dict]:
-        """全ての登録人物を取得"""
+    def _load_person_cache(self) -> Dict[str, Dict]:
+        """人物テーブルを読み込んでキャッシュを構築"""
+        cache = {}
         try:
+            signature = self._get_db_signature()
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT * FROM persons WHERE is_active = 1
-                ORDER BY recognition_count DESC
+                SELECT * FROM persons
             ''')
             
-            results = cursor.fetchall()
-            conn.close()
-            
-            persons = []
-            for result in results:
-                persons.append({
+            for result in cursor.fetchall():
+                cache[result[1]] = {
                     'person_id': result[1],
                     'name': result[2],
                     'relationship': result[3],
                     'notes': result[4],
                     'created_date': result[5],
                     'last_seen': result[6],
-                    'recognition_count': result[7]
-                })
+                    'recognition_count': result[7],
+                    'is_active': result[8]
+                }
             
-            return persons
+            conn.close()
+            self._db_signature = signature
+            logger.debug(f"人物メタデータキャッシュ読み込み: {len(cache)}人")
             
         except Exception as e:
-            logger.error(f"人物一覧取得エラー: {e}")
-            return []
+            logger.error(f"人物メタデータ読み込みエラー: {e}")
+        
+        return cache
+    
+    def _get_person_cache(self) -> Dict[str, Dict]:
+        """人物メタデータキャッシュを取得（初回・DBの外部変更時にDBから読み込み）"""
+        # ホットリロードの有無に関係なく、参照時に一定間隔でDBの更新を確認
+        now = time.monotonic()
+        if now - self._person_cache_checked_at >= config.PERSON_CACHE_CHECK_INTERVAL:
+            self._person_cache_checked_at = now
+            self._invalidate_person_cache_if_changed()
+        
+        cache = self._person_cache
+        if cache is None:
+            with self._person_cache_lock:
+                if self._person_cache is None:
+                    self._person_cache = self._load_person_cache()
+                cache = self._person_cache
+        return cache
+    
+    def _update_person_cache(self, person_id: str, person_info: Dict):
+        """キャッシュへの書き込み（コピーを更新して差し替え）"""
+        with self._person_cache_lock:
+            if self._person_cache is None:
+                return
+            cache = dict(self._person_cache)
+            cache[person_id] = person_info
+            self._person_cache = cache
+            # 自プロセスの書き込みは外部変更として扱わない
+            self._db_signature = self._get_db_signature()
+    
+    def _increment_person_cache(self, person_id: str, last_seen: str):
+        """キャッシュ上の認識回数と最終確認日時を更新"""
+        with self._person_cache_lock:
+            if self._person_cache is None or person_id not in self._person_cache:
+                return
+            person_info = self._person_cache[person_id]
+            cache = dict(self._person_cache)
+            cache[person_id] = dict(
+                person_info,
+                recognition_count=(person_info['recognition_count'] or 0) + 1,
+                last_seen=last_seen
+            )
+            self._person_cache = cache
+            self._db_signature = self._get_db_signature()
+    
+    def _invalidate_person_cache_if_changed(self):
+        """データベースが外部で更新されていればキャッシュを破棄"""
+        if self._person_cache is None:
+            return
+        signature = self._get_db_signature()
+        if signature != self._db_signature:
+            with self._person_cache_lock:
+                self._person_cache = None
+            logger.info("データベース変更を検知: 人物メタデータキャッシュを再構築します")
+    
+    def get_person_info(self, person_id: str) -> Optional[Dict]:
+        """人物情報を取得"""
+        person_info = self._get_person_cache().get(person_id)
+        return dict(person_info) if person_info else None
+    
+    def get_all_persons(self) -> List[Dict]:
+        """全ての登録人物を取得"""
+        persons = []
+        for person_info in self._get_person_cache().values():
+            if person_info['is_active'] != 1:
+                continue
+            persons.append({
+                key: value for key, value in person_info.items() if key != 'is_active'
+            })
+        
+        persons.sort(key=lambda person: person['recognition_count'] or 0, reverse=True)
+        return persons
     
     def delete_person(self, person_id: str) -> bool:
         """人物を削除"""
         try:
             with self.lock:
-                # メモリから削除
-                if person_id in self.face_encodings_db:
-                    del self.face_encodings_db[person_id]
-                
-                if person_id in self.person_metadata:
-                    del self.person_metadata[person_id]
+                # メモリから削除（コピーを更新して差し替え）
+                face_encodings_db = dict(self.face_encodings_db)
+                person_metadata = dict(self.person_metadata)
+                face_encodings_db.pop(person_id, None)
+                person_metadata.pop(person_id, None)
+                self._swap_gallery(face_encodings_db, person_metadata)
                 
                 # データベースで無効化
                 conn = sqlite3.connect(self.db_path)
@@ -415,6 +1098,10 @@ class AdvancedFaceRecognizer:
                 conn.commit()
                 conn.close()
                 
+                person_info = self._get_person_cache().get(person_id)
+                if person_info:
+                    self._update_person_cache(person_id, dict(person_info, is_active=0))
+                
                 # ファイルを更新
                 self._save_face_encodings()
                 
@@ -425,34 +1112,99 @@ class AdvancedFaceRecognizer:
             logger.error(f"人物削除エラー: {e}")
             return False
     
-    def get_recognition_stats(self) -> Dict:
-        """認識統計を取得"""
+    def get_daily_recognition_counts(self, days: int = 7,
+                                     person_id: Optional[str] = None) -> Dict[str, int]:
+        """直近 days 日間の日別認識回数（集計テーブルから取得）"""
+        today = datetime.now().date()
+        day_keys = [(today - timedelta(days=offset)).strftime('%Y-%m-%d')
+                    for offset in range(days - 1, -1, -1)]
+        counts = {day: 0 for day in day_keys}
+        
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            # 総認識回数
-            cursor.execute('SELECT SUM(recognition_count) FROM persons')
-            total_recognitions = cursor.fetchone()[0] or 0
+            if person_id is None:
+                cursor.execute('''
+                    SELECT day, count FROM recognition_daily
+                    WHERE day BETWEEN ? AND ?
+                ''', (day_keys[0], day_keys[-1]))
+            else:
+                cursor.execute('''
+                    SELECT day, count FROM recognition_person_daily
+                    WHERE person_id = ? AND day BETWEEN ? AND ?
+                ''', (person_id, day_keys[0], day_keys[-1]))
             
-            # 登録人数
-            cursor.execute('SELECT COUNT(*) FROM persons WHERE is_active = 1')
-            total_persons = cursor.fetchone()[0] or 0
+            for day, count in cursor.fetchall():
+                counts[day] = count
             
-            # 今日の認識回数
-            today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('''
-                SELECT COUNT(*) FROM recognition_history 
-                WHERE timestamp LIKE ?
-            ''', (f"{today}%",))
-            today_recognitions = cursor.fetchone()[0] or 0
+            conn.close()
             
+        except Exception as e:
+            logger.error(f"日別認識回数取得エラー: {e}")
+        
+        return counts
+    
+    def get_recognition_count(self, days: int = 1, person_id: Optional[str] = None) -> int:
+        """直近 days 日間（今日を含む）の認識回数"""
+        return sum(self.get_daily_recognition_counts(days, person_id).values())
+    
+    def get_recognition_history(self, start: datetime, end: datetime,
+                                person_id: Optional[str] = None,
+                                limit: int = 100) -> List[Dict]:
+        """期間内の認識履歴（ts_epoch インデックスで範囲検索）"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            query = '''
+                SELECT person_id, timestamp, confidence, image_path
+                FROM recognition_history
+                WHERE ts_epoch >= ? AND ts_epoch < ?
+            '''
+            params = [int(start.timestamp()), int(end.timestamp())]
+            if person_id is not None:
+                query += ' AND person_id = ?'
+                params.append(person_id)
+            query += ' ORDER BY ts_epoch DESC LIMIT ?'
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            results = cursor.fetchall()
             conn.close()
             
+            return [
+                {
+                    'person_id': result[0],
+                    'timestamp': result[1],
+                    'confidence': result[2],
+                    'image_path': result[3]
+                }
+                for result in results
+            ]
+            
+        except Exception as e:
+            logger.error(f"認識履歴取得エラー: {e}")
+            return []
+    
+    def get_recognition_stats(self) -> Dict:
+        """認識統計を取得"""
+        try:
+            # 総認識回数・登録人数（キャッシュから集計）
+            person_cache = self._get_person_cache()
+            total_recognitions = sum(p['recognition_count'] or 0 for p in person_cache.values())
+            total_persons = sum(1 for p in person_cache.values() if p['is_active'] == 1)
+            
+            # 今日・直近7日間の認識回数（集計テーブルから取得）
+            daily_counts = self.get_daily_recognition_counts(days=7)
+            today_recognitions = daily_counts[datetime.now().strftime('%Y-%m-%d')]
+            
             return {
                 'total_persons': total_persons,
                 'total_recognitions': total_recognitions,
                 'today_recognitions': today_recognitions,
+                'week_recognitions': sum(daily_counts.values()),
+                'daily_recognitions': daily_counts,
                 'database_path': str(self.db_path),
                 'encodings_count': len(self.face_encodings_db)
             }
@@ -463,7 +1215,7 @@ class AdvancedFaceRecognizer:
     
     def draw_detections(self, frame: CameraFrame, detections: List[FaceDetection]) -> np.ndarray:
         """検出結果を画像に描画"""
-        result_image = frame.image.copy()
+        result_image = frame.mutable_copy()
         
         for detection in detections:
             x1, y1, x2, y2 = detection.bbox
@@ -492,4 +1244,207 @@ class AdvancedFaceRecognizer:
             cv2.putText(result_image, label, (x1, y1 - 5),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         
-        return result_image
\ No newline at end of file
+        return result_image
+
+_sface_models = None
+
+def _create_sface_models():
+    """YuNet 顔検出器と SFace 認識器を生成"""
+    for model_path in [config.SFACE_DETECTOR_MODEL, config.SFACE_RECOGNIZER_MODEL]:
+        if not Path(model_path).exists():
+            raise FileNotFoundError(
+                f"モデルファイルがありません: {model_path} "
+                f"（opencv_zoo の face_detection_yunet / face_recognition_sface を配置してください）"
+            )
+    
+    detector = cv2.FaceDetectorYN.create(
+        str(config.SFACE_DETECTOR_MODEL), "", (320, 320),
+        config.SFACE_SCORE_THRESHOLD, 0.3, 5000
+    )
+    recognizer = cv2.FaceRecognizerSF.create(str(config.SFACE_RECOGNIZER_MODEL), "")
+    return detector, recognizer
+
+def _normalize_feature(feature: np.ndarray) -> np.ndarray:
+    """SFace 特徴量を L2 正規化（ユークリッド距離でコサイン類似度と同じ順位になる）"""
+    feature = feature.flatten().astype(np.float64)
+    return feature / (np.linalg.norm(feature) + 1e-10)
+
+def _extract_sface_worker(image_path: str) -> Tuple[int, Optional[np.ndarray]]:
+    """画像1枚から SFace 特徴量を抽出（プロセスプールのワーカー）"""
+    global _sface_models
+    if _sface_models is None:
+        _sface_models = _create_sface_models()
+    detector, recognizer = _sface_models
+    
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"画像を読み込めません: {image_path}")
+    
+    detector.setInputSize((image.shape[1], image.shape[0]))
+    _, faces = detector.detect(image)
+    
+    if faces is None or len(faces) == 0:
+        return 0, None
+    if len(faces) > 1:
+        return len(faces), None
+    
+    aligned = recognizer.alignCrop(image, faces[0])
+    return 1, _normalize_feature(recognizer.feature(aligned))
+
+class SFaceRecognizer(AdvancedFaceRecognizer):
+    """OpenCV DNN 顔認識（YuNet 検出 + SFace 埋め込み、dlib 不要）"""
+    
+    # 人物DB・ギャラリー管理は共通、埋め込みは別ファイルに保存
+    encodings_filename = "sface_encodings.pkl"
+    extraction_worker = staticmethod(_extract_sface_worker)
+    method_name = "opencv_sface"
+    
+    def __init__(self):
+        self.detector = None
+        self.sface = None
+        self._model_lock = threading.Lock()  # cv2.dnn のネットワークはスレッド間で共有不可
+        self._local = threading.local()
+        super().__init__()
+        
+        # 正規化済み特徴量の距離（コサイン類似度 0.363 ≒ 距離 1.128）
+        self.max_distance = config.SFACE_MAX_DISTANCE
+        self.recognition_threshold = config.SFACE_RECOGNITION_THRESHOLD
+    
+    def _load_backend(self):
+        """YuNet / SFace モデルを読み込み"""
+        self.detector, self.sface = _create_sface_models()
+        logger.info("OpenCV YuNet/SFace を初期化")
+    
+    @property
+    def encoding_model_id(self) -> str:
+        """エンコーディングキャッシュのキーに使うモデル識別子"""
+        return config.SFACE_MODEL_ID
+    
+    def is_available(self) -> bool:
+        """利用可能性チェック"""
+        return self.sface is not None
+    
+    def to_model_image(self, frame: CameraFrame) -> np.ndarray:
+        """YuNet / SFace は BGR 入力のため変換不要"""
+        return frame.image
+    
+    def _detect(self, image: np.ndarray) -> np.ndarray:
+        """YuNet で検出（行: x, y, w, h, 5点ランドマーク, スコア）"""
+        with self._model_lock:
+            self.detector.setInputSize((image.shape[1], image.shape[0]))
+            _, faces = self.detector.detect(image)
+        return np.empty((0, 15), dtype=np.float32) if faces is None else faces
+    
+    def locate_faces(self, image: np.ndarray,
+                     frame: Optional[CameraFrame] = None) -> List[Tuple[int, int, int, int]]:
+        """顔位置を検出し、元画像の座標 (top, right, bottom, left) で返す"""
+        scale = self.detection_scale
+        if 0 < scale < 1.0:
+            if frame is not None:
+                small_image = frame.scaled(scale)
+            else:
+                small_image = cv2.resize(image, (0, 0), fx=scale, fy=scale,
+                                         interpolation=cv2.INTER_AREA)
+            faces = self._detect(small_image).copy()
+            faces[:, :14] /= scale
+        else:
+            faces = self._detect(image)
+        
+        height, width = image.shape[:2]
+        locations = [self._row_to_location(row, width, height) for row in faces]
+        
+        # 位置合わせ用にランドマーク付きの検出結果を保持
+        self._local.detections = (id(image), faces, locations)
+        return locations
+    
+    def _row_to_location(self, row: np.ndarray, width: int, height: int) -> Tuple[int, int, int, int]:
+        """YuNet の検出行を (top, right, bottom, left) に変換"""
+        x, y, w, h = row[:4]
+        return (
+            max(0, int(round(y))),
+            min(width, int(round(x + w))),
+            min(height, int(round(y + h))),
+            max(0, int(round(x)))
+        )
+    
+    def _detect_in_region(self, image: np.ndarray,
+                          location: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+        """他の検出器の枠の周辺で YuNet を実行してランドマークを取得"""
+        top, right, bottom, left = location
+        pad_x = int((right - left) * 0.25)
+        pad_y = int((bottom - top) * 0.25)
+        x1, y1 = max(0, left - pad_x), max(0, top - pad_y)
+        x2, y2 = min(image.shape[1], right + pad_x), min(image.shape[0], bottom + pad_y)
+        
+        region = image[y1:y2, x1:x2]
+        if region.size == 0:
+            return None
+        
+        faces = self._detect(region)
+        if len(faces) == 0:
+            return None
+        
+        # 最も大きい顔を採用し、元画像の座標に戻す
+        row = faces[np.argmax(faces[:, 2] * faces[:, 3])].copy()
+        row[0:14:2] += x1
+        row[1:14:2] += y1
+        return row
+    
+    def compute_encodings(self, image: np.ndarray,
+                          face_locations: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """顔位置ごとに位置合わせして SFace 特徴量を計算"""
+        image_id, faces, detected_locations = getattr(self._local, 'detections', (None, [], []))
+        
+        encodings = []
+        for location in face_locations:
+            row = None
+            if image_id == id(image) and location in detected_locations:
+                row = faces[detected_locations.index(location)]
+            else:
+                row = self._detect_in_region(image, location)
+            
+            with self._model_lock:
+                if row is not None:
+                    aligned = self.sface.alignCrop(image, row)
+                else:
+                    # ランドマークが得られない場合は枠をそのまま入力サイズに合わせる
+                    top, right, bottom, left = location
+                    aligned = cv2.resize(image[top:bottom, left:right], (112, 112))
+                feature = self.sface.feature(aligned)
+            
+            encodings.append(_normalize_feature(feature))
+        
+        return encodings
+    
+    def _face_distance(self, known_encodings: List[np.ndarray], face_encoding: np.ndarray) -> np.ndarray:
+        """正規化済み特徴量のユークリッド距離"""
+        return np.linalg.norm(np.asarray(known_encodings) - face_encoding, axis=1)
+    
+    def fuse_encodings(self, encodings: List[np.ndarray], weights: List[float]) -> np.ndarray:
+        """単位ベクトルの平均は長さが1未満になるため、距離閾値に合わせて再正規化"""
+        return _normalize_feature(super().fuse_encodings(encodings, weights))
+    
+    def migrate_from_gallery(self, source_path: Optional[Path] = None) -> Dict[str, int]:
+        """既存ギャラリー（dlib）の登録写真から SFace 特徴量を再計算して取り込み"""
+        if not self.is_available():
+            return {}
+        
+        source_path = Path(source_path) if source_path else config.DATA_DIR / AdvancedFaceRecognizer.encodings_filename
+        with open(source_path, 'rb') as f:
+            source_metadata = pickle.load(f).get('metadata', {})
+        
+        # 登録写真のパスを取り込み、reencode_all で一括抽出する
+        with self.lock:
+            metadata = dict(self.person_metadata)
+            metadata.update(source_metadata)
+            self._swap_gallery(dict(self.face_encodings_db), metadata)
+        
+        logger.info(f"ギャラリー移行: {len(source_metadata)}人 ({source_path})")
+        return self.reencode_all()
+
+def create_face_engine(engine: Optional[str] = None) -> AdvancedFaceRecognizer:
+    """設定に応じた顔認識エンジンを生成（"dlib" または "sface"）"""
+    engine = engine or config.FACE_IDENTITY_ENGINE
+    if engine == "sface":
+        return SFaceRecognizer()
+    return AdvancedFaceRecognizer()
@@ -5,12 +5,16 @@ import cv2
 import numpy as np
 import json
 import logging
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from abc import ABC, abstractmethod
 
 import config
 from models import CameraFrame, FaceDetection, PersonRecognitionResult
+from inference_worker import InferenceWorkerPool, InferenceTimeoutError, InferenceWorkerError
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +35,10 @@ class FaceRecognizer(ABC):
     def is_available(self) -> bool:
         """認識システムが利用可能か"""
         pass
+    
+    def calibration_probe(self, frame: CameraFrame) -> List[FaceDetection]:
+        """性能計測用の処理（認識履歴などの副作用なし）"""
+        return self.detect_faces(frame)
 
 class AdvancedFaceRecognizer(FaceRecognizer):
     """高精度顔認識（face_recognition ライブラリ使用）"""
@@ -62,8 +70,20 @@ class AdvancedFaceRecognizer(FaceRecognizer):
             logger.error(f"高精度顔検出エラー: {e}")
             return []
     
-    def recognize_person(self, frame: CameraFrame) -> PersonRecognitionResult:
-        """人物認識"""
+    def calibration_probe(self, frame: CameraFrame) -> List[FaceDetection]:
+        """性能計測用に顔位置検出とエンコーディングのみ実行"""
+        model_image = self.recognizer.to_model_image(frame)
+        face_locations = self.recognizer.locate_faces(model_image, frame)
+        self.recognizer.compute_encodings(model_image, face_locations)
+        
+        return [
+            FaceDetection(bbox=(left, top, right, bottom), confidence=1.0)
+            for top, right, bottom, left in face_locations
+        ]
+    
+    def recognize_person(self, frame: CameraFrame,
+                         face_locations: Optional[List[tuple]] = None) -> PersonRecognitionResult:
+        """人物認識（face_locations 指定時は顔位置検出を省略）"""
         if not self.is_available():
             return PersonRecognitionResult(
                 is_known_person=False,
@@ -71,7 +91,7 @@ class AdvancedFaceRecognizer(FaceRecognizer):
             )
         
         try:
-            result = self.recognizer.recognize_person(frame)
+            result = self.recognizer.recognize_person(frame, face_locations)
             
             # 既知の人物が見つかった場合、詳細情報を取得
             if result.is_known_person:
@@ -89,6 +109,32 @@ class AdvancedFaceRecognizer(FaceRecognizer):
                 method_used="advanced_error"
             )
     
+    def recognize_person_multi(self, frames: List[CameraFrame],
+                               face_locations: Optional[List[List[tuple]]] = None) -> PersonRecognitionResult:
+        """複数フレームを統合した人物認識（face_locations 指定時はフレームごとの顔位置検出を省略）"""
+        if not self.is_available():
+            return PersonRecognitionResult(
+                is_known_person=False,
+                method_used="advanced_unavailable"
+            )
+        
+        try:
+            result = self.recognizer.recognize_person_multi(frames, face_locations)
+            
+            if result.is_known_person:
+                person_info = self.recognizer.get_person_info(result.person_id)
+                if person_info:
+                    result.custom_message = self._create_welcome_message(person_info)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"高精度人物認識エラー（複数フレーム）: {e}")
+            return PersonRecognitionResult(
+                is_known_person=False,
+                method_used="advanced_error"
+            )
+    
     def _create_welcome_message(self, person_info: Dict) -> str:
         """個人に合わせた歓迎メッセージを作成"""
         name = person_info['name']
@@ -121,6 +167,16 @@ class AdvancedFaceRecognizer(FaceRecognizer):
         
         return self.recognizer.get_all_persons()
     
+    def start_gallery_watcher(self, interval: float):
+        """登録データの変更検知を開始"""
+        if self.is_available():
+            self.recognizer.start_gallery_watcher(interval)
+    
+    def stop_gallery_watcher(self):
+        """登録データの変更検知を停止"""
+        if self.recognizer is not None:
+            self.recognizer.stop_gallery_watcher()
+    
     def get_recognition_stats(self) -> Dict:
         """認識統計を取得"""
         if not self.is_available():
@@ -128,6 +184,19 @@ class AdvancedFaceRecognizer(FaceRecognizer):
         
         return self.recognizer.get_recognition_stats()
 
+class SFaceFaceRecognizer(AdvancedFaceRecognizer):
+    """OpenCV DNN 顔認識（YuNet 検出 + SFace 埋め込み、dlib 不要）"""
+    
+    def __init__(self):
+        try:
+            from face_recognition_advanced import SFaceRecognizer
+            self.recognizer = SFaceRecognizer()
+            if self.recognizer.is_available():
+                logger.info("SFace顔認識システムを初期化")
+        except Exception as e:
+            logger.error(f"SFace顔認識初期化エラー: {e}")
+            self.recognizer = None
+
 class MediaPipeFaceRecognizer(FaceRecognizer):
     """MediaPipe による顔認識（既存）"""
     
@@ -163,9 +232,8 @@ class MediaPipeFaceRecognizer(FaceRecognizer):
             return []
         
         try:
-            # BGR -> RGB変換
-            rgb_image = cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(rgb_image)
+            # RGB画像はフレームで共有
+            results = self.face_detection.process(frame.rgb())
             
             detections = []
             if results.detections:
@@ -205,6 +273,122 @@ class MediaPipeFaceRecognizer(FaceRecognizer):
             method_used="mediapipe"
         )
 
+class MediaPipeVideoFaceRecognizer(FaceRecognizer):
+    """MediaPipe Tasks の動画モードによる顔検出（フレーム間で検出結果を再利用）"""
+    
+    def __init__(self):
+        self.detector = None
+        self.mp = None
+        self.lock = threading.Lock()
+        self.last_timestamp_ms = -1
+        self.last_thumbnail = None
+        self.last_detections = []
+        self.frames_since_detection = 0
+        self.stats = {"frames": 0, "detections_run": 0}
+        self._initialize()
+    
+    def _initialize(self):
+        """MediaPipe Tasks 顔検出器を VIDEO モードで初期化"""
+        try:
+            import mediapipe as mp
+            from mediapipe.tasks import python as mp_tasks
+            from mediapipe.tasks.python import vision
+            
+            if not Path(config.MEDIAPIPE_FACE_MODEL).exists():
+                logger.warning(f"MediaPipe顔検出モデルがありません: {config.MEDIAPIPE_FACE_MODEL}")
+                return
+            
+            options = vision.FaceDetectorOptions(
+                base_options=mp_tasks.BaseOptions(model_asset_path=str(config.MEDIAPIPE_FACE_MODEL)),
+                running_mode=vision.RunningMode.VIDEO,
+                min_detection_confidence=config.FACE_CONFIDENCE_THRESHOLD
+            )
+            self.detector = vision.FaceDetector.create_from_options(options)
+            self.mp = mp
+            logger.info("MediaPipe動画モード顔検出を初期化")
+        except ImportError:
+            logger.warning("MediaPipe Tasks がインストールされていません")
+        except Exception as e:
+            logger.error(f"MediaPipe動画モード初期化エラー: {e}")
+    
+    def is_available(self) -> bool:
+        """利用可能性チェック"""
+        return self.detector is not None
+    
+    def _next_timestamp_ms(self, frame: CameraFrame) -> int:
+        """フレームの単調時計から単調増加するタイムスタンプ（ミリ秒）を生成"""
+        timestamp_ms = frame.monotonic_ns // 1_000_000
+        if timestamp_ms <= self.last_timestamp_ms:
+            timestamp_ms = self.last_timestamp_ms + 1
+        self.last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+    
+    def _is_scene_static(self, thumbnail: np.ndarray) -> bool:
+        """前回検出時からの画面変化が小さいか"""
+        if self.last_thumbnail is None or self.last_thumbnail.shape != thumbnail.shape:
+            return False
+        
+        difference = cv2.absdiff(thumbnail, self.last_thumbnail)
+        return float(np.mean(difference)) < config.MEDIAPIPE_VIDEO_MOTION_THRESHOLD
+    
+    def detect_faces(self, frame: CameraFrame) -> List[FaceDetection]:
+        """顔検出（画面変化が小さい間は前回の結果を再利用）"""
+        if not self.is_available():
+            return []
+        
+        try:
+            thumbnail = cv2.resize(frame.gray(0.25), (80, 60), interpolation=cv2.INTER_AREA)
+            
+            with self.lock:
+                self.stats["frames"] += 1
+                
+                if (self.frames_since_detection < config.MEDIAPIPE_VIDEO_KEYFRAME_INTERVAL and
+                        self._is_scene_static(thumbnail)):
+                    self.frames_since_detection += 1
+                    return list(self.last_detections)
+                
+                mp_image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=frame.rgb())
+                result = self.detector.detect_for_video(mp_image, self._next_timestamp_ms(frame))
+                
+                detections = []
+                for detection in result.detections:
+                    bbox = detection.bounding_box
+                    x1 = max(0, bbox.origin_x)
+                    y1 = max(0, bbox.origin_y)
+                    x2 = min(frame.width, bbox.origin_x + bbox.width)
+                    y2 = min(frame.height, bbox.origin_y + bbox.height)
+                    
+                    detections.append(FaceDetection(
+                        bbox=(x1, y1, x2, y2),
+                        confidence=detection.categories[0].score if detection.categories else 0.0
+                    ))
+                
+                self.last_detections = detections
+                self.last_thumbnail = thumbnail
+                self.frames_since_detection = 0
+                self.stats["detections_run"] += 1
+                return list(detections)
+            
+        except Exception as e:
+            logger.error(f"MediaPipe動画モード顔検出エラー: {e}")
+            return []
+    
+    def recognize_person(self, frame: CameraFrame) -> PersonRecognitionResult:
+        """人物認識（顔検出のみ）"""
+        face_detections = self.detect_faces(frame)
+        
+        return PersonRecognitionResult(
+            is_known_person=False,
+            face_detections=face_detections,
+            method_used="mediapipe_video"
+        )
+    
+    def recognize_person_multi(self, frames: List[CameraFrame]) -> PersonRecognitionResult:
+        """連続フレームを時刻順に流して最新フレームの結果を返す"""
+        for frame in frames[:-1]:
+            self.detect_faces(frame)
+        return self.recognize_person(frames[-1])
+
 class OpenCVHaarFaceRecognizer(FaceRecognizer):
     """OpenCV Haar Cascade による顔認識（既存）"""
     
@@ -237,8 +421,8 @@ class OpenCVHaarFaceRecognizer(FaceRecognizer):
             return []
         
         try:
-            # グレースケール変換
-            gray = cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY)
+            # グレースケール画像はフレームで共有
+            gray = frame.gray()
             
             # 顔検出
             faces = self.face_cascade.detectMultiScale(
@@ -287,14 +471,71 @@ class NoFaceRecognizer(FaceRecognizer):
             method_used="none"
         )
 
+# 個人識別ができる認識手法（優先順）
+IDENTITY_METHODS = ["advanced", "sface"]
+
+def _create_inference_handler():
+    """推論ワーカープロセス内で顔認識マネージャーを構築"""
+    manager = FaceRecognitionManager(worker_mode=True)
+    manager.start_gallery_watcher()
+    
+    def handle(method: str, images: List[np.ndarray], recognizer: str = None,
+               timestamps: List[datetime] = None, source: str = "camera",
+               seqs: List[int] = None, monotonic_ns: List[int] = None, source_ids: List[str] = None):
+        if method == "model_info":
+            return {
+                "method": manager.get_current_method(),
+                "methods": manager.get_available_methods()
+            }
+        
+        # 認識手法の選択はメインプロセス側に合わせる
+        if recognizer and recognizer != manager.get_current_method():
+            manager.switch_method(recognizer)
+        
+        # 動画モードの時刻順判定に使うフレーム番号・取得時刻もメインプロセスの値を引き継ぐ
+        count = len(images)
+        frames = [
+            CameraFrame(
+                image=image,
+                timestamp=timestamp,
+                width=image.shape[1],
+                height=image.shape[0],
+                source=source,
+                seq=seq,
+                monotonic_ns=captured_ns,
+                source_id=source_id
+            )
+            for image, timestamp, seq, captured_ns, source_id in zip(
+                images,
+                timestamps or [datetime.now()] * count,
+                seqs or [None] * count,
+                monotonic_ns or [None] * count,
+                source_ids or [None] * count
+            )
+        ]
+        
+        if method == "recognize_person_multi":
+            return manager.recognize_person_multi(frames)
+        return manager.recognize_person(frames[0])
+    
+    return handle
+
 class FaceRecognitionManager:
     """顔認識システム管理（統合版）"""
     
-    def __init__(self):
+    def __init__(self, worker_mode: bool = False):
+        self.worker_mode = worker_mode  # True: 推論ワーカープロセス内のインスタンス
         self.recognizers = {}
         self.active_recognizer = None
         self.known_faces_db = {}
+        self.cascade_detector = None
+        self.cascade_stats = {"checks": 0, "passed": 0}
+        self.calibration_report = None
+        self.inference_pool = None
         self._initialize_recognizers()
+        if config.FACE_RECOGNIZER_AUTO_CALIBRATE and not worker_mode:
+            self.calibrate()
+        self._initialize_cascade()
         self._load_known_faces()
     
     def _initialize_recognizers(self):
@@ -302,7 +543,9 @@ class FaceRecognitionManager:
         # 高精度顔認識を最優先に設定
         recognizer_classes = [
             ("advanced", AdvancedFaceRecognizer),      # 最優先
+            ("sface", SFaceFaceRecognizer),            # dlib がない環境向け
             ("mediapipe", MediaPipeFaceRecognizer),
+            ("mediapipe_video", MediaPipeVideoFaceRecognizer),
             ("opencv_haar", OpenCVHaarFaceRecognizer),
             ("none", NoFaceRecognizer)
         ]
@@ -314,11 +557,13 @@ class FaceRecognitionManager:
                     self.recognizers[name] = recognizer
                     logger.info(f"顔認識システム '{name}' を初期化")
                     
-                    # 高精度顔認識が利用可能な場合は優先的に使用
-                    if name == "advanced" and recognizer.is_available():
+                    # 個人識別できる手法が利用可能な場合は優先的に使用
+                    if name in IDENTITY_METHODS and self.active_recognizer is None:
                         self.active_recognizer = recognizer
-                        logger.info(f"高精度顔認識をアクティブに設定")
-                        break
+                        logger.info(f"個人識別の顔認識をアクティブに設定: {name}")
+                        # 自動キャリブレーション時は比較のため全手法を初期化
+                        if not config.FACE_RECOGNIZER_AUTO_CALIBRATE:
+                            break
                     
                     # 最初に利用可能なものをアクティブに（高精度が使えない場合）
                     if self.active_recognizer is None:
@@ -333,6 +578,179 @@ class FaceRecognitionManager:
             self.active_recognizer = NoFaceRecognizer()
             logger.warning("全ての顔認識システムが利用不可、フォールバックを使用")
     
+    def _load_calibration_frames(self) -> List[CameraFrame]:
+        """キャリブレーション用のサンプル画像を読み込み"""
+        frames = []
+        for image_path in sorted(config.TEST_IMAGES_DIR.glob("*")):
+            if len(frames) >= config.FACE_CALIBRATION_MAX_IMAGES:
+                break
+            if image_path.suffix.lower() not in ['.jpg', '.jpeg', '.png', '.bmp']:
+                continue
+            
+            image = cv2.imread(str(image_path))
+            if image is None:
+                continue
+            
+            frames.append(CameraFrame(
+                image=image,
+                timestamp=datetime.now(),
+                width=image.shape[1],
+                height=image.shape[0],
+                source="test_image"
+            ))
+        return frames
+    
+    def calibrate(self) -> Dict:
+        """サンプル画像で各手法の処理時間を計測し、予算内で最も高精度な手法を選択"""
+        frames = self._load_calibration_frames()
+        budget_ms = config.FACE_RECOGNITION_LATENCY_BUDGET_MS
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "budget_ms": budget_ms,
+            "sample_images": len(frames),
+            "measurements": {},
+            "selected": self.get_current_method()
+        }
+        
+        if not frames:
+            logger.warning("キャリブレーション用画像がないため既定の優先順位を使用")
+            self.calibration_report = report
+            return report
+        
+        # 精度の序列: 個人識別 > 顔検出 > なし（同順位は検出率で比較）
+        capability = {"advanced": 2, "sface": 2, "mediapipe": 1, "mediapipe_video": 1,
+                      "opencv_haar": 1, "none": 0}
+        best_name, best_score = None, None
+        
+        for name, recognizer in self.recognizers.items():
+            try:
+                # 初回はモデル読み込み等を含むため除外
+                recognizer.calibration_probe(frames[0])
+                
+                timings = []
+                detected_images = 0
+                for frame in frames:
+                    start_time = time.perf_counter()
+                    detections = recognizer.calibration_probe(frame)
+                    timings.append((time.perf_counter() - start_time) * 1000)
+                    if detections:
+                        detected_images += 1
+                
+                timings_ms = np.array(timings)
+                p95_ms = float(np.percentile(timings_ms, 95))
+                detection_rate = detected_images / len(frames)
+                within_budget = p95_ms <= budget_ms
+                
+                report["measurements"][name] = {
+                    "mean_ms": round(float(np.mean(timings_ms)), 1),
+                    "p95_ms": round(p95_ms, 1),
+                    "detection_rate": round(detection_rate, 3),
+                    "within_budget": within_budget
+                }
+                logger.info(f"キャリブレーション '{name}': p95 {p95_ms:.1f}ms, 検出率 {detection_rate:.0%}")
+                
+                score = (capability.get(name, 0), detection_rate)
+                if within_budget and (best_score is None or score > best_score):
+                    best_name, best_score = name, score
+                    
+            except Exception as e:
+                logger.error(f"キャリブレーションエラー ({name}): {e}")
+                report["measurements"][name] = {"error": str(e)}
+        
+        if best_name:
+            self.switch_method(best_name)
+            report["selected"] = best_name
+        else:
+            logger.warning(f"予算 {budget_ms}ms 内の手法がないため現在の手法を維持")
+        
+        logger.info(f"キャリブレーション完了: {report['selected']}")
+        self.calibration_report = report
+        return report
+    
+    def _initialize_cascade(self):
+        """カスケード用の軽量顔検出器を初期化"""
+        if not config.FACE_CASCADE_ENABLED or self.get_identity_recognizer() is None:
+            return
+        
+        name = config.FACE_CASCADE_DETECTOR
+        detector_classes = {
+            "mediapipe": MediaPipeFaceRecognizer,
+            "opencv_haar": OpenCVHaarFaceRecognizer
+        }
+        
+        if name not in detector_classes:
+            logger.warning(f"未対応のカスケード検出器: {name}")
+            return
+        
+        try:
+            # 認識手法の一覧（切り替え・キャリブレーション候補）には追加しない
+            detector = self.recognizers.get(name) or detector_classes[name]()
+            if not detector.is_available():
+                logger.warning(f"カスケード検出器 '{name}' が利用できません")
+                return
+            
+            self.cascade_detector = detector
+            logger.info(f"カスケード認識を有効化: {name} → 個人識別")
+            
+        except Exception as e:
+            logger.error(f"カスケード検出器初期化エラー: {e}")
+    
+    def _is_cascade_active(self) -> bool:
+        """カスケード認識を使用するか"""
+        return (self.cascade_detector is not None and
+                self.get_current_method() in IDENTITY_METHODS)
+    
+    def _gate_faces(self, frame: CameraFrame) -> List[Tuple[int, int, int, int]]:
+        """軽量検出器で十分な大きさの顔を検出し (top, right, bottom, left) で返す"""
+        min_size = config.FACE_CASCADE_MIN_FACE_SIZE
+        
+        # 軽量検出器の枠 (x1, y1, x2, y2) を (top, right, bottom, left) に変換して再利用
+        return [
+            (int(y1), int(x2), int(y2), int(x1))
+            for x1, y1, x2, y2 in (detection.bbox for detection in self.cascade_detector.detect_faces(frame))
+            if min(x2 - x1, y2 - y1) >= min_size
+        ]
+    
+    def _recognize_with_cascade(self, frame: CameraFrame) -> PersonRecognitionResult:
+        """軽量検出器で十分な大きさの顔がある場合のみ高精度認識を実行"""
+        self.cascade_stats["checks"] += 1
+        face_locations = self._gate_faces(frame)
+        
+        if not face_locations:
+            return PersonRecognitionResult(is_known_person=False, method_used="cascade_no_face")
+        
+        self.cascade_stats["passed"] += 1
+        return self.active_recognizer.recognize_person(frame, face_locations)
+    
+    def _recognize_multi_with_cascade(self, frames: List[CameraFrame]) -> PersonRecognitionResult:
+        """軽量検出器を通過したフレームだけを統合して高精度認識"""
+        self.cascade_stats["checks"] += 1
+        gated = [(frame, self._gate_faces(frame)) for frame in frames]
+        gated = [(frame, face_locations) for frame, face_locations in gated if face_locations]
+        
+        if not gated:
+            return PersonRecognitionResult(is_known_person=False, method_used="cascade_no_face")
+        
+        self.cascade_stats["passed"] += 1
+        if len(gated) == 1:
+            frame, face_locations = gated[0]
+            return self.active_recognizer.recognize_person(frame, face_locations)
+        # 軽量検出器の顔位置をそのまま使い、高精度側での再検出を省く
+        return self.active_recognizer.recognize_person_multi([frame for frame, _ in gated],
+                                                             [face_locations for _, face_locations in gated])
+    
+    def get_cascade_stats(self) -> Dict:
+        """カスケード認識の通過統計"""
+        checks = self.cascade_stats["checks"]
+        passed = self.cascade_stats["passed"]
+        return {
+            "enabled": self._is_cascade_active(),
+            "detector": config.FACE_CASCADE_DETECTOR if self.cascade_detector else None,
+            "checks": checks,
+            "passed": passed,
+            "pass_rate": passed / checks if checks else 0.0
+        }
+    
     def _load_known_faces(self):
         """既知の顔データベース読み込み（下位互換性）"""
         try:
@@ -353,7 +771,16 @@ class FaceRecognitionManager:
         if not config.USE_FACE_RECOGNITION or not self.active_recognizer:
             return PersonRecognitionResult(is_known_person=False, method_used="disabled")
         
+        if self.inference_pool is not None:
+            result = self._recognize_remote("recognize_person", [frame])
+            if result is not None:
+                return result
+        
         try:
+            # 高精度認識がアクティブな場合は軽量検出器で事前判定
+            if self._is_cascade_active():
+                return self._recognize_with_cascade(frame)
+            
             # アクティブな認識システムで実行
             result = self.active_recognizer.recognize_person(frame)
             
@@ -371,6 +798,84 @@ class FaceRecognitionManager:
             logger.error(f"人物認識エラー: {e}")
             return PersonRecognitionResult(is_known_person=False, method_used="error")
     
+    def recognize_person_multi(self, frames: List[CameraFrame]) -> PersonRecognitionResult:
+        """複数フレームを統合した人物認識（非対応の手法では最新フレームのみ使用）"""
+        if not frames:
+            return PersonRecognitionResult(is_known_person=False, method_used="no_frame")
+        
+        if self.inference_pool is not None and config.USE_FACE_RECOGNITION:
+            result = self._recognize_remote("recognize_person_multi", frames)
+            if result is not None:
+                return result
+        
+        if not hasattr(self.active_recognizer, 'recognize_person_multi'):
+            return self.recognize_person(frames[-1])
+        
+        if not config.USE_FACE_RECOGNITION:
+            return PersonRecognitionResult(is_known_person=False, method_used="disabled")
+        
+        try:
+            # 高精度認識がアクティブな場合は軽量検出器で事前判定（顔のないフレームは統合しない）
+            if self._is_cascade_active():
+                return self._recognize_multi_with_cascade(frames)
+            return self.active_recognizer.recognize_person_multi(frames)
+        except Exception as e:
+            logger.error(f"人物認識エラー: {e}")
+            return PersonRecognitionResult(is_known_person=False, method_used="error")
+    
+    def _recognize_remote(self, method: str, frames: List[CameraFrame]) -> Optional[PersonRecognitionResult]:
+        """推論ワーカーで認識（ワーカー異常時は None を返しプロセス内で実行）"""
+        try:
+            return self.inference_pool.submit(
+                method,
+                [frame.image for frame in frames],
+                recognizer=self.get_current_method(),
+                timestamps=[frame.timestamp for frame in frames],
+                source=frames[0].source,
+                seqs=[frame.seq for frame in frames],
+                monotonic_ns=[frame.monotonic_ns for frame in frames],
+                source_ids=[frame.source_id for frame in frames]
+            )
+        except InferenceTimeoutError as e:
+            logger.warning(f"推論ワーカータイムアウトのためプロセス内で実行: {e}")
+            return None
+        except InferenceWorkerError as e:
+            logger.error(f"推論ワーカーエラー: {e}")
+            return None
+    
+    def start_inference_worker(self):
+        """顔認識を別プロセスの推論ワーカーで実行開始"""
+        if not config.INFERENCE_WORKER_ENABLED or self.worker_mode or self.inference_pool is not None:
+            return
+        
+        if self.get_current_method() in ["none", "unknown"]:
+            return
+        
+        pool = InferenceWorkerPool(
+            _create_inference_handler,
+            workers=config.INFERENCE_WORKERS,
+            slots=config.INFERENCE_SHARED_SLOTS,
+            slot_bytes=config.INFERENCE_SLOT_BYTES,
+            timeout=config.INFERENCE_TIMEOUT
+        )
+        if not pool.start():
+            return
+        
+        try:
+            # ワーカー側のモデル読み込みを待ってから認識を振り分ける
+            info = pool.submit("model_info", [], timeout=config.INFERENCE_STARTUP_TIMEOUT)
+            logger.info(f"推論ワーカーの準備完了: {info['method']}（利用可能: {info['methods']}）")
+            self.inference_pool = pool
+        except Exception as e:
+            logger.error(f"推論ワーカー初期化エラー（プロセス内で認識します）: {e}")
+            pool.stop()
+    
+    def get_inference_stats(self) -> Dict:
+        """推論ワーカーの稼働統計"""
+        if self.inference_pool is None:
+            return {"running": False}
+        return self.inference_pool.get_stats()
+    
     def get_available_methods(self) -> List[str]:
         """利用可能な認識手法リスト"""
         return list(self.recognizers.keys())
@@ -390,32 +895,70 @@ class FaceRecognitionManager:
                 return name
         return "unknown"
     
+    def get_identity_recognizer(self) -> Optional[FaceRecognizer]:
+        """個人識別に使う認識手法（アクティブ手法を優先）"""
+        current_method = self.get_current_method()
+        if current_method in IDENTITY_METHODS:
+            return self.active_recognizer
+        
+        for name in IDENTITY_METHODS:
+            if name in self.recognizers:
+                return self.recognizers[name]
+        return None
+    
     def is_advanced_available(self) -> bool:
-        """高精度顔認識が利用可能か"""
-        return "advanced" in self.recognizers
+        """高精度顔認識（個人識別）が利用可能か"""
+        return self.get_identity_recognizer() is not None
+    
+    def start_gallery_watcher(self):
+        """登録データのホットリロードを開始"""
+        if not config.FACE_GALLERY_HOT_RELOAD:
+            return
+        
+        for name in IDENTITY_METHODS:
+            if name in self.recognizers:
+                self.recognizers[name].start_gallery_watcher(config.FACE_GALLERY_WATCH_INTERVAL)
+    
+    def shutdown(self):
+        """バックグラウンド処理の停止"""
+        for name in IDENTITY_METHODS:
+            if name in self.recognizers:
+                self.recognizers[name].stop_gallery_watcher()
+        
+        if self.inference_pool is not None:
+            self.inference_pool.stop()
+            self.inference_pool = None
+    
+    def get_person_info(self, person_id: str) -> Optional[Dict]:
+        """登録人物の情報を取得"""
+        identity_recognizer = self.get_identity_recognizer()
+        if identity_recognizer is None:
+            return None
+        return identity_recognizer.recognizer.get_person_info(person_id)
     
     def get_registered_persons(self) -> List[Dict]:
         """登録済み人物一覧を取得"""
-        if self.is_advanced_available():
-            return self.recognizers["advanced"].get_registered_persons()
+        identity_recognizer = self.get_identity_recognizer()
+        if identity_recognizer is not None:
+            return identity_recognizer.get_registered_persons()
         return []
     
     def get_recognition_stats(self) -> Dict:
         """認識統計を取得"""
-        if self.is_advanced_available():
-            return self.recognizers["advanced"].get_recognition_stats()
+        identity_recognizer = self.get_identity_recognizer()
+        if identity_recognizer is not None:
+            return identity_recognizer.get_recognition_stats()
         return {}
     
     def draw_detections(self, frame: CameraFrame, detections: List[FaceDetection]) -> np.ndarray:
         """検出結果を画像に描画"""
-        result_image = frame.image.copy()
+        result_image = frame.mutable_copy()
         
         # 高精度顔認識が利用可能な場合は専用の描画メソッドを使用
-        if (self.is_advanced_available() and 
-            hasattr(self.recognizers["advanced"], 'recognizer') and
-            self.recognizers["advanced"].recognizer):
+        identity_recognizer = self.get_identity_recognizer()
+        if identity_recognizer is not None and identity_recognizer.recognizer:
             try:
-                return self.recognizers["advanced"].recognizer.draw_detections(frame, detections)
+                return identity_recognizer.recognizer.draw_detections(frame, detections)
             except:
                 pass
         
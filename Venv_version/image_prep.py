@@ -0,0 +1,154 @@
+"""
+LLM用画像準備 - 訪問者領域の切り出し・縮小・サイズ予算に応じたJPEG品質選択
+"""
+import base64
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # (x1, y1, x2, y2)
+
+@dataclass
+class PreparedImage:
+    """LLMへ送る準備済み画像"""
+    jpeg: bytes
+    quality: int
+    crop_box: Box
+    size: Tuple[int, int]  # 送信サイズ (幅, 高さ)
+    original_size: Tuple[int, int]  # 元フレームサイズ (幅, 高さ)
+    region_source: str  # "face", "person", "full"
+    prep_ms: float
+    crop: np.ndarray = field(default=None, repr=False)  # 縮小後の訪問者画像（BGR）
+
+    @property
+    def base64(self) -> str:
+        """Base64文字列"""
+        return base64.b64encode(self.jpeg).decode('utf-8')
+
+    @property
+    def cacheable(self) -> bool:
+        """説明キャッシュに使えるか（フレーム全体は背景が大半で別の訪問者と区別できない）"""
+        return self.region_source != "full" and self.crop is not None
+
+    def summary(self) -> str:
+        """ログ用の要約"""
+        return (f"{self.original_size[0]}x{self.original_size[1]} → {self.size[0]}x{self.size[1]} "
+                f"({self.region_source}), {len(self.jpeg) / 1024:.1f}KB q={self.quality}, "
+                f"準備 {self.prep_ms:.1f}ms")
+
+class ImagePreparer:
+    """訪問者を切り出して視覚モデル向けのサイズ・画質に整える"""
+
+    def __init__(self, long_edge: int = 896, max_bytes: int = 150 * 1024,
+                 max_quality: int = 90, min_quality: int = 50, quality_step: int = 10,
+                 face_expand: Tuple[float, float, float] = (1.5, 0.6, 5.0),
+                 person_margin: float = 0.1, use_person_detector: bool = True):
+        self.long_edge = long_edge
+        self.max_bytes = max_bytes
+        self.max_quality = max_quality
+        self.min_quality = min_quality
+        self.quality_step = quality_step
+        # 顔枠から上半身を含む領域への拡張率（左右, 上, 下）: 顔の幅・高さに対する倍率
+        self.face_expand = face_expand
+        self.person_margin = person_margin
+        self.use_person_detector = use_person_detector
+        self.person_detector = None
+
+    def _clip(self, box: Sequence[float], width: int, height: int) -> Box:
+        """画像範囲に収める"""
+        x1, y1, x2, y2 = box
+        return (max(0, int(x1)), max(0, int(y1)), min(width, int(x2)), min(height, int(y2)))
+
+    def _union(self, boxes: List[Sequence[float]]) -> Tuple[float, float, float, float]:
+        """複数の枠を包含する枠"""
+        return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+    def _detect_people(self, image: np.ndarray) -> List[Box]:
+        """HOG人物検出（縮小画像で実行し元の座標に戻す）"""
+        try:
+            if self.person_detector is None:
+                self.person_detector = cv2.HOGDescriptor()
+                self.person_detector.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+            scale = min(1.0, 400.0 / image.shape[1])
+            small = cv2.resize(image, (0, 0), fx=scale, fy=scale) if scale < 1.0 else image
+            rects, _ = self.person_detector.detectMultiScale(small, winStride=(8, 8))
+            return [(x / scale, y / scale, (x + w) / scale, (y + h) / scale) for x, y, w, h in rects]
+
+        except Exception as e:
+            logger.error(f"人物検出エラー: {e}")
+            if self.person_detector is None:
+                # 初期化できない環境では以降は顔枠またはフレーム全体を使う
+                self.use_person_detector = False
+            return []
+
+    def visitor_region(self, image: np.ndarray, face_boxes: Optional[List[Box]] = None) -> Tuple[Box, str]:
+        """訪問者領域と、その根拠（face / person / full）を返す"""
+        height, width = image.shape[:2]
+
+        if face_boxes:
+            side, above, below = self.face_expand
+            expanded = []
+            for x1, y1, x2, y2 in face_boxes:
+                face_width, face_height = x2 - x1, y2 - y1
+                expanded.append((x1 - face_width * side, y1 - face_height * above,
+                                 x2 + face_width * side, y2 + face_height * below))
+            return self._clip(self._union(expanded), width, height), "face"
+
+        if self.use_person_detector:
+            people = self._detect_people(image)
+            if people:
+                x1, y1, x2, y2 = self._union(people)
+                margin_x, margin_y = (x2 - x1) * self.person_margin, (y2 - y1) * self.person_margin
+                return self._clip((x1 - margin_x, y1 - margin_y, x2 + margin_x, y2 + margin_y),
+                                  width, height), "person"
+
+        return (0, 0, width, height), "full"
+
+    def _encode_within_budget(self, image: np.ndarray) -> Tuple[bytes, int]:
+        """サイズ予算に収まる最も高い品質でJPEGエンコード"""
+        quality = self.max_quality
+        while True:
+            success, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not success:
+                raise ValueError("JPEGエンコードに失敗しました")
+            if len(buffer) <= self.max_bytes or quality - self.quality_step < self.min_quality:
+                return buffer.tobytes(), quality
+            quality -= self.quality_step
+
+    def prepare(self, image: np.ndarray, face_boxes: Optional[List[Box]] = None) -> PreparedImage:
+        """切り出し → 縮小 → 品質選択"""
+        start_time = time.perf_counter()
+        height, width = image.shape[:2]
+
+        crop_box, region_source = self.visitor_region(image, face_boxes)
+        x1, y1, x2, y2 = crop_box
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            crop_box, region_source = (0, 0, width, height), "full"
+            x1, y1, x2, y2 = crop_box
+        cropped = image[y1:y2, x1:x2]
+
+        # 長辺を視覚モデルの入力サイズに合わせる（拡大はしない）
+        scale = self.long_edge / max(cropped.shape[:2])
+        if scale < 1.0:
+            cropped = cv2.resize(cropped, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        jpeg, quality = self._encode_within_budget(cropped)
+
+        return PreparedImage(
+            jpeg=jpeg,
+            quality=quality,
+            crop_box=crop_box,
+            size=(cropped.shape[1], cropped.shape[0]),
+            original_size=(width, height),
+            region_source=region_source,
+            prep_ms=(time.perf_counter() - start_time) * 1000,
+            crop=cropped
+        )
@@ -0,0 +1,376 @@
+"""
+推論ワーカー - 重い推論処理を別プロセスで実行し、Webサーバーのスレッドを止めない
+"""
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing import connection, shared_memory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class InferenceTimeoutError(Exception):
+    """推論ワーカーの応答タイムアウト"""
+    pass
+
+class InferenceWorkerError(Exception):
+    """推論ワーカー側の処理エラー"""
+    pass
+
+# ワーカーからの応答の種類
+RESULT_OK = "ok"
+RESULT_ERROR = "error"
+RESULT_EXPIRED = "expired"  # 期限切れのため実行しなかった
+
+WORKER_CHECK_INTERVAL = 1.0  # ワーカーの生存確認間隔（秒）
+
+def _worker_main(handler_factory: Callable, request_conn, result_conn, slot_names: List[str]):
+    """
+    ワーカープロセスのメインループ
+    要求・応答はワーカー専用のパイプで受け渡す（共有キューのロックを握ったまま異常終了すると他のワーカーまで止まるため）
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # 共有メモリの解放は親プロセスが担当（resource_tracker は親と共有）
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    handler = handler_factory()
+
+    while True:
+        try:
+            request = request_conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        request_id, method, frame_specs, kwargs, deadline = request
+        # 待ち行列に溜まった古いリクエストは実行せずに返す（タイムアウトの連鎖を防ぐ）
+        if time.time() >= deadline:
+            result_conn.send((request_id, RESULT_EXPIRED, None))
+            continue
+
+        images = []
+        try:
+            # 共有メモリ上のフレームをコピーせずに参照（スロットは応答を返すまで親が再利用しない）
+            images = [
+                np.ndarray(shape, dtype=dtype, buffer=slots[slot_index].buf)
+                for slot_index, shape, dtype in frame_specs
+            ]
+            result = handler(method, images, **kwargs)
+            result_conn.send((request_id, RESULT_OK, result))
+        except Exception as e:
+            result_conn.send((request_id, RESULT_ERROR, f"{type(e).__name__}: {e}"))
+        finally:
+            del images
+
+    for slot in slots:
+        slot.close()
+
+class InferenceWorkerPool:
+    """推論ワーカープロセス群のクライアント"""
+
+    def __init__(self, handler_factory: Callable, workers: int = 1, slots: int = 4,
+                 slot_bytes: int = 1920 * 1080 * 3, timeout: float = 10.0):
+        self.handler_factory = handler_factory
+        self.worker_count = max(1, workers)
+        self.slot_count = max(1, slots)
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = []  # {'process', 'requests': 送信側パイプ, 'results': 受信側パイプ, 'in_flight': 送信済みリクエストID}
+        self.worker_lock = threading.Lock()
+        self.slots = []
+
+        self.free_slots = []
+        self.slot_condition = threading.Condition()
+        self.pending = {}
+        self.abandoned = {}  # タイムアウトしたがワーカーがまだスロットを使う可能性があるリクエスト → スロット
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
+
+        self.dispatcher_thread = None
+        self.is_running = False
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "timeouts": 0,
+            "expired": 0,
+            "errors": 0,
+            "restarts": 0,
+            "total_latency_ms": 0.0
+        }
+
+    def start(self) -> bool:
+        """ワーカープロセスと共有メモリを準備"""
+        if self.is_running:
+            return True
+
+        try:
+            self.slots = [
+                shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+                for _ in range(self.slot_count)
+            ]
+            self.free_slots = list(range(self.slot_count))
+            self.workers = [self._spawn_worker() for _ in range(self.worker_count)]
+
+            self.is_running = True
+            self.dispatcher_thread = threading.Thread(target=self._dispatch_results, daemon=True)
+            self.dispatcher_thread.start()
+
+            logger.info(f"推論ワーカーを起動: {self.worker_count}プロセス, 共有メモリ {self.slot_count}スロット")
+            return True
+
+        except Exception as e:
+            logger.error(f"推論ワーカー起動エラー: {e}")
+            self.stop()
+            return False
+
+    def _spawn_worker(self) -> Dict:
+        """ワーカープロセスを1つ起動"""
+        request_reader, request_writer = self.context.Pipe(duplex=False)
+        result_reader, result_writer = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=_worker_main,
+            args=(self.handler_factory, request_reader, result_writer, [slot.name for slot in self.slots]),
+            daemon=True
+        )
+        process.start()
+        # ワーカー側の端は親では閉じる（ワーカーが終了すると受信側が EOF になる）
+        request_reader.close()
+        result_writer.close()
+        return {"process": process, "requests": request_writer, "results": result_reader, "in_flight": set()}
+
+    def submit(self, method: str, images: List[np.ndarray], timeout: Optional[float] = None,
+               **kwargs) -> Any:
+        """画像を共有メモリ経由で渡して推論を実行し、結果を待つ"""
+        if not self.is_running:
+            raise InferenceWorkerError("推論ワーカーが起動していません")
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        start_time = time.perf_counter()
+
+        slot_indices = self._acquire_slots(images, deadline)
+        request_id = next(self.request_ids)
+        entry = {"event": threading.Event(), "status": RESULT_ERROR, "result": None, "slots": slot_indices}
+
+        try:
+            frame_specs = []
+            for slot_index, image in zip(slot_indices, images):
+                image = np.ascontiguousarray(image)
+                view = np.ndarray(image.shape, dtype=image.dtype, buffer=self.slots[slot_index].buf)
+                view[...] = image
+                frame_specs.append((slot_index, image.shape, image.dtype.str))
+
+            with self.pending_lock:
+                self.pending[request_id] = entry
+                self.stats["submitted"] += 1
+
+            # 期限はプロセス間で比較するため壁時計で渡す
+            self._send_request((request_id, method, frame_specs, kwargs, time.time() + timeout))
+
+        except Exception:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            self._release_slots(slot_indices)
+            raise
+
+        if not entry["event"].wait(max(0.0, deadline - time.monotonic())):
+            # 待ち行列・実行中のワーカーがまだスロットを参照するため、応答が届くまで返却しない
+            with self.pending_lock:
+                if self.pending.pop(request_id, None) is not None:
+                    self.abandoned[request_id] = slot_indices
+                self.stats["timeouts"] += 1
+            raise InferenceTimeoutError(f"推論ワーカーが{timeout:.1f}秒以内に応答しませんでした")
+
+        if entry["status"] == RESULT_EXPIRED:
+            with self.pending_lock:
+                self.stats["expired"] += 1
+            raise InferenceTimeoutError("推論リクエストが実行前に期限切れになりました")
+
+        if entry["status"] != RESULT_OK:
+            with self.pending_lock:
+                self.stats["errors"] += 1
+            raise InferenceWorkerError(entry["result"])
+
+        with self.pending_lock:
+            self.stats["completed"] += 1
+            self.stats["total_latency_ms"] += (time.perf_counter() - start_time) * 1000
+        return entry["result"]
+
+    def _send_request(self, request: tuple):
+        """未処理の最も少ないワーカーへ送信"""
+        request_id = request[0]
+        with self.worker_lock:
+            alive = [worker for worker in self.workers if worker["process"].is_alive()]
+            if not alive:
+                raise InferenceWorkerError("稼働中の推論ワーカーがありません")
+            worker = min(alive, key=lambda candidate: len(candidate["in_flight"]))
+            worker["in_flight"].add(request_id)
+            try:
+                worker["requests"].send(request)
+            except Exception:
+                worker["in_flight"].discard(request_id)
+                raise
+
+    def _acquire_slots(self, images: List[np.ndarray], deadline: float) -> List[int]:
+        """必要数の共有メモリスロットをまとめて確保"""
+        if len(images) > self.slot_count:
+            raise InferenceWorkerError(f"フレーム数 {len(images)} がスロット数 {self.slot_count} を超えています")
+
+        for image in images:
+            if image.nbytes > self.slot_bytes:
+                raise InferenceWorkerError(f"フレームサイズ {image.nbytes} バイトがスロット容量を超えています")
+
+        with self.slot_condition:
+            while len(self.free_slots) < len(images):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.slot_condition.wait(remaining):
+                    with self.pending_lock:
+                        self.stats["timeouts"] += 1
+                    raise InferenceTimeoutError("共有メモリスロットの空き待ちでタイムアウト")
+
+            acquired = self.free_slots[:len(images)]
+            del self.free_slots[:len(images)]
+            return acquired
+
+    def _release_slots(self, slot_indices: List[int]):
+        """共有メモリスロットを返却"""
+        with self.slot_condition:
+            self.free_slots.extend(slot_indices)
+            self.slot_condition.notify_all()
+
+    def _dispatch_results(self):
+        """各ワーカーの応答パイプを監視して待機中のリクエストに配送（応答が続く間もワーカーの生存を定期確認）"""
+        checked_at = time.monotonic()
+        while self.is_running:
+            with self.worker_lock:
+                readers = {worker["results"]: worker for worker in self.workers}
+
+            for reader in connection.wait(list(readers), timeout=WORKER_CHECK_INTERVAL):
+                worker = readers[reader]
+                try:
+                    request_id, status, result = reader.recv()
+                except (EOFError, OSError):
+                    # パイプが閉じた＝ワーカーが終了した
+                    if self.is_running:
+                        self._replace_worker(worker)
+                    continue
+
+                with self.worker_lock:
+                    worker["in_flight"].discard(request_id)
+                self._complete(request_id, status, result)
+
+            if time.monotonic() - checked_at >= WORKER_CHECK_INTERVAL:
+                self._restart_dead_workers()
+                checked_at = time.monotonic()
+
+    def _complete(self, request_id: int, status: str, result: Any):
+        """応答が届いたリクエストのスロットを返却し、待機中なら結果を渡す"""
+        with self.pending_lock:
+            entry = self.pending.pop(request_id, None)
+            abandoned_slots = self.abandoned.pop(request_id, None)
+
+        if entry is None:
+            # タイムアウト済みのリクエスト（ワーカーが使い終えたのでスロットだけ返却）
+            if abandoned_slots is not None:
+                self._release_slots(abandoned_slots)
+            return
+
+        self._release_slots(entry["slots"])
+        entry["status"] = status
+        entry["result"] = result
+        entry["event"].set()
+
+    def _restart_dead_workers(self):
+        """異常終了したワーカーを再起動"""
+        with self.worker_lock:
+            dead = [worker for worker in self.workers if not worker["process"].is_alive()]
+        for worker in dead:
+            if self.is_running:
+                self._replace_worker(worker)
+
+    def _replace_worker(self, worker: Dict):
+        """ワーカーを新しいプロセスに置き換え、送信済みのリクエストはエラーとしてスロットを回収"""
+        with self.worker_lock:
+            if worker not in self.workers:
+                return
+            # 置き換え後の送信は新しいワーカーへ向かうよう、入れ替えまでをロック内で行う
+            failed = list(worker["in_flight"])
+            self.workers[self.workers.index(worker)] = self._spawn_worker()
+
+        process = worker["process"]
+        logger.warning(f"推論ワーカー(pid={process.pid})が終了したため再起動します")
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=1)
+        worker["requests"].close()
+        worker["results"].close()
+
+        for request_id in failed:
+            self._complete(request_id, RESULT_ERROR, "推論ワーカーが異常終了しました")
+        with self.pending_lock:
+            self.stats["restarts"] += 1
+
+    def get_stats(self) -> Dict:
+        """ワーカーの稼働統計"""
+        with self.pending_lock:
+            stats = dict(self.stats)
+            in_flight = len(self.pending)
+            abandoned = len(self.abandoned)
+
+        completed = stats.pop("total_latency_ms")
+        stats["avg_latency_ms"] = round(completed / stats["completed"], 1) if stats["completed"] else 0.0
+        stats["in_flight"] = in_flight
+        stats["abandoned"] = abandoned
+        with self.worker_lock:
+            stats["workers_alive"] = sum(1 for worker in self.workers if worker["process"].is_alive())
+        stats["running"] = self.is_running
+        return stats
+
+    def stop(self):
+        """ワーカープロセスを停止して共有メモリを解放"""
+        self.is_running = False
+
+        if self.dispatcher_thread and self.dispatcher_thread.is_alive():
+            self.dispatcher_thread.join(timeout=2)
+
+        with self.worker_lock:
+            workers = self.workers
+            self.workers = []
+        for worker in workers:
+            try:
+                worker["requests"].send(None)
+            except Exception:
+                pass
+        for worker in workers:
+            process = worker["process"]
+            process.join(timeout=3)
+            if process.is_alive():
+                process.terminate()
+            worker["requests"].close()
+            worker["results"].close()
+
+        # 待機中のリクエストをエラーで解放
+        with self.pending_lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+            self.abandoned.clear()
+        for entry in pending:
+            entry["result"] = "推論ワーカーが停止しました"
+            entry["event"].set()
+
+        for slot in self.slots:
+            try:
+                slot.close()
+                slot.unlink()
+            except Exception:
+                pass
+        self.slots = []
+        self.free_slots = []
+
+        logger.info("推論ワーカーを停止")
@@ -0,0 +1,311 @@
+"""
+LLM HTTPクライアント - 接続プールを共有する非同期クライアント（期限・キャンセル・ジッター付き再試行）
+"""
+import asyncio
+import json
+import logging
+import queue
+import random
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Dict, Optional
+
+import requests
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+class LLMTimeoutError(requests.exceptions.Timeout):
+    """リクエスト期限切れ"""
+    pass
+
+class LLMConnectionError(requests.exceptions.ConnectionError):
+    """接続失敗（再試行後）"""
+    pass
+
+class AsyncLLMClient:
+    """全LLMバックエンドで共有する非同期HTTPクライアント（専用イベントループスレッドで動作）"""
+
+    def __init__(self, max_connections: int = 10, max_keepalive: int = 5, keepalive_expiry: float = 60.0,
+                 retries: int = 2, backoff: float = 0.5, max_backoff: float = 4.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "timeouts": 0, "cancelled": 0}
+        self.stats_lock = threading.Lock()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-http", daemon=True)
+        self.thread.start()
+
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_keepalive,
+                              keepalive_expiry=keepalive_expiry)
+        self.client = self.submit(self._create_client(limits)).result()
+
+    async def _create_client(self, limits):
+        """イベントループ上でクライアントを生成"""
+        return httpx.AsyncClient(limits=limits, timeout=None)
+
+    def _count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def submit(self, coroutine) -> Future:
+        """任意のスレッドからコルーチンを実行（返り値の Future.cancel() でキャンセル）"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        """期限までの残り秒数"""
+        if deadline is None:
+            return None
+        remaining = deadline - self.loop.time()
+        if remaining <= 0:
+            raise LLMTimeoutError("LLMリクエストの期限を超えました")
+        return remaining
+
+    async def _retry_wait(self, attempt: int, deadline: Optional[float]):
+        """フルジッター付き指数バックオフ（期限を超えない範囲で待機）"""
+        self._count("retries")
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        remaining = self._remaining(deadline)
+        await asyncio.sleep(delay if remaining is None else min(delay, remaining))
+
+    async def request(self, method: str, url: str, timeout: Optional[float] = None,
+                      retries: Optional[int] = None, **kwargs) -> "httpx.Response":
+        """応答本文まで読み込むリクエスト（timeout は再試行を含めた全体の期限）"""
+        self._count("requests")
+        deadline = None if timeout is None else self.loop.time() + timeout
+        retries = self.retries if retries is None else retries
+
+        for attempt in range(retries + 1):
+            try:
+                response = await asyncio.wait_for(
+                    self.client.request(method, url, **kwargs), self._remaining(deadline)
+                )
+                if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                    logger.warning(f"LLM応答 {response.status_code} のため再試行します ({attempt + 1}/{retries})")
+                    await self._retry_wait(attempt, deadline)
+                    continue
+                return response
+
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                raise LLMTimeoutError(f"LLMリクエストが{timeout}秒以内に完了しませんでした")
+            except asyncio.CancelledError:
+                self._count("cancelled")
+                raise
+            except httpx.TransportError as e:
+                if attempt >= retries:
+                    self._count("failures")
+                    raise LLMConnectionError(f"LLMサーバーに接続できません: {e}")
+                logger.warning(f"LLM通信エラーのため再試行します ({attempt + 1}/{retries}): {e}")
+                await self._retry_wait(attempt, deadline)
+
+    async def open_stream(self, method: str, url: str, timeout: Optional[float] = None,
+                          retries: Optional[int] = None, **kwargs):
+        """
+        ストリーミング応答を開く（NDJSON / SSE 用）。再試行は最初の応答を受け取るまで
+        Returns: (httpx.Response, 期限) ─ iter_stream に渡して読み進める
+        """
+        self._count("requests")
+        deadline = None if timeout is None else self.loop.time() + timeout
+        retries = self.retries if retries is None else retries
+
+        for attempt in range(retries + 1):
+            try:
+                request = self.client.build_request(method, url, **kwargs)
+                response = await asyncio.wait_for(self.client.send(request, stream=True), self._remaining(deadline))
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                raise LLMTimeoutError(f"LLMリクエストが{timeout}秒以内に応答しませんでした")
+            except httpx.TransportError as e:
+                if attempt >= retries:
+                    self._count("failures")
+                    raise LLMConnectionError(f"LLMサーバーに接続できません: {e}")
+                logger.warning(f"LLM通信エラーのため再試行します ({attempt + 1}/{retries}): {e}")
+                await self._retry_wait(attempt, deadline)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                await response.aclose()
+                logger.warning(f"LLM応答 {response.status_code} のため再試行します ({attempt + 1}/{retries})")
+                await self._retry_wait(attempt, deadline)
+                continue
+            return response, deadline
+
+    async def iter_stream(self, response, deadline: Optional[float],
+                          idle_timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        開いたストリームを1行ずつ返し、終了・キャンセル時に接続を戻す
+        最初の行までは deadline、以降は行間の無通信が idle_timeout を超えたら打ち切る（生成中の応答は期限で切らない）
+        """
+        try:
+            lines = response.aiter_lines()
+            first = True
+            while True:
+                try:
+                    wait = self._remaining(deadline) if first else idle_timeout
+                    line = await asyncio.wait_for(lines.__anext__(), wait)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._count("timeouts")
+                    raise LLMTimeoutError("LLM応答の受信が期限内に完了しませんでした")
+                first = False
+                yield line
+        except asyncio.CancelledError:
+            self._count("cancelled")
+            raise
+        finally:
+            await response.aclose()
+
+    def get_stats(self) -> Dict:
+        """リクエスト統計"""
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def close(self):
+        """接続プールとイベントループを停止"""
+        try:
+            self.submit(self.client.aclose()).result(timeout=5)
+        except Exception as e:
+            logger.error(f"LLM HTTPクライアント停止エラー: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+
+class LLMResponse:
+    """同期呼び出し側に返す requests 互換の応答"""
+
+    def __init__(self, status_code: int, content: bytes = b"", lines: Optional[queue.Queue] = None,
+                 future: Optional[Future] = None, timeout: Optional[float] = None):
+        self.status_code = status_code
+        self.content = content
+        self._lines = lines
+        self._future = future
+        self._timeout = timeout
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_lines(self):
+        """ストリーミング応答の各行（bytes）"""
+        if self._lines is None:
+            yield from self.content.splitlines()
+            return
+        while True:
+            try:
+                kind, value = self._lines.get(timeout=self._timeout)
+            except queue.Empty:
+                self.close()
+                raise LLMTimeoutError("LLM応答の受信がタイムアウトしました")
+            if kind == "line":
+                yield value.encode('utf-8')
+            elif kind == "error":
+                raise value
+            else:
+                return
+
+    def close(self):
+        """受信途中のストリームをキャンセル（読み出し中の iter_lines も終了させる）"""
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+            self._lines.put(("end", None))
+
+class LLMSession:
+    """AsyncLLMClient を requests.Session と同じ形で使う同期ファサード"""
+
+    def __init__(self, client: AsyncLLMClient):
+        self.client = client
+        self.headers = {}
+
+    def _merge_headers(self, headers: Optional[dict]) -> dict:
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        return merged
+
+    def request(self, method: str, url: str, timeout: Optional[float] = None, stream: bool = False,
+                headers: Optional[dict] = None, **kwargs) -> LLMResponse:
+        headers = self._merge_headers(headers)
+        if stream:
+            return self._stream(method, url, timeout, headers=headers, **kwargs)
+
+        future = self.client.submit(self.client.request(method, url, timeout=timeout, headers=headers, **kwargs))
+        try:
+            response = future.result()
+        except BaseException:
+            future.cancel()
+            raise
+        return LLMResponse(response.status_code, response.content)
+
+    def _stream(self, method: str, url: str, timeout: Optional[float], **kwargs) -> LLMResponse:
+        """別スレッドのイベントループで受信した行をキュー経由で渡す"""
+        lines = queue.Queue()
+
+        async def pump():
+            try:
+                response, deadline = await self.client.open_stream(method, url, timeout=timeout, **kwargs)
+            except Exception as e:
+                lines.put(("error", e))
+                return
+
+            lines.put(("status", response.status_code))
+            try:
+                async for line in self.client.iter_stream(response, deadline, idle_timeout=timeout):
+                    lines.put(("line", line))
+                lines.put(("end", None))
+            except asyncio.CancelledError:
+                # CancelledError は Exception ではないため、読み出し側を待たせないよう明示的に終了を通知
+                lines.put(("end", None))
+                raise
+            except Exception as e:
+                lines.put(("error", e))
+
+        future = self.client.submit(pump())
+        try:
+            kind, value = lines.get(timeout=timeout)
+        except queue.Empty:
+            future.cancel()
+            raise LLMTimeoutError("LLMサーバーが応答しませんでした")
+        if kind == "error":
+            raise value
+        return LLMResponse(value, lines=lines, future=future, timeout=timeout)
+
+    def get(self, url: str, **kwargs) -> LLMResponse:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> LLMResponse:
+        return self.request("POST", url, **kwargs)
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+def get_llm_client() -> Optional[AsyncLLMClient]:
+    """プロセス内で共有する非同期クライアント（httpx がなければ None）"""
+    global _shared_client
+    if not HTTPX_AVAILABLE:
+        return None
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = AsyncLLMClient()
+            logger.info("LLM HTTPクライアント（接続プール共有）を初期化")
+        return _shared_client
+
+def get_llm_session():
+    """同期コード用のセッション（httpx がなければ requests.Session で代替）"""
+    client = get_llm_client()
+    if client is None:
+        logger.warning("httpx が利用できないため requests.Session を使用します")
+        return requests.Session()
+    return LLMSession(client)
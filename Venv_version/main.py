@@ -45,6 +45,50 @@ def check_config():
         return False
     return True
 
+def check_router_breaker():
+    """LLMルーターの遮断器チェック（half-open の試行がキャンセルされても復帰できるか、ネットワーク不要）"""
+    from analysis_scheduler import CancelToken
+    from llm_router import LLMBackend, LLMRouter, LLMRouterError
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {"message": {"content": "テスト応答です。"}}
+
+    class FakeSession:
+        mode = "ok"
+        token = None
+
+        def post(self, url, **kwargs):
+            if self.mode == "fail":
+                raise ConnectionError("テスト用の接続失敗")
+            if self.mode == "cancel":
+                self.token.cancel()
+                raise ConnectionError("テスト用のキャンセル")
+            return FakeResponse()
+
+    session = FakeSession()
+    router = LLMRouter(session, [LLMBackend("primary", "ollama", "http://localhost/api/chat", "test")],
+                       failure_threshold=1, reset_timeout=0.0)
+    try:
+        # 失敗で遮断 → half-open の試行をキャンセル → 次の要求は通常どおり届く
+        session.mode = "fail"
+        try:
+            router.describe("system", "prompt", "AAAA")
+        except LLMRouterError:
+            pass
+        session.mode, session.token = "cancel", CancelToken()
+        try:
+            router.describe("system", "prompt", "AAAA", cancel_token=session.token)
+        except Exception:
+            pass
+        session.mode = "ok"
+        return router.describe("system", "prompt", "AAAA").content == "テスト応答です。"
+    except Exception as e:
+        print(f"遮断器チェックエラー: {e}")
+        return False
+
 def run_web_interface():
     """Webインターフェース起動"""
     try:
@@ -207,8 +251,16 @@ def run_test():
     except Exception as e:
         print(f"⚠ カメラテストエラー: {e}")
     
+    # LLMルーターテスト
+    print("6. LLMルーター遮断器テスト...")
+    if check_router_breaker():
+        print("✓ 遮断器OK")
+    else:
+        print("✗ キャンセル後に遮断器が復帰しません")
+        return False
+    
     # 音声テスト
-    print("6. 音声システムテスト...")
+    print("7. 音声システムテスト...")
     try:
         from audio_module import AudioManager
         audio = AudioManager()
@@ -15,6 +15,9 @@ from camera_module import CameraManager, FrameBuffer
 from face_recognition_module_updated import FaceRecognitionManager  # 更新版を使用
 from audio_module import AudioManager
 from api_client import OllamaClient
+from overlay import FrameOverlay
+from analysis_scheduler import AnalysisCancelled, AnalysisScheduler
+from speculative_llm import SpeculationController
 
 # ログ設定
 logging.basicConfig(
@@ -35,6 +38,8 @@ class VisitorRecognitionSystem:
         self.status = SystemStatus()
         self.last_analysis_result = None
         self.analysis_lock = threading.Lock()
+        self.streaming_sentences = []  # ストリーミング中のAI説明（文単位）
+        self.first_audio_time = None  # 今回の分析で最初に結果を読み上げた時刻
         
         # コンポーネント初期化
         self.camera_manager = CameraManager()
@@ -42,6 +47,18 @@ class VisitorRecognitionSystem:
         self.face_recognition = FaceRecognitionManager()
         self.audio_manager = AudioManager()
         self.api_client = OllamaClient()
+        self.speculation = SpeculationController(
+            policy=config.SPECULATIVE_LLM_POLICY,
+            max_known_ratio=config.SPECULATIVE_MAX_KNOWN_RATIO,
+            history=config.SPECULATIVE_HISTORY
+        )
+        self.overlay = FrameOverlay(
+            clock_format=config.OVERLAY_CLOCK_FORMAT,
+            detection_ttl=config.OVERLAY_DETECTION_TTL
+        )
+        
+        # 呼び鈴押下の合流・待ち行列（start で生成）
+        self.analysis_scheduler = None
         
         # フレームキャプチャスレッド
         self.capture_thread = None
@@ -67,6 +84,10 @@ class VisitorRecognitionSystem:
                 self.audio_manager.speak_immediately(error_msg)
                 return False
             
+            # モデルの事前読み込みと常駐スケジューラ
+            self.api_client.residency.start(warm_up=config.OLLAMA_WARMUP_ON_START)
+            self.api_client.node_pool.start()
+            
             # カメラ初期化
             if not self.camera_manager.start():
                 error_msg = "カメラの初期化に失敗しました。"
@@ -77,6 +98,20 @@ class VisitorRecognitionSystem:
             # フレームキャプチャスレッド開始
             self._start_frame_capture()
             
+            # 分析スケジューラ開始（押下ごとにスレッドを作らない）
+            self.analysis_scheduler = AnalysisScheduler(
+                self.analyze_visitor,
+                max_pending=config.ANALYSIS_MAX_PENDING,
+                coalesce_window=config.ANALYSIS_COALESCE_WINDOW,
+                cancel_stale=config.ANALYSIS_CANCEL_STALE
+            )
+            
+            # 登録データの変更検知開始
+            self.face_recognition.start_gallery_watcher()
+            
+            # 顔認識の推論ワーカー起動
+            self.face_recognition.start_inference_worker()
+            
             # システム状態更新
             self.status.is_running = True
             self.status.camera_active = True
@@ -162,9 +197,10 @@ class VisitorRecognitionSystem:
         
         logger.info(f"フレームキャプチャループ終了 (総フレーム数: {frame_count})")
     
-    def analyze_visitor(self, time_offset: float = 0.0) -> AnalysisResult:
-        """訪問者分析実行（高精度顔認識対応版）"""
+    def analyze_visitor(self, time_offset: float = 0.0, cancel_token=None) -> AnalysisResult:
+        """訪問者分析実行（cancel_token が中止されると AnalysisCancelled を送出）"""
         start_time = time.time()
+        speculation = None
         
         with self.analysis_lock:
             if self.status.is_processing:
@@ -173,11 +209,15 @@ class VisitorRecognitionSystem:
             
             self.status.is_processing = True
             self.status.last_analysis = datetime.now()
+            self.first_audio_time = None
         
         try:
             logger.info("訪問者分析を開始")
             self.audio_manager.speak("訪問者を確認しています。しばらくお待ちください。", priority=1)
             
+            # 混雑時間帯の学習用に来訪を記録
+            self.api_client.residency.record_visit()
+            
             # 分析用フレーム取得（複数の方法を試行）
             frame = self._get_analysis_frame(time_offset)
             
@@ -189,9 +229,42 @@ class VisitorRecognitionSystem:
             
             logger.info(f"分析用フレーム取得成功: {frame.width}x{frame.height} ({frame.source})")
             
-            # Step 1: 高精度顔認識を実行
-            person_recognition = self.face_recognition.recognize_person(frame)
+            # 顔認識と並行してLLM分析を開始（顔枠がまだないため人物検出で切り出す）
+            if self.speculation.should_speculate():
+                self.streaming_sentences = []
+                speculation = self.speculation.begin(
+                    lambda on_sentence, token: self.api_client.analyze_image(
+                        frame, on_sentence=on_sentence, cancel_token=token
+                    ),
+                    parent_token=cancel_token
+                )
+            
+            # Step 1: 高精度顔認識を実行（前後のフレームを統合）
+            recognition_frames = []
+            if config.FACE_MULTI_FRAME_COUNT > 1:
+                recognition_frames = self.frame_buffer.get_frames_around(
+                    frame.timestamp, config.FACE_MULTI_FRAME_COUNT
+                )
+            
+            # テスト画像などバッファ外のフレームでは単一フレーム認識
+            frame_in_buffer = any(f.seq == frame.seq for f in recognition_frames)
+            
+            if frame_in_buffer and len(recognition_frames) > 1:
+                person_recognition = self.face_recognition.recognize_person_multi(recognition_frames)
+            else:
+                person_recognition = self.face_recognition.recognize_person(frame)
             logger.info(f"顔認識結果: {person_recognition.method_used}, 顔数: {len(person_recognition.face_detections)}")
+            self._update_overlay(person_recognition)
+            self.speculation.record_outcome(person_recognition.is_known_person)
+            
+            # 既知の人物・顔なしでは投機分析は不要（LLM要求をキャンセル）
+            needs_llm = not person_recognition.is_known_person and bool(person_recognition.face_detections)
+            if speculation and not needs_llm:
+                speculation.cancel()
+            
+            # 新しい押下に置き換えられていれば音声出力・LLM分析の前に中止
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
             
             # Step 2: 認識結果に基づく処理
             ai_description = ""
@@ -199,9 +272,7 @@ class VisitorRecognitionSystem:
             
             if person_recognition.is_known_person:
                 # 既知の人物の場合 - Ollamaを使わずに即座に応答
-                person_info = None
-                if self.face_recognition.is_advanced_available():
-                    person_info = self.face_recognition.recognizers["advanced"].recognizer.get_person_info(person_recognition.person_id)
+                person_info = self.face_recognition.get_person_info(person_recognition.person_id)
                 
                 if person_info:
                     name = person_info['name']
@@ -236,15 +307,29 @@ class VisitorRecognitionSystem:
                     logger.info("未知の訪問者のためAI分析を実行")
                     self.audio_manager.speak("未知の訪問者です。詳細を分析中...")
                     
-                    api_response = self.api_client.analyze_image(frame)
+                    # 完成した文から順に読み上げ・画面表示
+                    if speculation:
+                        # 認識中に先行して進めた分析を採用（保留していた文から読み上げ）
+                        api_response = speculation.result(on_sentence=self._on_description_sentence)
+                    else:
+                        self.streaming_sentences = []
+                        api_response = self.api_client.analyze_image(
+                            frame,
+                            on_sentence=self._on_description_sentence,
+                            face_boxes=[detection.bbox for detection in person_recognition.face_detections],
+                            cancel_token=cancel_token
+                        )
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
                     
                     if api_response.success:
                         ai_description = api_response.content
                         message = f"未知の訪問者です。{ai_description}"
                         
-                        self.audio_manager.speak("未知の訪問者です")
-                        time.sleep(0.5)
-                        self.audio_manager.speak(ai_description)
+                        if not api_response.streamed:
+                            self.audio_manager.speak("未知の訪問者です")
+                            time.sleep(0.5)
+                            self.audio_manager.speak(ai_description)
                         
                     else:
                         ai_description = api_response.error_message
@@ -257,7 +342,8 @@ class VisitorRecognitionSystem:
                     ai_description = "顔検出なし"
                     self.audio_manager.speak(message)
             
-            # 分析結果作成
+            # 分析結果作成（逐次読み上げでなければ結果の読み上げを依頼した直後が最初の音声）
+            first_audio_time = self.first_audio_time or time.time()
             processing_time = time.time() - start_time
             analysis_result = AnalysisResult(
                 timestamp=datetime.now(),
@@ -269,6 +355,7 @@ class VisitorRecognitionSystem:
             
             # カスタムメッセージを設定
             analysis_result.custom_message = message
+            analysis_result.first_audio_time = first_audio_time
             
             # 画像保存（オプション）
             if config.AUTO_SAVE_CAPTURES:
@@ -279,6 +366,10 @@ class VisitorRecognitionSystem:
             
             return analysis_result
             
+        except AnalysisCancelled:
+            logger.info("訪問者分析は新しい呼び鈴押下に置き換えられました")
+            raise
+            
         except Exception as e:
             error_msg = f"訪問者分析エラー: {str(e)}"
             logger.error(error_msg)
@@ -286,6 +377,8 @@ class VisitorRecognitionSystem:
             return None
             
         finally:
+            if speculation:
+                speculation.cancel()
             self.status.is_processing = False
     
     def _get_analysis_frame(self, time_offset: float) -> Optional:
@@ -331,17 +424,11 @@ class VisitorRecognitionSystem:
     def _get_frame_direct(self):
         """直接カメラAPIからフレーム取得"""
         try:
-            import cv2
             from models import CameraFrame
             
             if config.USE_CAMERA and self.camera_manager.camera:
                 ret, direct_frame = self.camera_manager.camera.read()
                 if ret and direct_frame is not None:
-                    # タイムスタンプ追加
-                    timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    cv2.putText(direct_frame, timestamp_str, (10, direct_frame.shape[0] - 10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                    
                     frame = CameraFrame(
                         image=direct_frame,
                         timestamp=datetime.now(),
@@ -354,14 +441,9 @@ class VisitorRecognitionSystem:
                 else:
                     logger.warning("方法3: 直接カメラAPIから取得失敗")
             elif not config.USE_CAMERA and self.camera_manager.test_images:
-                test_frame = self.camera_manager.test_images[self.camera_manager.current_test_index].copy()
+                test_frame = self.camera_manager.test_images[self.camera_manager.current_test_index]
                 self.camera_manager.current_test_index = (self.camera_manager.current_test_index + 1) % len(self.camera_manager.test_images)
                 
-                # タイムスタンプ追加
-                timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                cv2.putText(test_frame, timestamp_str, (10, test_frame.shape[0] - 10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                
                 frame = CameraFrame(
                     image=test_frame,
                     timestamp=datetime.now(),
@@ -407,6 +489,25 @@ class VisitorRecognitionSystem:
         
         return message
     
+    def _on_description_sentence(self, sentence: str):
+        """ストリーミング中のAI説明を1文ずつ読み上げ"""
+        if self.first_audio_time is None:
+            self.first_audio_time = time.time()
+        self.streaming_sentences.append(sentence)
+        self.audio_manager.speak(sentence, priority=1)
+    
+    def _update_overlay(self, person_recognition):
+        """配信用オーバーレイに最新の認識結果を反映"""
+        boxes = []
+        for detection in person_recognition.face_detections:
+            if detection.person_id:
+                person_info = self.face_recognition.get_person_info(detection.person_id)
+                name = person_info['name'] if person_info else detection.person_id
+                boxes.append((detection.bbox, f"{name} {detection.confidence:.2f}", (0, 255, 0)))
+            else:
+                boxes.append((detection.bbox, f"Unknown {detection.confidence:.2f}", (0, 0, 255)))
+        self.overlay.update_detections(boxes)
+    
     def _save_analysis_image(self, result: AnalysisResult):
         """分析画像保存"""
         try:
@@ -417,13 +518,19 @@ class VisitorRecognitionSystem:
             
             # 基本画像保存
             basic_filename = config.CAPTURES_DIR / f"analysis_{timestamp}.jpg"
-            cv2.imwrite(str(basic_filename), result.frame.image)
+            cv2.imwrite(str(basic_filename), self.overlay.compose(
+                result.frame.image, result.frame.timestamp, draw_detections=False
+            ))
             
             # 顔検出結果付き画像保存（顔が検出された場合）
             if result.person_recognition.face_detections:
-                annotated_image = self.face_recognition.draw_detections(
-                    result.frame, 
-                    result.person_recognition.face_detections
+                annotated_image = self.overlay.compose(
+                    self.face_recognition.draw_detections(
+                        result.frame, 
+                        result.person_recognition.face_detections
+                    ),
+                    result.frame.timestamp,
+                    draw_detections=False
                 )
                 annotated_filename = config.CAPTURES_DIR / f"analysis_faces_{timestamp}.jpg"
                 cv2.imwrite(str(annotated_filename), annotated_image)
@@ -465,9 +572,23 @@ class VisitorRecognitionSystem:
                 "available_methods": self.face_recognition.get_available_methods(),
                 "advanced_available": self.face_recognition.is_advanced_available(),
                 "registered_persons": len(self.face_recognition.get_registered_persons()),
+                "cascade": self.face_recognition.get_cascade_stats(),
+                "calibration": self.face_recognition.calibration_report,
+                "inference_worker": self.face_recognition.get_inference_stats(),
                 "statistics": face_stats
             },
             "api": self.api_client.health_check(),
+            "description_cache": self.api_client.get_cache_stats(),
+            "model_residency": self.api_client.residency.get_stats(),
+            "llm_http": self.api_client.get_http_stats(),
+            "llm_router": self.api_client.get_router_stats(),
+            "ollama_nodes": self.api_client.get_node_stats(),
+            "speculative_llm": self.speculation.get_stats(),
+            "analysis_scheduler": self.analysis_scheduler.get_stats() if self.analysis_scheduler else None,
+            "analysis_stream": {
+                "active": self.status.is_processing and bool(self.streaming_sentences),
+                "text": "".join(self.streaming_sentences)
+            },
             "last_result": {
                 "message": getattr(self.last_analysis_result, 'custom_message', None) or 
                           (self.last_analysis_result.get_message() if self.last_analysis_result else None),
@@ -493,7 +614,12 @@ class VisitorRecognitionSystem:
             if self.capture_thread and self.capture_thread.is_alive():
                 self.capture_thread.join(timeout=2)
             
+            if self.analysis_scheduler:
+                self.analysis_scheduler.stop()
             self.camera_manager.stop()
+            self.face_recognition.shutdown()
+            self.api_client.residency.stop()
+            self.api_client.node_pool.stop()
             self.audio_manager.stop()
             
             logger.info("システム停止完了")
@@ -505,7 +631,8 @@ class SystemController:
     """システム制御クラス - 高精度顔認識対応版"""
     
     def __init__(self):
-        self.system = VisitorRecognitionSystem()
+        # 推論ワーカー（spawn）がエントリースクリプトを再読込しても重い初期化が走らないよう遅延生成
+        self.system = None
         self.is_initialized = False
     
     def initialize(self) -> bool:
@@ -513,6 +640,9 @@ class SystemController:
         if self.is_initialized:
             return True
         
+        if self.system is None:
+            self.system = VisitorRecognitionSystem()
+        
         success = self.system.start()
         if success:
             self.is_initialized = True
@@ -520,32 +650,49 @@ class SystemController:
         
         return success
     
-    def doorbell_pressed(self, time_offset: float = 0.0) -> dict:
-        """呼び鈴押下処理"""
+    def doorbell_pressed(self, time_offset: float = 0.0, supersede: bool = False,
+                         wait: bool = False, timeout: float = 120.0) -> dict:
+        """呼び鈴押下処理（実行中の分析への合流・待ち行列への登録、wait なら完了まで待って結果を返す）"""
         if not self.is_initialized:
             return {
                 "success": False,
                 "message": "システムが初期化されていません"
             }
         
-        if self.system.status.is_processing:
-            return {
-                "success": False,
-                "message": "別の分析処理が実行中です"
-            }
-        
         try:
-            # 非同期で分析実行
-            threading.Thread(
-                target=self.system.analyze_visitor,
-                args=(time_offset,),
-                daemon=True
-            ).start()
+            # 分析はスケジューラのワーカーで実行（連打しても重複したLLM要求を出さない）
+            future, disposition = self.system.analysis_scheduler.submit(time_offset, supersede=supersede)
             
-            return {
+            messages = {
+                "coalesced": "実行中の訪問者分析に合流しました",
+                "queued": "訪問者分析を開始しました",
+                "superseded": "新しい訪問者分析に置き換えました"
+            }
+            result = {
                 "success": True,
-                "message": "訪問者分析を開始しました"
+                "message": messages[disposition],
+                "disposition": disposition
             }
+            if not wait:
+                return result
+            
+            try:
+                analysis_result = future.result(timeout=timeout)
+            except Exception as e:
+                # 新しい押下に置き換えられた場合（AnalysisCancelled）も含む
+                result.update(success=False, error=str(e) or type(e).__name__)
+                return result
+            if analysis_result is None:
+                result.update(success=False, error="訪問者分析に失敗しました")
+                return result
+            
+            result.update(
+                result=getattr(analysis_result, "custom_message", analysis_result.get_message()),
+                processing_time=analysis_result.processing_time,
+                first_audio_time=getattr(analysis_result, "first_audio_time", None),
+                result_time=analysis_result.timestamp.timestamp()
+            )
+            return result
             
         except Exception as e:
             logger.error(f"呼び鈴処理エラー: {e}")
@@ -581,7 +728,7 @@ class SystemController:
             import cv2
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = config.CAPTURES_DIR / f"manual_{timestamp}.jpg"
-            cv2.imwrite(str(filename), frame.image)
+            cv2.imwrite(str(filename), self.system.overlay.compose(frame.image, frame.timestamp))
             
             return {
                 "success": True,
@@ -594,6 +741,27 @@ class SystemController:
                 "message": f"画像保存エラー: {str(e)}"
             }
     
+    def calibrate_face_recognition(self) -> dict:
+        """顔認識手法のキャリブレーションを実行"""
+        if not self.is_initialized:
+            return {
+                "success": False,
+                "message": "システムが初期化されていません"
+            }
+        
+        try:
+            report = self.system.face_recognition.calibrate()
+            return {
+                "success": True,
+                "message": f"顔認識手法: {report['selected']}",
+                "calibration": report
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"キャリブレーションエラー: {str(e)}"
+            }
+    
     def get_status(self) -> dict:
         """システム状態取得"""
         if not self.is_initialized:
@@ -0,0 +1,257 @@
+"""
+Ollama 代替サーバー - GPUなしで /api/chat（ストリーミング・一括）・/api/tags・/api/ps を模擬し、遅延・失敗を注入
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+SAMPLE_DESCRIPTIONS = [
+    "30代くらいの男性です。青い作業服を着て、段ボール箱を持っています。宅配業者のようです。",
+    "20代の女性です。黒いスーツ姿で、書類ケースを持っています。営業の方かもしれません。",
+    "60代くらいの男性です。眼鏡をかけ、灰色の上着を着ています。手ぶらで穏やかな表情です。",
+    "40代の男性です。制服と帽子を着用し、郵便物を持っています。郵便局員のようです。",
+]
+
+def parse_distribution(spec: str) -> Callable[[], float]:
+    """
+    遅延分布の指定を乱数生成関数に変換（秒、負値は0に丸める）
+    fixed:0.5 / uniform:0.2,0.8 / normal:0.5,0.1 / lognormal:-0.7,0.4 / exp:0.5
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    samplers = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: random.uniform(values[0], values[1]),
+        "normal": lambda: random.gauss(values[0], values[1]),
+        "lognormal": lambda: random.lognormvariate(values[0], values[1]),
+        "exp": lambda: random.expovariate(1.0 / values[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"不明な遅延分布: {spec}")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """クライアント側のキャンセル・切断でトレースバックを出さない"""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+class MockOllamaServer:
+    """
+    Ollama 互換の代替サーバー
+    - latency: 最初のトークンまでの時間（プロンプト処理）の分布
+    - token_rate: 生成速度（トークン/秒、日本語は1文字1トークンとして扱う）
+    - load_time: 未常駐モデルの読み込み時間。slots は同時に処理できるリクエスト数（GPU枚数相当）
+    - failure_rate / hang_rate / drop_rate: 500エラー・無応答・ストリーム途中切断を起こす確率
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 11434, latency: str = "fixed:0.5",
+                 token_rate: float = 40.0, load_time: float = 0.0, slots: int = 1,
+                 failure_rate: float = 0.0, hang_rate: float = 0.0, drop_rate: float = 0.0,
+                 models: Optional[List[str]] = None, resident: Optional[List[str]] = None,
+                 responses: Optional[List[str]] = None):
+        self.sample_latency = parse_distribution(latency)
+        self.token_rate = token_rate
+        self.load_time = load_time
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.drop_rate = drop_rate
+        self.models = models or ["gemma3:4b"]
+        self.resident_models = set(self.models if resident is None else resident)
+        self.responses = responses or SAMPLE_DESCRIPTIONS
+        self.gpu = threading.Semaphore(slots)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "failures": 0, "hangs": 0, "drops": 0, "loads": 0}
+
+        self.server = _QuietHTTPServer((host, port), self._handler())
+        self.thread = None
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self.chat_url = f"{self.base_url}/api/chat"
+
+    def start(self) -> "MockOllamaServer":
+        """バックグラウンドで待ち受け開始"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return dict(self.stats, resident_models=sorted(self.resident_models))
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, data: dict):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": name, "model": name} for name in mock.models]})
+                elif self.path == "/api/ps":
+                    self._send_json(200, {"models": [{"name": name, "model": name}
+                                                     for name in sorted(mock.resident_models)]})
+                elif self.path == "/mock/stats":
+                    self._send_json(200, mock.get_stats())
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path != "/api/chat":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                mock._count("requests")
+                mock.handle_chat(self, request)
+
+        return Handler
+
+    def handle_chat(self, handler, request: dict):
+        """/api/chat の応答（モデル読み込み → プロンプト処理 → トークン生成）"""
+        model = request.get("model", self.models[0])
+        if model not in self.models:
+            handler._send_json(404, {"error": f"model '{model}' not found"})
+            return
+
+        roll = random.random()
+        if roll < self.failure_rate:
+            self._count("failures")
+            handler._send_json(500, {"error": "injected failure"})
+            return
+        if roll < self.failure_rate + self.hang_rate:
+            self._count("hangs")
+            time.sleep(3600)
+            return
+
+        # keep_alive=0 は解放、メッセージなしは読み込みのみ（Ollama と同じ挙動）
+        if request.get("keep_alive") in (0, "0"):
+            self.resident_models.discard(model)
+            handler._send_json(200, {"model": model, "done": True, "done_reason": "unload"})
+            return
+
+        with self.gpu:
+            start_time = time.perf_counter()
+            load_seconds = 0.0
+            if model not in self.resident_models:
+                self._count("loads")
+                load_seconds = self.load_time
+                time.sleep(load_seconds)
+                self.resident_models.add(model)
+
+            if not request.get("messages"):
+                handler._send_json(200, {"model": model, "done": True, "done_reason": "load",
+                                         "load_duration": int(load_seconds * 1e9)})
+                return
+
+            time.sleep(self.sample_latency())
+            text = random.choice(self.responses)
+            final = {
+                "model": model,
+                "done": True,
+                "load_duration": int(load_seconds * 1e9),
+                "eval_count": len(text)
+            }
+
+            if request.get("stream", True):
+                self._count("streamed")
+                self._stream(handler, model, text, final, start_time)
+            else:
+                time.sleep(len(text) / self.token_rate)
+                final["total_duration"] = int((time.perf_counter() - start_time) * 1e9)
+                handler._send_json(200, dict(final, message={"role": "assistant", "content": text}))
+
+    def _stream(self, handler, model: str, text: str, final: dict, start_time: float):
+        """NDJSON で数文字ずつ送信（chunked）"""
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def write_chunk(data: dict):
+            line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+            handler.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            handler.wfile.flush()
+
+        drop_at = len(text) // 2 if random.random() < self.drop_rate else None
+        step = 3
+        for position in range(0, len(text), step):
+            if drop_at is not None and position >= drop_at:
+                self._count("drops")
+                handler.close_connection = True
+                return
+            piece = text[position:position + step]
+            time.sleep(len(piece) / self.token_rate)
+            write_chunk({"model": model, "message": {"role": "assistant", "content": piece}, "done": False})
+
+        final["total_duration"] = int((time.perf_counter() - start_time) * 1e9)
+        write_chunk(dict(final, message={"role": "assistant", "content": ""}))
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="Ollama 代替サーバー（GPUなしでパイプライン性能を計測）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python mock_ollama.py                                   # localhost:11434 で待ち受け
+  python mock_ollama.py --latency lognormal:-0.7,0.4 --token-rate 25
+  python mock_ollama.py --failure-rate 0.05 --drop-rate 0.05 --slots 2
+        """
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", default="fixed:0.5",
+                        help="最初のトークンまでの遅延分布 (fixed / uniform / normal / lognormal / exp)")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="生成速度（トークン/秒）")
+    parser.add_argument("--load-time", type=float, default=0.0, help="未常駐モデルの読み込み時間（秒）")
+    parser.add_argument("--slots", type=int, default=1, help="同時処理数")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="500エラーを返す確率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="応答しない確率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="ストリームを途中で切断する確率")
+    parser.add_argument("--models", default="gemma3:4b,qwen2.5vl:3b", help="提供するモデル（カンマ区切り）")
+    parser.add_argument("--cold", action="store_true", help="起動時にモデルを常駐させない")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(
+        host=args.host, port=args.port, latency=args.latency, token_rate=args.token_rate,
+        load_time=args.load_time, slots=args.slots, failure_rate=args.failure_rate,
+        hang_rate=args.hang_rate, drop_rate=args.drop_rate,
+        models=args.models.split(","), resident=[] if args.cold else None
+    )
+    print(f"Ollama 代替サーバーを起動: {server.base_url} (Ctrl+C で終了)")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(f"統計: {server.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+モデル常駐管理 - Ollama モデルの事前読み込み・keep_alive 設定・混雑時間帯の学習
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ModelResidencyManager:
+    """
+    来訪履歴から混雑時間帯を学習し、その前にモデルを読み込み、長い空き時間には解放する
+    chat_urls（Ollama ノードプールの各ノード）を指定した場合は全ノードに対して読み込み・解放する
+    """
+
+    def __init__(self, session, chat_url: str, model_name: str, history_path: Optional[Path] = None,
+                 keep_alive: str = "10m", busy_keep_alive: str = "60m",
+                 idle_unload_minutes: float = 120, preload_lead_minutes: float = 10,
+                 busy_threshold: float = 0.5, history_weeks: int = 4, check_interval: float = 60.0,
+                 chat_urls: Optional[List[str]] = None):
+        self.session = session
+        self.chat_urls = list(chat_urls or [chat_url])
+        self.model_name = model_name
+        self.history_path = Path(history_path) if history_path else None
+        self.keep_alive = keep_alive
+        self.busy_keep_alive = busy_keep_alive
+        self.idle_unload_seconds = idle_unload_minutes * 60
+        self.preload_lead = timedelta(minutes=preload_lead_minutes)
+        self.busy_threshold = busy_threshold
+        self.history_weeks = history_weeks
+        self.check_interval = check_interval
+
+        self.visits: List[datetime] = []
+        self.busy_slots = set()  # (曜日, 時) の組
+        self.last_activity = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.scheduler_thread = None
+        self.stop_event = threading.Event()
+        self.stats = {
+            "warmups": 0,
+            "preloads": 0,
+            "unloads": 0,
+            "cold_starts": 0,
+            "last_cold_start_ms": 0.0,
+            "total_cold_start_ms": 0.0,
+            "last_warmup_ms": 0.0
+        }
+
+        self._load_history()
+
+    # === 来訪履歴と混雑時間帯 ===
+
+    def _load_history(self):
+        """来訪履歴を読み込み、混雑時間帯を再計算"""
+        if not self.history_path or not self.history_path.exists():
+            return
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                self.visits = [datetime.fromisoformat(value) for value in json.load(f)]
+            self._update_busy_slots()
+            logger.info(f"来訪履歴を読み込み: {len(self.visits)}件, 混雑時間帯 {len(self.busy_slots)}枠")
+        except Exception as e:
+            logger.error(f"来訪履歴読み込みエラー: {e}")
+
+    def _save_history(self):
+        """来訪履歴を保存"""
+        if not self.history_path:
+            return
+        try:
+            with open(self.history_path, 'w', encoding='utf-8') as f:
+                json.dump([visit.isoformat() for visit in self.visits], f)
+        except Exception as e:
+            logger.error(f"来訪履歴保存エラー: {e}")
+
+    def _update_busy_slots(self):
+        """直近 history_weeks 週で、週あたりの来訪数が閾値以上の (曜日, 時) を混雑とみなす"""
+        cutoff = datetime.now() - timedelta(weeks=self.history_weeks)
+        self.visits = [visit for visit in self.visits if visit >= cutoff]
+        if not self.visits:
+            self.busy_slots = set()
+            return
+
+        observed_weeks = max(1.0, (datetime.now() - min(self.visits)).days / 7)
+        counts = Counter((visit.weekday(), visit.hour) for visit in self.visits)
+        self.busy_slots = {slot for slot, count in counts.items() if count / observed_weeks >= self.busy_threshold}
+
+    def record_visit(self, when: Optional[datetime] = None):
+        """呼び鈴が押された時刻を記録"""
+        with self.lock:
+            self.visits.append(when or datetime.now())
+            self.last_activity = time.monotonic()
+            self._update_busy_slots()
+            self._save_history()
+
+    def is_busy(self, when: Optional[datetime] = None) -> bool:
+        """指定時刻が混雑時間帯か"""
+        when = when or datetime.now()
+        return (when.weekday(), when.hour) in self.busy_slots
+
+    def request_keep_alive(self) -> str:
+        """リクエストに付ける keep_alive（混雑時間帯は長めに常駐）"""
+        self.last_activity = time.monotonic()
+        now = datetime.now()
+        if self.is_busy(now) or self.is_busy(now + self.preload_lead):
+            return self.busy_keep_alive
+        return self.keep_alive
+
+    # === Ollama への読み込み・解放 ===
+
+    def _is_resident_on(self, chat_url: str) -> bool:
+        """モデルが指定ノードの Ollama に読み込まれているか（/api/ps）"""
+        try:
+            response = self.session.get(chat_url.replace("/api/chat", "/api/ps"), timeout=5)
+            if response.status_code != 200:
+                return False
+            names = [model.get("name", "") for model in response.json().get("models", [])]
+            return self.model_name in names
+        except Exception as e:
+            logger.error(f"モデル常駐状態の確認エラー ({chat_url}): {e}")
+            return False
+
+    def resident_nodes(self) -> List[str]:
+        """モデルが読み込まれているノードのURL"""
+        return [chat_url for chat_url in self.chat_urls if self._is_resident_on(chat_url)]
+
+    def is_resident(self) -> bool:
+        """全ノードにモデルが読み込まれているか"""
+        return len(self.resident_nodes()) == len(self.chat_urls)
+
+    def _load_model(self, chat_url: str, keep_alive) -> Optional[float]:
+        """空のチャット要求でモデルを読み込み（または keep_alive=0 で解放）し、所要時間(ms)を返す"""
+        start_time = time.perf_counter()
+        try:
+            response = self.session.post(
+                chat_url,
+                json={"model": self.model_name, "messages": [], "keep_alive": keep_alive},
+                timeout=300
+            )
+            if response.status_code != 200:
+                logger.error(f"モデル読み込み要求エラー ({chat_url}): ステータス {response.status_code}")
+                return None
+            return (time.perf_counter() - start_time) * 1000
+        except Exception as e:
+            logger.error(f"モデル読み込み要求エラー ({chat_url}): {e}")
+            return None
+
+    def warm_up(self) -> Optional[float]:
+        """各ノードにモデルを事前に読み込み、コールドスタート時間を計測（最も遅いノードの所要時間を返す）"""
+        keep_alive = self.request_keep_alive()
+        slowest_ms = None
+
+        for chat_url in self.chat_urls:
+            was_resident = self._is_resident_on(chat_url)
+            elapsed_ms = self._load_model(chat_url, keep_alive)
+            if elapsed_ms is None:
+                continue
+
+            with self.lock:
+                self.stats["warmups"] += 1
+                self.stats["last_warmup_ms"] = elapsed_ms
+                if not was_resident:
+                    self._record_cold_start(elapsed_ms)
+
+            logger.info(f"モデルのウォームアップ完了: {self.model_name} @ {chat_url} ({elapsed_ms:.0f}ms, "
+                        f"{'常駐済み' if was_resident else 'コールドスタート'})")
+            slowest_ms = elapsed_ms if slowest_ms is None else max(slowest_ms, elapsed_ms)
+
+        return slowest_ms
+
+    def unload(self) -> bool:
+        """モデルを各ノードの Ollama から解放（1台でも解放できれば True）"""
+        unloaded = [chat_url for chat_url in self.chat_urls if self._load_model(chat_url, 0) is not None]
+        if not unloaded:
+            return False
+        with self.lock:
+            self.stats["unloads"] += 1
+        logger.info(f"モデルを解放: {self.model_name}（{len(unloaded)}/{len(self.chat_urls)}ノード）")
+        return True
+
+    def _record_cold_start(self, elapsed_ms: float):
+        """コールドスタート時間を記録（lock 取得済みで呼ぶ）"""
+        self.stats["cold_starts"] += 1
+        self.stats["last_cold_start_ms"] = elapsed_ms
+        self.stats["total_cold_start_ms"] += elapsed_ms
+
+    def record_response(self, data: Dict):
+        """Ollama応答の load_duration から、分析時に発生したコールドスタートを記録"""
+        load_ms = data.get("load_duration", 0) / 1_000_000
+        # 常駐中でも数ms〜数十msの load_duration が返るため、明らかな読み込みのみ数える
+        if load_ms >= 500:
+            with self.lock:
+                self._record_cold_start(load_ms)
+            logger.warning(f"分析時にモデル読み込みが発生: {load_ms:.0f}ms")
+
+    # === スケジューラ ===
+
+    def start(self, warm_up: bool = True):
+        """ウォームアップ（バックグラウンド）と常駐スケジューラを開始"""
+        if self.scheduler_thread and self.scheduler_thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.scheduler_thread = threading.Thread(target=self._scheduler_loop, args=(warm_up,), daemon=True)
+        self.scheduler_thread.start()
+
+    def stop(self):
+        """スケジューラ停止"""
+        self.stop_event.set()
+        if self.scheduler_thread and self.scheduler_thread.is_alive():
+            self.scheduler_thread.join(timeout=2)
+
+    def _scheduler_loop(self, warm_up: bool):
+        """混雑時間帯の前に読み込み、長い空き時間には解放"""
+        if warm_up:
+            self.warm_up()
+
+        while not self.stop_event.wait(self.check_interval):
+            try:
+                now = datetime.now()
+                upcoming_busy = self.is_busy(now) or self.is_busy(now + self.preload_lead)
+                idle_seconds = time.monotonic() - self.last_activity
+
+                if upcoming_busy:
+                    if not self.is_resident():
+                        logger.info("混雑時間帯の前にモデルを事前読み込み")
+                        if self.warm_up() is not None:
+                            with self.lock:
+                                self.stats["preloads"] += 1
+                elif idle_seconds >= self.idle_unload_seconds and self.resident_nodes():
+                    logger.info(f"{idle_seconds / 60:.0f}分間利用がないためモデルを解放")
+                    self.unload()
+
+            except Exception as e:
+                logger.error(f"モデル常駐スケジューラエラー: {e}")
+
+    def get_stats(self) -> Dict:
+        """常駐状態とコールドスタート統計"""
+        with self.lock:
+            stats = dict(self.stats)
+            busy_slots = sorted(self.busy_slots)
+            visit_count = len(self.visits)
+
+        total = stats.pop("total_cold_start_ms")
+        stats["avg_cold_start_ms"] = round(total / stats["cold_starts"], 1) if stats["cold_starts"] else 0.0
+        stats["model"] = self.model_name
+        stats["nodes"] = list(self.chat_urls)
+        stats["keep_alive"] = self.busy_keep_alive if self.is_busy() else self.keep_alive
+        stats["busy_hours_today"] = [hour for weekday, hour in busy_slots if weekday == datetime.now().weekday()]
+        stats["visits_recorded"] = visit_count
+        stats["idle_minutes"] = round((time.monotonic() - self.last_activity) / 60, 1)
+        return stats
@@ -4,26 +4,82 @@
 from dataclasses import dataclass
 from typing import List, Optional, Tuple, Any
 import datetime
+import itertools
+import time
+import cv2
 import numpy as np
 
-@dataclass
 class CameraFrame:
-    """カメラフレームデータ"""
-    image: np.ndarray
-    timestamp: datetime.datetime
-    width: int
-    height: int
-    source: str  # "camera" or "test_image"
+    """カメラフレームデータ（生成後は変更不可・画像は読み取り専用ビュー）"""
+    __slots__ = ("image", "timestamp", "width", "height", "source",
+                 "seq", "monotonic_ns", "source_id", "_derived")
+    
+    _seq_counter = itertools.count(1)
+    
+    def __init__(self, image: np.ndarray, timestamp: datetime.datetime = None,
+                 width: int = None, height: int = None, source: str = "camera",
+                 seq: int = None, monotonic_ns: int = None, source_id: str = None):
+        # 呼び出し元の配列は共有し、このフレーム経由では書き換えられないビューにする
+        view = image.view()
+        view.flags.writeable = False
+        
+        set_attr = object.__setattr__
+        set_attr(self, "image", view)
+        set_attr(self, "timestamp", timestamp or datetime.datetime.now())
+        set_attr(self, "width", width if width is not None else image.shape[1])
+        set_attr(self, "height", height if height is not None else image.shape[0])
+        set_attr(self, "source", source)  # "camera" or "test_image"
+        set_attr(self, "seq", seq if seq is not None else next(CameraFrame._seq_counter))
+        set_attr(self, "monotonic_ns", monotonic_ns if monotonic_ns is not None else time.monotonic_ns())
+        set_attr(self, "source_id", source_id or source)
+        set_attr(self, "_derived", {})
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"CameraFrame は変更できません: {name}")
+    
+    def __delattr__(self, name):
+        raise AttributeError(f"CameraFrame は変更できません: {name}")
+    
+    def __reduce__(self):
+        return (CameraFrame, (np.array(self.image), self.timestamp, self.width, self.height,
+                              self.source, self.seq, self.monotonic_ns, self.source_id))
+    
+    def __repr__(self):
+        return (f"CameraFrame(seq={self.seq}, source={self.source!r}, size={self.width}x{self.height}, "
+                f"timestamp={self.timestamp.isoformat()})")
+    
+    def scaled(self, scale: float = 1.0) -> np.ndarray:
+        """縮小したBGR画像（フレームごとに1回だけ計算）"""
+        if scale >= 1.0:
+            return self.image
+        
+        key = ("bgr", scale)
+        if key not in self._derived:
+            self._derived[key] = cv2.resize(self.image, (0, 0), fx=scale, fy=scale,
+                                            interpolation=cv2.INTER_AREA)
+        return self._derived[key]
+    
+    def rgb(self, scale: float = 1.0) -> np.ndarray:
+        """RGB画像（フレームごとに1回だけ計算）"""
+        key = ("rgb", scale)
+        if key not in self._derived:
+            self._derived[key] = cv2.cvtColor(self.scaled(scale), cv2.COLOR_BGR2RGB)
+        return self._derived[key]
+    
+    def gray(self, scale: float = 1.0) -> np.ndarray:
+        """グレースケール画像（フレームごとに1回だけ計算）"""
+        key = ("gray", scale)
+        if key not in self._derived:
+            self._derived[key] = cv2.cvtColor(self.scaled(scale), cv2.COLOR_BGR2GRAY)
+        return self._derived[key]
+    
+    def mutable_copy(self) -> np.ndarray:
+        """描画用に書き込み可能な画像のコピーを作成"""
+        return self.image.copy()
     
     def copy(self):
-        """フレームのコピーを作成"""
-        return CameraFrame(
-            image=self.image.copy(),
-            timestamp=self.timestamp,
-            width=self.width,
-            height=self.height,
-            source=self.source
-        )
+        """フレームのコピー（不変なので同じオブジェクトを返す）"""
+        return self
 
 @dataclass
 class FaceDetection:
@@ -86,4 +142,8 @@ class APIResponse:
     content: str = ""
     error_message: str = ""
     response_time: float = 0.0
-    model_used: str = ""
\ No newline at end of file
+    model_used: str = ""
+    first_sentence_time: float = 0.0  # ストリーミング時、最初の文が届くまでの秒数
+    streamed: bool = False  # 文ごとに逐次通知済みか
+    payload_bytes: int = 0  # 送信した画像のサイズ（バイト）
+    cached: bool = False  # 説明キャッシュから返したか
\ No newline at end of file
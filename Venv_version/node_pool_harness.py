@@ -0,0 +1,119 @@
+"""
+Ollama ノードプール検証 - 応答時間を設定した代替サーバーを複数起動し、ノード数に応じたスループットを計測
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from llm_http import get_llm_session
+from llm_router import LLMBackend, LLMRouter
+from ollama_pool import OllamaNodePool
+from mock_ollama import MockOllamaServer
+
+MODEL = "gemma3:4b"
+DUMMY_IMAGE = "AAAA"
+
+
+def run_load(router: LLMRouter, requests: int, concurrency: int) -> dict:
+    """同時 concurrency 件で requests 件の分析を送信"""
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        start_time = time.perf_counter()
+        try:
+            router.describe("system", "prompt", DUMMY_IMAGE)
+            with lock:
+                latencies.append(time.perf_counter() - start_time)
+        except Exception:
+            with lock:
+                failures += 1
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+        "failures": failures
+    }
+
+
+def build_router(urls: List[str], eject_seconds: float):
+    session = get_llm_session()
+    pool = OllamaNodePool(session, urls, eject_failures=2, eject_seconds=eject_seconds, ps_interval=1.0)
+    pool.refresh()
+    router = LLMRouter(session, [LLMBackend("primary", "ollama", urls[0], MODEL, deadline=30, pooled=True)],
+                       failure_threshold=100, node_pool=pool)
+    return router, pool
+
+
+def print_distribution(pool: OllamaNodePool):
+    for url, stats in pool.get_stats().items():
+        state = "除外中" if stats["ejected"] else "正常"
+        print(f"    {url:<36} {stats['requests']:>4}件  失敗 {stats['failures']:>3}  "
+              f"常駐 {','.join(stats['resident_models']) or '-':<12} {state}")
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="Ollama ノードプールのスループット検証（代替サーバー使用）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  python node_pool_harness.py                      # 1〜4ノードで計測
+  python node_pool_harness.py --nodes 3 --latency 0.5 --concurrency 6
+  python node_pool_harness.py --failing-node       # 1ノードを故障させて除外を確認
+        """
+    )
+    parser.add_argument("--nodes", type=int, default=4, help="最大ノード数")
+    parser.add_argument("--latency", type=float, default=0.3, help="1リクエストの処理時間（秒）")
+    parser.add_argument("--load-time", type=float, default=1.0, help="未常駐モデルの読み込み時間（秒）")
+    parser.add_argument("--requests", type=int, default=24, help="送信する分析リクエスト数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時に鳴る呼び鈴の数")
+    parser.add_argument("--failing-node", action="store_true", help="最後のノードを常に失敗させる")
+    args = parser.parse_args()
+
+    print(f"処理時間 {args.latency}s / 読み込み {args.load_time}s, "
+          f"{args.requests}件 同時{args.concurrency}件\n")
+
+    baseline = None
+    for node_count in range(1, args.nodes + 1):
+        # 1台目だけモデルが常駐している状態から開始
+        failing = args.failing_node and node_count > 1
+        servers = [
+            MockOllamaServer(port=0, latency=f"fixed:{args.latency}", token_rate=1e6, load_time=args.load_time,
+                             models=[MODEL], resident=[MODEL] if index == 0 else [],
+                             failure_rate=1.0 if failing and index == node_count - 1 else 0.0).start()
+            for index in range(node_count)
+        ]
+        router, pool = build_router([server.chat_url for server in servers], eject_seconds=60)
+        try:
+            result = run_load(router, args.requests, args.concurrency)
+        finally:
+            for server in servers:
+                server.stop()
+
+        baseline = baseline or result["throughput"]
+        print(f"  {node_count}ノード: {result['throughput']:6.2f} 件/秒 (x{result['throughput'] / baseline:.2f})  "
+              f"p50 {result['p50'] * 1000:7.0f}ms  p95 {result['p95'] * 1000:7.0f}ms  失敗 {result['failures']}")
+        print_distribution(pool)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Ollama ノードプール - 複数ノードへの最小未処理数バランシング・モデル常駐ノード優先・異常ノードの一時除外
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class OllamaNode:
+    """1台の Ollama サーバー"""
+
+    def __init__(self, chat_url: str):
+        self.url = chat_url
+        self.ps_url = chat_url.replace("/api/chat", "/api/ps")
+        self.outstanding = 0
+        self.resident_models = set()
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.latency_ewma: Optional[float] = None
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+class OllamaNodePool:
+    """
+    リクエストごとにノードを選ぶ
+    - 除外中でないノードのうち、モデルが常駐しているノードを優先（未処理数が affinity_slack 以上多ければ使わない）
+    - その中で未処理リクエストが最も少ないノード（同数なら平均応答時間が短い方）
+    - eject_failures 回連続で失敗したノードは eject_seconds 秒除外し、/api/ps の応答で復帰
+    """
+
+    def __init__(self, session, chat_urls: List[str], eject_failures: int = 3, eject_seconds: float = 30.0,
+                 ps_interval: float = 15.0, affinity_slack: int = 1):
+        if not chat_urls:
+            raise ValueError("Ollama ノードが設定されていません")
+        self.session = session
+        self.nodes = [OllamaNode(url) for url in chat_urls]
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.ps_interval = ps_interval
+        self.affinity_slack = affinity_slack
+        self.lock = threading.Lock()
+
+        self.monitor_thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def urls(self) -> List[str]:
+        return [node.url for node in self.nodes]
+
+    def acquire(self, model: str, exclude=()) -> OllamaNode:
+        """送信先ノードを選び、未処理数を加算（終わったら release を呼ぶ）。exclude は再試行時に避けるURL"""
+        with self.lock:
+            now = time.monotonic()
+            nodes = [node for node in self.nodes if node.url not in exclude] or self.nodes
+            candidates = [node for node in nodes if node.is_available(now)]
+            if not candidates:
+                # 全ノード除外中は最も早く復帰するノードに送る
+                candidates = [min(nodes, key=lambda node: node.ejected_until)]
+
+            def load(node: OllamaNode):
+                return (node.outstanding, node.latency_ewma or 0.0)
+
+            least_loaded = min(candidates, key=load)
+            resident = [node for node in candidates if model in node.resident_models]
+            node = least_loaded
+            if resident:
+                best_resident = min(resident, key=load)
+                # 常駐ノードが混んでいなければモデル読み込み待ちを避けてそちらへ
+                if best_resident.outstanding - least_loaded.outstanding < self.affinity_slack:
+                    node = best_resident
+
+            node.outstanding += 1
+            node.requests += 1
+            return node
+
+    def release(self, node: OllamaNode, model: str, success: bool, elapsed: float, counted: bool = True):
+        """
+        リクエスト終了を記録
+        counted=False はキャンセルなどノードの健全性と無関係な終了
+        """
+        with self.lock:
+            node.outstanding = max(0, node.outstanding - 1)
+            if not counted:
+                return
+
+            if success:
+                node.consecutive_failures = 0
+                node.resident_models.add(model)  # 応答できたノードにはモデルが読み込まれている
+                node.latency_ewma = elapsed if node.latency_ewma is None else 0.8 * node.latency_ewma + 0.2 * elapsed
+                return
+
+            node.failures += 1
+            node.consecutive_failures += 1
+            if node.consecutive_failures >= self.eject_failures and node.is_available(time.monotonic()):
+                node.ejected_until = time.monotonic() + self.eject_seconds
+                node.ejections += 1
+                logger.warning(f"Ollama ノードを一時除外: {node.url}（{self.eject_seconds:g}秒）")
+
+    # === 常駐モデル・死活の確認 ===
+
+    def refresh(self):
+        """各ノードの /api/ps で常駐モデルを更新し、応答した除外ノードを復帰"""
+        for node in self.nodes:
+            try:
+                response = self.session.get(node.ps_url, timeout=3)
+                if response.status_code != 200:
+                    raise RuntimeError(f"ステータス {response.status_code}")
+                models = {model.get("name", "") for model in response.json().get("models", [])}
+            except Exception as e:
+                logger.debug(f"Ollama ノード確認エラー ({node.url}): {e}")
+                continue
+
+            with self.lock:
+                node.resident_models = models
+                if not node.is_available(time.monotonic()):
+                    node.ejected_until = 0.0
+                    node.consecutive_failures = 0
+                    logger.info(f"Ollama ノードが復帰: {node.url}")
+
+    def start(self):
+        """定期確認スレッドを開始"""
+        if self.monitor_thread and self.monitor_thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor_thread.start()
+
+    def stop(self):
+        """定期確認スレッドを停止"""
+        self.stop_event.set()
+        if self.monitor_thread and self.monitor_thread.is_alive():
+            self.monitor_thread.join(timeout=2)
+
+    def _monitor_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Ollama ノード確認エラー: {e}")
+            if self.stop_event.wait(self.ps_interval):
+                return
+
+    def get_stats(self) -> Dict:
+        """ノードごとの未処理数・常駐モデル・除外状態"""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                node.url: {
+                    "outstanding": node.outstanding,
+                    "requests": node.requests,
+                    "failures": node.failures,
+                    "ejections": node.ejections,
+                    "ejected": not node.is_available(now),
+                    "resident_models": sorted(node.resident_models),
+                    "avg_latency_ms": round(node.latency_ewma * 1000, 1) if node.latency_ewma else 0.0
+                }
+                for node in self.nodes
+            }
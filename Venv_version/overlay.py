@@ -0,0 +1,186 @@
+"""
+オーバーレイ合成 - 時刻や検出枠は配信・保存時にだけ描画し、取得フレームは加工しない
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Color = Tuple[int, int, int]
+
+class GlyphStrip:
+    """文字ごとに事前ラスタライズしたマスクを連結して文字列マスクを作る"""
+
+    PRELOAD_CHARS = "0123456789-:/. "
+
+    def __init__(self, font_scale: float = 0.6, thickness: int = 2,
+                 font: int = cv2.FONT_HERSHEY_SIMPLEX, max_cached_texts: int = 64):
+        self.font = font
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.max_cached_texts = max_cached_texts
+
+        (_, self.ascent), baseline = cv2.getTextSize("0123456789", font, font_scale, thickness)
+        self.height = self.ascent + baseline + thickness
+
+        self.glyphs: Dict[str, np.ndarray] = {}
+        self.texts: Dict[str, np.ndarray] = {}
+        for char in self.PRELOAD_CHARS:
+            self._glyph(char)
+
+    def _glyph(self, char: str) -> np.ndarray:
+        """1文字分のマスク（初回のみ putText でラスタライズ）"""
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            (width, _), _ = cv2.getTextSize(char, self.font, self.font_scale, self.thickness)
+            glyph = np.zeros((self.height, max(1, width)), dtype=np.uint8)
+            cv2.putText(glyph, char, (0, self.ascent), self.font, self.font_scale, 255, self.thickness)
+            self.glyphs[char] = glyph
+        return glyph
+
+    def render(self, text: str) -> np.ndarray:
+        """文字列の真偽値マスク（同じ文字列は再計算しない）"""
+        mask = self.texts.get(text)
+        if mask is None:
+            if len(self.texts) >= self.max_cached_texts:
+                self.texts.clear()
+            mask = np.hstack([self._glyph(char) for char in text or " "]) > 0
+            self.texts[text] = mask
+        return mask
+
+class FrameOverlay:
+    """配信・保存用に時刻と最新の検出結果を重ねる"""
+
+    def __init__(self, clock_format: str = "%Y-%m-%d %H:%M:%S", clock_anchor: str = "bottom_left",
+                 clock_color: Color = (0, 255, 0), font_scale: float = 0.6, thickness: int = 2,
+                 detection_ttl: float = 5.0, margin: int = 10):
+        self.clock_format = clock_format
+        self.clock_anchor = clock_anchor
+        self.clock_color = clock_color
+        self.detection_ttl = detection_ttl
+        self.margin = margin
+
+        self.clock_glyphs = GlyphStrip(font_scale, thickness)
+        self.label_glyphs = GlyphStrip(0.5, 1)
+
+        self.detections: List[Tuple[Tuple[int, int, int, int], str, Color]] = []
+        self.detections_time = 0.0
+        self.lock = threading.Lock()
+
+        # 配信スレッドごとの描画バッファ（前回の元画像・描いた領域・描画内容）
+        self._local = threading.local()
+
+    def update_detections(self, detections: List[Tuple[Tuple[int, int, int, int], str, Color]]):
+        """最新の検出結果を登録（bbox=(x1, y1, x2, y2), ラベル, 色）"""
+        with self.lock:
+            self.detections = list(detections)
+            self.detections_time = time.monotonic()
+
+    def clear_detections(self):
+        """検出結果の表示を消去"""
+        with self.lock:
+            self.detections = []
+
+    def _active_detections(self) -> List[Tuple[Tuple[int, int, int, int], str, Color]]:
+        """表示期限内の検出結果"""
+        with self.lock:
+            if time.monotonic() - self.detections_time > self.detection_ttl:
+                return []
+            return list(self.detections)
+
+    @staticmethod
+    def _clip(image: np.ndarray, x0: int, y0: int, x1: int, y1: int) -> Optional[Tuple[int, int, int, int]]:
+        """矩形を画像内に切り詰めて (y0, y1, x0, x1) で返す（画像外なら None）"""
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (y0, y1, x0, x1)
+
+    def _blit(self, image: np.ndarray, mask: np.ndarray, x: int, y: int, color: Color):
+        """マスク部分だけを指定色で塗る（画像外にはみ出す部分は切り捨て）"""
+        region = self._clip(image, x, y, x + mask.shape[1], y + mask.shape[0])
+        if region is None:
+            return
+        y0, y1, x0, x1 = region
+        roi = image[y0:y1, x0:x1]
+        roi[mask[y0 - y:y1 - y, x0 - x:x1 - x]] = color
+
+    def _overlay_items(self, timestamp: Optional[datetime], draw_detections: bool) -> tuple:
+        """今回描く内容（時刻文字列と検出結果）"""
+        clock_text = (timestamp or datetime.now()).strftime(self.clock_format) if self.clock_format else None
+        detections = tuple(self._active_detections()) if draw_detections else ()
+        return clock_text, detections
+
+    def _draw(self, output: np.ndarray, items: tuple) -> List[Tuple[int, int, int, int]]:
+        """output に直接描画し、書き換えた領域 (y0, y1, x0, x1) を返す"""
+        clock_text, detections = items
+        regions = []
+
+        def touch(x0: int, y0: int, x1: int, y1: int):
+            region = self._clip(output, x0, y0, x1, y1)
+            if region is not None:
+                regions.append(region)
+
+        if clock_text is not None:
+            clock_mask = self.clock_glyphs.render(clock_text)
+            if self.clock_anchor == "top_left":
+                clock_y = self.margin
+            else:
+                clock_y = output.shape[0] - self.margin - self.clock_glyphs.ascent
+            self._blit(output, clock_mask, self.margin, clock_y, self.clock_color)
+            touch(self.margin, clock_y, self.margin + clock_mask.shape[1], clock_y + clock_mask.shape[0])
+
+        for (x1, y1, x2, y2), label, color in detections:
+            cv2.rectangle(output, (x1, y1), (x2, y2), color, 2)
+            # 枠線の4辺（太さ2の線は中心から前後に1〜2ピクセル広がる）
+            touch(x1 - 2, y1 - 2, x2 + 3, y1 + 3)
+            touch(x1 - 2, y2 - 2, x2 + 3, y2 + 3)
+            touch(x1 - 2, y1 - 2, x1 + 3, y2 + 3)
+            touch(x2 - 2, y1 - 2, x2 + 3, y2 + 3)
+            if label:
+                label_mask = self.label_glyphs.render(label)
+                label_y = max(0, y1 - label_mask.shape[0] - 2)
+                output[label_y:label_y + label_mask.shape[0],
+                       max(0, x1):max(0, x1) + label_mask.shape[1]] = color
+                self._blit(output, label_mask, x1, label_y, (255, 255, 255))
+                touch(max(0, x1), label_y, max(0, x1) + label_mask.shape[1], label_y + label_mask.shape[0])
+
+        return regions
+
+    def compose(self, image: np.ndarray, timestamp: Optional[datetime] = None,
+                draw_detections: bool = True) -> np.ndarray:
+        """オーバーレイを重ねた新しい画像を返す（保存用、元の画像は変更しない）"""
+        output = image.copy()
+        self._draw(output, self._overlay_items(timestamp, draw_detections))
+        return output
+
+    def render(self, image: np.ndarray, timestamp: Optional[datetime] = None,
+               draw_detections: bool = True) -> np.ndarray:
+        """
+        配信用にスレッドごとの描画バッファへ重ねて返す（次の呼び出しまで有効、元の画像は変更しない）
+        新しいフレームのときだけ全体を取り込み、同じフレームが続く間は前回描いた領域だけを戻して描き直す
+        """
+        state = self._local
+        canvas = getattr(state, "canvas", None)
+        if canvas is None or canvas.shape != image.shape or canvas.dtype != image.dtype:
+            canvas = state.canvas = np.empty_like(image)
+            state.source = None
+
+        items = self._overlay_items(timestamp, draw_detections)
+        if state.source is image:
+            # 取得フレームは差し替えのみで書き換えないため、同じ参照なら画素も同じ
+            if state.items == items:
+                return canvas
+            for y0, y1, x0, x1 in state.regions:
+                canvas[y0:y1, x0:x1] = image[y0:y1, x0:x1]
+        else:
+            np.copyto(canvas, image)
+            state.source = image
+
+        state.regions = self._draw(canvas, items)
+        state.items = items
+        return canvas
@@ -47,7 +47,7 @@ def frame_capture_thread():
                 
                 if frame and frame.image is not None:
                     with frame_lock:
-                        current_frame = frame.image.copy()
+                        current_frame = frame.image
                     success_count += 1
                     last_frame_time = current_time
                     
@@ -62,29 +62,19 @@ def frame_capture_thread():
                         if config.USE_CAMERA and camera_manager.camera and camera_manager.camera.isOpened():
                             ret, direct_frame = camera_manager.camera.read()
                             if ret and direct_frame is not None:
-                                # タイムスタンプ追加
-                                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                cv2.putText(direct_frame, timestamp, (10, direct_frame.shape[0] - 10), 
-                                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                                
                                 with frame_lock:
-                                    current_frame = direct_frame.copy()
+                                    current_frame = direct_frame
                                 success_count += 1
                                 last_frame_time = current_time
                                 print("フォールバック: 直接カメラから取得成功")
                         
                         elif not config.USE_CAMERA and camera_manager.test_images:
                             # テスト画像から取得
-                            test_frame = camera_manager.test_images[camera_manager.current_test_index].copy()
+                            test_frame = camera_manager.test_images[camera_manager.current_test_index]
                             camera_manager.current_test_index = (camera_manager.current_test_index + 1) % len(camera_manager.test_images)
                             
-                            # タイムスタンプ追加
-                            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            cv2.putText(test_frame, timestamp, (10, test_frame.shape[0] - 10), 
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                            
                             with frame_lock:
-                                current_frame = test_frame.copy()
+                                current_frame = test_frame
                             success_count += 1
                             last_frame_time = current_time
                             print("フォールバック: テスト画像から取得成功")
@@ -99,10 +89,23 @@ def frame_capture_thread():
     
     print("フレームキャプチャスレッド終了")
 
+def compose_overlay(image):
+    """保存用に時刻と検出枠を重ねる（取得フレームは変更しない）"""
+    if system_controller.is_initialized and system_controller.system:
+        return system_controller.system.overlay.compose(image)
+    return image
+
+def render_overlay(image):
+    """配信用に時刻と検出枠を重ねる（描画バッファを再利用し、フレームごとの確保をしない）"""
+    if system_controller.is_initialized and system_controller.system:
+        return system_controller.system.overlay.render(image)
+    return image
+
 def generate_video_stream():
     """MJPEG ビデオストリーム生成（修正版）"""
     global stream_active, current_frame
     
+    # current_frame は差し替えのみで書き換えないため、コピーせずに参照する
     frame_count = 0
     last_frame_time = time.time()
     
@@ -113,11 +116,11 @@ def generate_video_stream():
             # 現在のフレームを安全に取得
             with frame_lock:
                 if current_frame is not None:
-                    frame_to_send = current_frame.copy()
+                    frame_to_send = current_frame
             
             if frame_to_send is not None:
                 # 正常なフレームの場合
-                success, buffer = cv2.imencode('.jpg', frame_to_send, [
+                success, buffer = cv2.imencode('.jpg', render_overlay(frame_to_send), [
                     cv2.IMWRITE_JPEG_QUALITY, 75
                 ])
                 
@@ -560,7 +563,10 @@ def index():
                 statusText.textContent = isProcessing ? '処理中...' : '待機中';
                 doorbellButton.disabled = isProcessing || !system.is_running;
                 
-                if (data.last_result && data.last_result.message) {{
+                if (data.analysis_stream && data.analysis_stream.active) {{
+                    // ストリーミング中のAI説明を逐次表示
+                    resultText.textContent = '未知の訪問者です。' + data.analysis_stream.text;
+                }} else if (data.last_result && data.last_result.message) {{
                     resultText.textContent = data.last_result.message;
                 }}
             }})
@@ -613,6 +619,9 @@ def api_doorbell():
     try:
         data = request.get_json() or {}
         time_offset = data.get('time_offset', 0.0)
+        supersede = bool(data.get('supersede', False))
+        wait = bool(data.get('wait', False))  # True: 分析完了まで待って結果と時刻を返す（負荷計測用）
+        pressed_at = time.time()
         
         # 現在フレームの直接取得
         global current_frame
@@ -620,7 +629,7 @@ def api_doorbell():
         
         with frame_lock:
             if current_frame is not None:
-                analysis_frame = current_frame.copy()
+                analysis_frame = current_frame
                 print(f"分析用フレーム取得成功: {analysis_frame.shape}")
         
         if analysis_frame is None:
@@ -628,7 +637,7 @@ def api_doorbell():
             if system_controller.is_initialized:
                 frame = system_controller.system.camera_manager.get_frame()
                 if frame and frame.image is not None:
-                    analysis_frame = frame.image.copy()
+                    analysis_frame = frame.image
                     print(f"フォールバック分析用フレーム取得: {analysis_frame.shape}")
         
         if analysis_frame is None:
@@ -638,20 +647,12 @@ def api_doorbell():
                 "message": "分析用の画像を取得できませんでした"
             })
         
-        # 通常の分析処理を実行（非同期）
-        def run_analysis():
-            try:
-                result = system_controller.doorbell_pressed(time_offset)
-                print(f"分析結果: {result}")
-            except Exception as e:
-                print(f"分析処理エラー: {e}")
-        
-        threading.Thread(target=run_analysis, daemon=True).start()
-        
-        return jsonify({
-            "success": True,
-            "message": "訪問者分析を開始しました"
-        })
+        # 分析スケジューラに登録（連続押下は実行中の分析に合流）
+        result = system_controller.doorbell_pressed(time_offset, supersede=supersede, wait=wait,
+                                                    timeout=float(data.get('timeout', 120)))
+        result["pressed_at"] = pressed_at
+        print(f"呼び鈴押下: {result}")
+        return jsonify(result)
         
     except Exception as e:
         print(f"呼び鈴API エラー: {e}")
@@ -689,7 +690,7 @@ def api_capture():
         # 現在フレームを取得
         with frame_lock:
             if current_frame is not None:
-                save_frame = current_frame.copy()
+                save_frame = current_frame
             else:
                 save_frame = None
         
@@ -704,7 +705,7 @@ def api_capture():
         filename = f"manual_capture_{timestamp}.jpg"
         filepath = config.CAPTURES_DIR / filename
         
-        cv2.imwrite(str(filepath), save_frame)
+        cv2.imwrite(str(filepath), compose_overlay(save_frame))
         
         return jsonify({
             "success": True,
@@ -717,6 +718,19 @@ def api_capture():
             "message": f"保存エラー: {str(e)}"
         }), 500
 
+@app.route('/api/face/calibrate', methods=['POST'])
+def api_face_calibrate():
+    """顔認識キャリブレーションAPI"""
+    try:
+        result = system_controller.calibrate_face_recognition()
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"キャリブレーションエラー: {str(e)}"
+        }), 500
+
 @app.route('/api/shutdown', methods=['POST'])
 def api_shutdown():
     """システム停止API"""